@@ -1,27 +1,80 @@
 """Main Flask app for the bathroom map application."""
+import time
+_import_started = time.perf_counter()
+import math
 import os
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for, abort, make_response
+from flask import (
+    Flask, Response, render_template, request, jsonify, redirect, url_for, abort, make_response, stream_with_context
+)
 from dotenv import load_dotenv
+from pymongo import ReturnDocument
 from pymongo.errors import PyMongoError
 from bson import ObjectId
-from bson import json_util
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_csrf_token
 from flask_jwt_extended.exceptions import NoAuthorizationError
 from jwt import ExpiredSignatureError
-from schemas import init_app, init_db, Bathroom, Review, User, get_db
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-from geopy.extra.rate_limiter import RateLimiter
-from seed_bathrooms import seed_bathrooms
+import click
+from schemas import init_app, Bathroom, Review, User, get_db, get_pool
+from schemas import (
+    rating_summary,
+    rebuild_rating_stats,
+    record_review_created,
+    record_review_updated,
+    record_review_deleted
+)
+import bootstrap
+import jobs
+from jobs import API_JOB_TYPES, JOBS_COLLECTION, get_job_runner
+import bulk_io
+from bulk_io import EXPORT_MEDIA_TYPES, ImportAborted, export_documents, import_bathrooms, iter_text_lines, row_parser
+from pagination import NEWEST_FIRST, InvalidCursor, cursor_page, count_total
+from serialization import MongoJSONEncoder, encode_documents
+from templating import stream_template
+from http_cache import VALIDATOR_PROJECTION, document_validators, is_not_modified, not_modified, with_validators
+import querylog
+from querylog import get_query_log
+import metrics
+from metrics import get_metrics
+import query_budget
+from query_budget import get_query_counter
+import passwords
+from passwords import PasswordHasherBusy, get_hasher
+import identity
+from identity import (
+    admin_required,
+    attach_reviewer_names,
+    current_user,
+    get_user_cache,
+    invalidate_user,
+    reviewer_fingerprint
+)
+import geocoding
+from geocoding import GeocodingError, GeocoderBusy, GeocoderTimeout, get_geocoder
+import response_cache
+from response_cache import BATHROOMS_TAG, bathroom_tag, cached_response, get_response_cache, invalidate
+import spatial
+from spatial import (
+    get_locator,
+    parse_bbox,
+    bbox_filter,
+    cluster_cell_degrees,
+    cluster_pipeline,
+    marker_label
+)
 
 # Load environment variables
 load_dotenv()
 
+# Time spent importing this module and its dependencies, reported with startup stats.
+# Flask and PyMongo make up nearly all of it; the subsystem modules above add a few ms.
+IMPORT_MS = round((time.perf_counter() - _import_started) * 1000, 2)
+
 def create_app():
     """Create and configure the Flask application."""
+    started = time.perf_counter()
     app = Flask(__name__)
+    app.json_encoder = MongoJSONEncoder
     
     # Check if running in test mode
     testing = os.environ.get('TESTING') == 'true'
@@ -37,7 +90,9 @@ def create_app():
         JWT_ACCESS_COOKIE_NAME="access_token_cookie",
         JWT_COOKIE_CSRF_PROTECT=False,
         JWT_COOKIE_SECURE=False,
-        JWT_COOKIE_SAMESITE="Lax"
+        JWT_COOKIE_SAMESITE="Lax",
+        # Reviews rendered with the bathroom page; the rest load through the reviews API
+        BATHROOM_PAGE_REVIEWS=int(os.environ.get('BATHROOM_PAGE_REVIEWS', 10))
     )
     
     # Initialize JWT
@@ -46,12 +101,52 @@ def create_app():
     # Initialize database
     init_app(app)
     
-    # Only initialize database indexes and seed data if not in testing mode
-    if not testing:
-        with app.app_context():
-            init_db(app)
-            # Seed the database with initial bathroom data
-            seed_bathrooms(get_db())
+    # Time every MongoDB command and explain the slow ones
+    querylog.init_app(app)
+    
+    # Record per-route latency, MongoDB round trips and render time for /metrics
+    metrics.init_app(app)
+    
+    # Count MongoDB commands per request and log routes that exceed their budget
+    query_budget.init_app(app)
+    
+    # Initialize the bounded password hashing pool
+    passwords.init_app(app)
+    
+    # Initialize the user profile cache
+    identity.init_app(app)
+    
+    # Initialize the cached geocoder
+    geocoding.init_app(app)
+    
+    # Initialize the in-process spatial index for nearby lookups
+    spatial.init_app(app)
+    
+    # Initialize the write-invalidated cache for read endpoints
+    response_cache.init_app(app)
+    
+    # Register bulk import settings
+    bulk_io.init_app(app)
+    
+    # Run cascades and aggregate rebuilds on background workers backed by the jobs collection
+    jobs.init_app(app)
+    
+    # Apply migrations and seed data once per database, never in testing mode
+    bootstrap.init_app(app, run=not testing)
+    
+    @app.cli.command("rebuild-ratings")
+    @click.option("--bathroom-id", "bathroom_ids", multiple=True, help="Only rebuild these bathrooms.")
+    def rebuild_ratings_command(bathroom_ids):
+        """Recompute bathroom rating aggregates from the reviews collection."""
+        rebuilt = rebuild_rating_stats(get_db(), bathroom_ids or None)
+        click.echo(f"Rebuilt rating aggregates for {rebuilt} bathrooms.")
+    
+    @app.after_request
+    def add_vary_header(response):
+        """Mark API responses as varying by Accept, which selects the JSON format."""
+        if request.path.startswith('/api/'):
+            response.vary.add('Accept')
+        return response
     
     # Error handler
     @app.errorhandler(404)
@@ -99,14 +194,14 @@ def create_app():
         if get_db().users.find_one({"email": data['email']}):
             return jsonify({"error": "User already exists"}), 400
         
-        # Create user
-        user_doc = User.create_document(
-            email=data['email'],
-            password_hash=generate_password_hash(data['password']),
-            name=data['name']
-        )
-        
         try:
+            # Create user, hashing on the shared pool instead of the request thread
+            user_doc = User.create_document(
+                email=data['email'],
+                password_hash=get_hasher().hash(data['password']),
+                name=data['name']
+            )
+            
             result = get_db().users.insert_one(user_doc)
             user_id = str(result.inserted_id)
             access_token = create_access_token(identity=user_id)
@@ -115,6 +210,8 @@ def create_app():
                 "access_token": access_token,
                 "user_id": user_id
             }), 201
+        except PasswordHasherBusy as e:
+            return jsonify({"error": f"Authentication service busy: {str(e)}"}), 503
         except PyMongoError as e:
             return jsonify({"error": str(e)}), 500
 
@@ -133,9 +230,21 @@ def create_app():
             return jsonify({"error": "Missing email or password"}), 400
         
         # Find user
+        hasher = get_hasher()
         user = get_db().users.find_one({"email": data['email']})
-        if not user or not check_password_hash(user['password_hash'], data['password']):
-            return jsonify({"error": "Invalid email or password"}), 401
+        try:
+            if not user or not hasher.verify(user['password_hash'], data['password']):
+                return jsonify({"error": "Invalid email or password"}), 401
+            
+            # Upgrade hashes made with older parameters while the plaintext is at hand
+            if hasher.needs_rehash(user['password_hash']):
+                get_db().users.update_one(
+                    {"_id": user['_id'], "password_hash": user['password_hash']},
+                    {"$set": {"password_hash": hasher.hash(data['password']), "updated_at": datetime.utcnow()}}
+                )
+                hasher.record_rehash()
+        except PasswordHasherBusy as e:
+            return jsonify({"error": f"Authentication service busy: {str(e)}"}), 503
         
         # Create token
         access_token = create_access_token(identity=str(user['_id']))
@@ -166,26 +275,50 @@ def create_app():
         user_id = get_jwt_identity()
         user_reviews = list(get_db().reviews.find({"user_id": user_id}))
 
-        return render_template("profile.html", reviews=user_reviews)
+        return render_template("profile.html", user=current_user(), reviews=user_reviews)
     
     @app.route("/api/users/me", methods=["GET"])
     @jwt_required()
     def get_current_user():
         """Get current user details."""
-        user_id = get_jwt_identity()
-        user = get_db().users.find_one({"_id": ObjectId(user_id)})
+        # The cached profile never includes the password hash
+        user = current_user()
         
         if not user:
             return jsonify({"error": "User not found"}), 404
         
-        # Remove sensitive data
-        user.pop('password_hash', None)
-        return jsonify({"user": json_util.dumps(user)}), 200
+        return jsonify({"user": encode_documents(user)}), 200
+    
+    @app.route("/api/users/me", methods=["PUT"])
+    @jwt_required()
+    def update_current_user():
+        """Update the current user's display name."""
+        data = request.get_json()
+        user_id = get_jwt_identity()
+        
+        if not data or not str(data.get('name', '')).strip():
+            return jsonify({"error": "Missing name"}), 400
+        
+        try:
+            result = get_db().users.update_one(
+                {"_id": ObjectId(user_id)},
+                {"$set": {"name": str(data['name']).strip(), "updated_at": datetime.utcnow()}}
+            )
+            if result.matched_count == 0:
+                return jsonify({"error": "User not found"}), 404
+            invalidate_user(user_id)
+            # Review listings show the reviewer's name, so cached ones for this user's reviews are stale
+            reviewed = get_db().reviews.distinct("bathroom_id", {"user_id": user_id})
+            invalidate(*(bathroom_tag(bathroom_id) for bathroom_id in reviewed))
+            
+            return jsonify({"user": encode_documents(current_user())}), 200
+        except PyMongoError as e:
+            return jsonify({"error": str(e)}), 500
     
     @app.route("/bathroom/<bathroom_id>", methods=["GET"])
     @jwt_required(optional=True)
     def view_bathroom_page(bathroom_id):
-        """Render the detailed bathroom page with reviews."""
+        """Stream the bathroom page with its newest reviews; older ones load on demand."""
         try:
             db = get_db()
 
@@ -193,15 +326,22 @@ def create_app():
             if not bathroom:
                 abort(404)
 
-            reviews = list(db.reviews.find({"bathroom_id": bathroom_id}))
+            # One bounded index seek, however many reviews the bathroom has
+            reviews, next_cursor = cursor_page(
+                db.reviews, {"bathroom_id": bathroom_id}, app.config['BATHROOM_PAGE_REVIEWS'], sort=NEWEST_FIRST
+            )
+            attach_reviewer_names(reviews)
             
             user_id = get_jwt_identity()
             logged_in = user_id is not None
 
-            return render_template(
+            return stream_template(
                 "view_bathroom.html",
                 bathroom=bathroom,
+                summary=rating_summary(bathroom),
                 reviews=reviews,
+                next_cursor=next_cursor,
+                per_page=app.config['BATHROOM_PAGE_REVIEWS'],
                 logged_in=logged_in
             )
         except Exception as e:
@@ -209,6 +349,7 @@ def create_app():
 
 
     @app.route("/api/bathrooms", methods=["GET"])
+    @cached_response(BATHROOMS_TAG)
     def get_bathrooms():
         """Get all bathrooms."""
         try:
@@ -226,16 +367,33 @@ def create_app():
             if accessible:
                 query['is_accessible'] = accessible.lower() == 'true'
             
+            per_page = int(request.args.get('per_page', 10))
+            
+            # Cursor mode seeks by _id instead of skipping, and only counts on request
+            if 'cursor' in request.args:
+                try:
+                    bathrooms, next_cursor = cursor_page(
+                        get_db().bathrooms, query, per_page, request.args.get('cursor')
+                    )
+                except InvalidCursor as e:
+                    return jsonify({"error": str(e)}), 400
+                payload = {
+                    "bathrooms": encode_documents(bathrooms),
+                    "next_cursor": next_cursor
+                }
+                if request.args.get('include_total', '').lower() == 'true':
+                    payload["total"], payload["total_estimated"] = count_total(get_db().bathrooms, query)
+                return jsonify(payload), 200
+            
             # Get bathrooms with pagination
             page = int(request.args.get('page', 1))
-            per_page = int(request.args.get('per_page', 10))
             skip = (page - 1) * per_page
             
             bathrooms = list(get_db().bathrooms.find(query).skip(skip).limit(per_page))
             total = get_db().bathrooms.count_documents(query)
             
             return jsonify({
-                "bathrooms": json_util.dumps(bathrooms),
+                "bathrooms": encode_documents(bathrooms),
                 "total": total,
                 "page": page,
                 "pages": (total + per_page - 1) // per_page
@@ -244,13 +402,24 @@ def create_app():
             return jsonify({"error": str(e)}), 500
     
     @app.route("/api/bathrooms/<bathroom_id>", methods=["GET"])
+    @cached_response("bathroom:{bathroom_id}")
     def get_bathroom(bathroom_id):
         """Get a specific bathroom."""
         try:
+            # Revalidation only needs the version fields, not the whole document
+            if request.if_none_match:
+                meta = get_db().bathrooms.find_one({"_id": ObjectId(bathroom_id)}, VALIDATOR_PROJECTION)
+                if not meta:
+                    return jsonify({"error": "Bathroom not found"}), 404
+                etag, last_modified = document_validators("bathroom", meta)
+                if is_not_modified(etag):
+                    return not_modified(etag, last_modified)
+            
             bathroom = get_db().bathrooms.find_one({"_id": ObjectId(bathroom_id)})
             if not bathroom:
                 return jsonify({"error": "Bathroom not found"}), 404
-            return jsonify({"bathroom": json_util.dumps(bathroom)}), 200
+            etag, last_modified = document_validators("bathroom", bathroom)
+            return with_validators(jsonify({"bathroom": encode_documents(bathroom)}), etag, last_modified)
         except PyMongoError as e:
             return jsonify({"error": str(e)}), 500
     
@@ -278,6 +447,8 @@ def create_app():
             
             # Insert into database
             result = get_db().bathrooms.insert_one(bathroom_doc)
+            get_locator().upsert(result.inserted_id, float(data['latitude']), float(data['longitude']))
+            invalidate(BATHROOMS_TAG)
             return jsonify({
                 "message": "Bathroom created successfully",
                 "bathroom_id": str(result.inserted_id)
@@ -285,6 +456,38 @@ def create_app():
         except PyMongoError as e:
             return jsonify({"error": str(e)}), 500
     
+    @app.route("/api/bathrooms/bulk", methods=["POST"])
+    @jwt_required()
+    def bulk_create_bathrooms():
+        """Create bathrooms from a streamed NDJSON or CSV upload."""
+        parse_rows = row_parser(request.mimetype)
+        if parse_rows is None:
+            return jsonify({"error": "Upload must be application/x-ndjson or text/csv"}), 415
+        
+        def index_inserted(documents):
+            locator = get_locator()
+            for document in documents:
+                longitude, latitude = document['location']['coordinates']
+                locator.upsert(document['_id'], latitude, longitude)
+        
+        try:
+            # Rows are parsed and inserted batch by batch as the body streams in
+            report = import_bathrooms(
+                get_db().bathrooms,
+                parse_rows(iter_text_lines(request.stream)),
+                batch_size=app.config['BULK_IMPORT_BATCH_SIZE'],
+                max_errors=app.config['BULK_IMPORT_MAX_ERRORS'],
+                on_inserted=index_inserted
+            )
+        except ImportAborted as e:
+            # Earlier batches are committed, so tell the client how far the import got
+            return jsonify({"error": str(e), **e.report}), 500
+        except PyMongoError as e:
+            return jsonify({"error": str(e)}), 500
+        finally:
+            invalidate(BATHROOMS_TAG)
+        return jsonify(report), 200
+    
     @app.route("/api/bathrooms/<bathroom_id>", methods=["PUT"])
     @jwt_required()
     def update_bathroom(bathroom_id):
@@ -295,10 +498,6 @@ def create_app():
             return jsonify({"error": "No data provided"}), 400
         
         try:
-            # Check if bathroom exists
-            if not get_db().bathrooms.find_one({"_id": ObjectId(bathroom_id)}):
-                return jsonify({"error": "Bathroom not found"}), 404
-            
             # Prepare update data
             update_data = {}
             if 'building' in data:
@@ -317,11 +516,17 @@ def create_app():
             
             update_data['updated_at'] = datetime.utcnow()
             
-            # Update in database
-            get_db().bathrooms.update_one(
+            # One round trip: a missing bathroom simply matches nothing
+            result = get_db().bathrooms.update_one(
                 {"_id": ObjectId(bathroom_id)},
-                {"$set": update_data}
+                {"$set": update_data, "$inc": {"version": 1}}
             )
+            if not result.matched_count:
+                return jsonify({"error": "Bathroom not found"}), 404
+            if 'location' in update_data:
+                longitude, latitude = update_data['location']['coordinates']
+                get_locator().upsert(bathroom_id, latitude, longitude)
+            invalidate(BATHROOMS_TAG, bathroom_tag(bathroom_id))
             
             return jsonify({"message": "Bathroom updated successfully"}), 200
         except PyMongoError as e:
@@ -332,40 +537,80 @@ def create_app():
     def delete_bathroom(bathroom_id):
         """Delete a specific bathroom."""
         try:
-            # Check if bathroom exists
-            if not get_db().bathrooms.find_one({"_id": ObjectId(bathroom_id)}):
+            # A missing bathroom deletes nothing, which doubles as the existence check
+            if not get_db().bathrooms.delete_one({"_id": ObjectId(bathroom_id)}).deleted_count:
                 return jsonify({"error": "Bathroom not found"}), 404
-            
-            # Delete bathroom and its reviews
-            get_db().bathrooms.delete_one({"_id": ObjectId(bathroom_id)})
-            get_db().reviews.delete_many({"bathroom_id": bathroom_id})
-            
-            return jsonify({"message": "Bathroom deleted successfully"}), 200
         except PyMongoError as e:
             return jsonify({"error": str(e)}), 500
+        get_locator().remove(bathroom_id)
+        invalidate(BATHROOMS_TAG, bathroom_tag(bathroom_id))
+        
+        # Orphaned reviews are unreachable, so removing them can wait for a worker
+        payload = {"bathroom_id": bathroom_id}
+        try:
+            job_id = get_job_runner().enqueue("cascade_delete_reviews", payload)
+        except PyMongoError as e:
+            # The bathroom is already gone, so remove its reviews now rather than report a failed delete
+            app.logger.warning("Could not queue review cascade for bathroom %s, deleting inline: %s", bathroom_id, e)
+            job_id = None
+            try:
+                jobs.cascade_delete_reviews(get_db(), payload, app)
+            except PyMongoError:
+                app.logger.exception("Reviews of deleted bathroom %s were left behind", bathroom_id)
+        
+        return jsonify({"message": "Bathroom deleted successfully", "cascade_job_id": job_id}), 200
     
     @app.route("/api/bathrooms/<bathroom_id>/reviews", methods=["GET"])
+    @cached_response("bathroom:{bathroom_id}")
     def get_reviews(bathroom_id):
         """Get all reviews for a bathroom."""
         try:
-            # Check if bathroom exists
-            if not get_db().bathrooms.find_one({"_id": ObjectId(bathroom_id)}):
+            # Check if bathroom exists; its version changes with every review write
+            meta = get_db().bathrooms.find_one({"_id": ObjectId(bathroom_id)}, VALIDATOR_PROJECTION)
+            if not meta:
                 return jsonify({"error": "Bathroom not found"}), 404
             
+            def respond(reviews, payload):
+                # Reviewer names are part of the body, so their profiles' versions are part of the ETag
+                etag, last_modified = document_validators(
+                    "reviews", meta, sorted(request.args.items(multi=True)), reviewer_fingerprint(reviews)
+                )
+                if is_not_modified(etag):
+                    return not_modified(etag, last_modified)
+                payload["reviews"] = encode_documents(reviews)
+                return with_validators(jsonify(payload), etag, last_modified)
+            
+            query = {"bathroom_id": bathroom_id}
+            per_page = int(request.args.get('per_page', 10))
+            
+            # Cursor mode seeks by _id, or newest first, instead of skipping, and only counts on request
+            if 'cursor' in request.args:
+                if request.args.get('sort', 'oldest') not in ('oldest', 'newest'):
+                    return jsonify({"error": "sort must be oldest or newest"}), 400
+                order = {"sort": NEWEST_FIRST} if request.args.get('sort') == 'newest' else {}
+                try:
+                    reviews, next_cursor = cursor_page(
+                        get_db().reviews, query, per_page, request.args.get('cursor'), **order
+                    )
+                except InvalidCursor as e:
+                    return jsonify({"error": str(e)}), 400
+                payload = {"next_cursor": next_cursor}
+                if request.args.get('include_total', '').lower() == 'true':
+                    payload["total"], payload["total_estimated"] = count_total(get_db().reviews, query)
+                return respond(attach_reviewer_names(reviews), payload)
+            
             # Get reviews with pagination
             page = int(request.args.get('page', 1))
-            per_page = int(request.args.get('per_page', 10))
             skip = (page - 1) * per_page
             
-            reviews = list(get_db().reviews.find({"bathroom_id": bathroom_id}).skip(skip).limit(per_page))
-            total = get_db().reviews.count_documents({"bathroom_id": bathroom_id})
+            reviews = list(get_db().reviews.find(query).skip(skip).limit(per_page))
+            total = get_db().reviews.count_documents(query)
             
-            return jsonify({
-                "reviews": json_util.dumps(reviews),
+            return respond(attach_reviewer_names(reviews), {
                 "total": total,
                 "page": page,
                 "pages": (total + per_page - 1) // per_page
-            }), 200
+            })
         except PyMongoError as e:
             return jsonify({"error": str(e)}), 500
     
@@ -382,10 +627,6 @@ def create_app():
             return jsonify({"error": "Missing required fields"}), 400
         
         try:
-            # Check if bathroom exists
-            if not get_db().bathrooms.find_one({"_id": ObjectId(bathroom_id)}):
-                return jsonify({"error": "Bathroom not found"}), 404
-            
             try:
                 # Create review document
                 review_doc = Review.create_document(
@@ -400,17 +641,25 @@ def create_app():
             except ValueError as ve:
                 return jsonify({"error": str(ve)}), 400
             
-            # Insert into database
+            # The review is stored before the bathroom's version moves, so a listing that sees
+            # the new ETag also sees the review; the aggregate update doubles as the existence check
             result = get_db().reviews.insert_one(review_doc)
-            review_id = str(result.inserted_id)
-            
-            # Retrieve the created review to return it
-            created_review = get_db().reviews.find_one({"_id": result.inserted_id})
+            try:
+                counted = record_review_created(get_db(), review_doc) is not None
+            except PyMongoError:
+                get_db().reviews.delete_one({"_id": result.inserted_id})
+                raise
+            finally:
+                invalidate(BATHROOMS_TAG, bathroom_tag(bathroom_id))
+            if not counted:
+                get_db().reviews.delete_one({"_id": result.inserted_id})
+                return jsonify({"error": "Bathroom not found"}), 404
             
+            # insert_one added the _id, so the local document is what was stored
             return jsonify({
                 "message": "Review created successfully",
-                "review_id": review_id,
-                "review": json_util.dumps(created_review)
+                "review_id": str(result.inserted_id),
+                "review": encode_documents(review_doc)
             }), 201
         except PyMongoError as e:
             return jsonify({"error": str(e)}), 500
@@ -419,13 +668,30 @@ def create_app():
     def get_review(review_id):
         """Get a specific review by ID."""
         try:
+            # Revalidation only needs the version fields, not the whole document
+            if request.if_none_match:
+                meta = get_db().reviews.find_one({"_id": ObjectId(review_id)}, VALIDATOR_PROJECTION)
+                if not meta:
+                    return jsonify({"error": "Review not found"}), 404
+                etag, last_modified = document_validators("review", meta)
+                if is_not_modified(etag):
+                    return not_modified(etag, last_modified)
+            
             review = get_db().reviews.find_one({"_id": ObjectId(review_id)})
             if not review:
                 return jsonify({"error": "Review not found"}), 404
-            return jsonify({"review": json_util.dumps(review)}), 200
+            etag, last_modified = document_validators("review", review)
+            return with_validators(jsonify({"review": encode_documents(review)}), etag, last_modified)
         except PyMongoError as e:
             return jsonify({"error": str(e)}), 500
     
+    def review_not_writable(review_id):
+        """Explain why a write filtered on the review's owner matched nothing."""
+        # Only failed writes pay for this lookup
+        if get_db().reviews.find_one({"_id": ObjectId(review_id)}, {"_id": 1}) is None:
+            return jsonify({"error": "Review not found"}), 404
+        return jsonify({"error": "Unauthorized"}), 403
+    
     @app.route("/api/reviews/<review_id>", methods=["PUT"])
     @jwt_required()
     def update_review(review_id):
@@ -437,13 +703,6 @@ def create_app():
             return jsonify({"error": "No data provided"}), 400
         
         try:
-            # Check if review exists and belongs to user
-            review = get_db().reviews.find_one({"_id": ObjectId(review_id)})
-            if not review:
-                return jsonify({"error": "Review not found"}), 404
-            if review['user_id'] != user_id:
-                return jsonify({"error": "Unauthorized"}), 403
-            
             # Prepare update data
             update_data = {}
             if 'cleanliness' in data:
@@ -478,11 +737,28 @@ def create_app():
             if 'comment' in data:
                 update_data['comment'] = data['comment']
             
-            # Update in database
-            get_db().reviews.update_one(
-                {"_id": ObjectId(review_id)},
-                {"$set": update_data}
+            update_data['updated_at'] = datetime.utcnow()
+            
+            # Ownership is part of the filter, and the old document comes back for the aggregates
+            review = get_db().reviews.find_one_and_update(
+                {"_id": ObjectId(review_id), "user_id": user_id},
+                {"$set": update_data, "$inc": {"version": 1}},
+                return_document=ReturnDocument.BEFORE
             )
+            if review is None:
+                return review_not_writable(review_id)
+            
+            # Move the bathroom's aggregates from the old ratings to the new ones
+            updated_review = {
+                "bathroom_id": review['bathroom_id'],
+                "ratings": dict(review.get('ratings', {})),
+                "best_for": update_data.get('best_for', review.get('best_for'))
+            }
+            for path, value in update_data.items():
+                if path.startswith('ratings.'):
+                    updated_review['ratings'][path.split('.', 1)[1]] = value
+            record_review_updated(get_db(), review, updated_review)
+            invalidate(BATHROOMS_TAG, bathroom_tag(review['bathroom_id']))
             
             return jsonify({"message": "Review updated successfully"}), 200
         except PyMongoError as e:
@@ -495,21 +771,19 @@ def create_app():
         user_id = get_jwt_identity()
         
         try:
-            # Check if review exists and belongs to user
-            review = get_db().reviews.find_one({"_id": ObjectId(review_id)})
-            if not review:
-                return jsonify({"error": "Review not found"}), 404
-            if review['user_id'] != user_id:
-                return jsonify({"error": "Unauthorized"}), 403
-            
-            # Delete review
-            get_db().reviews.delete_one({"_id": ObjectId(review_id)})
+            # Ownership is part of the filter, and the deleted document comes back for the aggregates
+            review = get_db().reviews.find_one_and_delete({"_id": ObjectId(review_id), "user_id": user_id})
+            if review is None:
+                return review_not_writable(review_id)
+            record_review_deleted(get_db(), review)
+            invalidate(BATHROOMS_TAG, bathroom_tag(review['bathroom_id']))
             
             return jsonify({"message": "Review deleted successfully"}), 200
         except PyMongoError as e:
             return jsonify({"error": str(e)}), 500
     
     @app.route("/api/bathrooms/nearby", methods=["GET"])
+    @cached_response(BATHROOMS_TAG)
     def get_nearby_bathrooms():
         """Get bathrooms near a location."""
         try:
@@ -526,29 +800,71 @@ def create_app():
                 lat = float(lat)
                 lng = float(lng)
                 max_distance = int(max_distance)
+                # float() accepts nan and inf, which the distance math cannot use
+                if not (math.isfinite(lat) and math.isfinite(lng) and -90 <= lat <= 90 and -180 <= lng <= 180):
+                    raise ValueError("Coordinates are out of range")
             except (ValueError, TypeError):
                 return jsonify({"error": "Invalid coordinate format"}), 400
             
-            # Special case for testing
-            if app.config.get('TESTING', False) or os.environ.get('TESTING') == 'true':
-                # In testing mode, just return all bathrooms without geo query
-                bathrooms = list(get_db().bathrooms.find().limit(10))
-                return jsonify({"bathrooms": json_util.dumps(bathrooms)}), 200
-            
-            # Perform geo query in production
-            bathrooms = list(get_db().bathrooms.find({
-                "location": {
-                    "$near": {
-                        "$geometry": {
-                            "type": "Point",
-                            "coordinates": [lng, lat]
-                        },
-                        "$maxDistance": max_distance
-                    }
-                }
-            }).limit(10))
+            # A huge radius would walk every cell of the index on each request
+            limit = app.config['NEARBY_MAX_DISTANCE']
+            if not 0 < max_distance <= limit:
+                return jsonify({"error": f"max_distance must be between 1 and {limit} meters"}), 400
             
-            return jsonify({"bathrooms": json_util.dumps(bathrooms)}), 200
+            # Rank by exact distance in the in-process index, then fetch the winners by _id
+            nearest = get_locator().nearest(lat, lng, k=10, max_distance=max_distance)
+            distances = {bathroom_id: distance for distance, bathroom_id in nearest}
+            bathrooms = []
+            if nearest:
+                ids = [ObjectId(bathroom_id) for _, bathroom_id in nearest]
+                bathrooms = list(get_db().bathrooms.find({"_id": {"$in": ids}}))
+                bathrooms.sort(key=lambda bathroom: distances[str(bathroom["_id"])])
+                for bathroom in bathrooms:
+                    bathroom["distance"] = round(distances[str(bathroom["_id"])], 1)
+            
+            return jsonify({"bathrooms": encode_documents(bathrooms)}), 200
+        except PyMongoError as e:
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/bathrooms/viewport", methods=["GET"])
+    @cached_response(BATHROOMS_TAG)
+    def get_viewport_bathrooms():
+        """Get map pins or clusters for the visible part of the map."""
+        try:
+            bbox = parse_bbox(request.args.get('bbox'))
+            zoom = int(request.args.get('zoom', 0))
+            if not 0 <= zoom <= 22:
+                raise ValueError("zoom must be between 0 and 22")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        try:
+            # Close up, send minimal [id, lat, lng, label] tuples for each pin
+            if zoom >= app.config['VIEWPORT_CLUSTER_BELOW_ZOOM']:
+                max_markers = app.config['VIEWPORT_MAX_MARKERS']
+                cursor = get_db().bathrooms.find(
+                    bbox_filter(bbox),
+                    {"building": 1, "floor": 1, "location.coordinates": 1}
+                ).limit(max_markers + 1)
+                markers = [
+                    [str(b["_id"]), b["location"]["coordinates"][1], b["location"]["coordinates"][0], marker_label(b)]
+                    for b in cursor
+                ]
+                if len(markers) <= max_markers:
+                    return jsonify({"mode": "markers", "zoom": zoom, "markers": markers}), 200
+            
+            # Zoomed out (or too many pins), let MongoDB count bathrooms per grid cell
+            cell_degrees = cluster_cell_degrees(zoom, app.config['VIEWPORT_CELLS_PER_TILE'])
+            clusters = [
+                {
+                    "lat": cell["lat"],
+                    "lng": cell["lng"],
+                    "count": cell["count"],
+                    "id": str(cell["id"]) if cell["count"] == 1 else None
+                }
+                for cell in get_db().bathrooms.aggregate(cluster_pipeline(bbox, cell_degrees))
+            ]
+            return jsonify({"mode": "clusters", "zoom": zoom, "clusters": clusters}), 200
         except PyMongoError as e:
             return jsonify({"error": str(e)}), 500
     
@@ -561,28 +877,139 @@ def create_app():
         if not data or not data.get('address'):
             return jsonify({"error": "Missing address"}), 400
         
-        address = data['address']
-        
-        # Set up geocoder with app name and rate limiting (1 request per second)
-        geolocator = Nominatim(user_agent="bathroom_map_app")
-        geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1)
-        
         try:
-            # Try to geocode the address with rate limiting
-            location = geocode(address)
+            # Cached lookups never reach the upstream geocoder; misses wait on its shared worker
+            with get_metrics().time_geocode() as timing:
+                location = get_geocoder().lookup(data['address'])
+                timing["outcome"] = "found" if location else "not_found"
             
             if location:
-                return jsonify({
-                    "lat": location.latitude,
-                    "long": location.longitude,
-                    "display_name": location.address
-                }), 200
+                return jsonify(location), 200
             else:
                 return jsonify({"error": "Could not find coordinates for this address"}), 404
                 
-        except (GeocoderTimedOut, GeocoderServiceError) as e:
+        except GeocoderBusy as e:
+            return jsonify({"error": f"Geocoding service busy: {str(e)}"}), 503
+        except GeocoderTimeout as e:
+            return jsonify({"error": f"Geocoding service error: {str(e)}"}), 504
+        except GeocodingError as e:
             return jsonify({"error": f"Geocoding service error: {str(e)}"}), 500
     
+    @app.route("/api/export/<collection>", methods=["GET"])
+    @jwt_required()
+    def export_collection(collection):
+        """Stream every bathroom or review as NDJSON or CSV."""
+        if collection not in ("bathrooms", "reviews"):
+            return jsonify({"error": "Resource not found"}), 404
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in EXPORT_MEDIA_TYPES:
+            return jsonify({"error": "format must be ndjson or csv"}), 400
+        
+        query = {}
+        if collection == "reviews" and request.args.get('bathroom_id'):
+            query['bathroom_id'] = request.args['bathroom_id']
+        
+        chunks = export_documents(
+            get_db()[collection],
+            query,
+            fmt,
+            batch_size=app.config['EXPORT_BATCH_SIZE'],
+            chunk_bytes=app.config['EXPORT_CHUNK_BYTES']
+        )
+        response = Response(stream_with_context(chunks), mimetype=EXPORT_MEDIA_TYPES[fmt])
+        response.headers['Content-Disposition'] = f'attachment; filename="{collection}.{fmt}"'
+        return response
+    
+    @app.route("/api/admin/stats", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def get_admin_stats():
+        """Get runtime statistics for the application's shared resources."""
+        return jsonify({
+            "mongo_pool": get_pool().stats(),
+            "password_hasher": get_hasher().stats(),
+            "user_cache": get_user_cache().stats(),
+            "geocoder": get_geocoder().stats(),
+            "spatial_index": get_locator().stats(),
+            "response_cache": get_response_cache().stats(),
+            "query_log": get_query_log().stats(),
+            "query_budget": get_query_counter().stats(),
+            "jobs": get_job_runner().stats(),
+            "startup": app.extensions['startup']
+        }), 200
+    
+    @app.route("/api/admin/slow-queries", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def get_slow_queries():
+        """Get recent slow MongoDB commands, timings per route and requests over their command budget."""
+        query_log = get_query_log()
+        return jsonify({
+            "threshold_ms": app.config['SLOW_QUERY_MS'],
+            "slow_queries": query_log.entries(),
+            "routes": query_log.routes(),
+            "over_budget": get_query_counter().violations()
+        }), 200
+    
+    @app.route("/api/jobs", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def list_jobs():
+        """List recent background jobs, newest first, optionally filtered by status and type."""
+        query = {key: request.args[key] for key in ("status", "type") if request.args.get(key)}
+        try:
+            limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        try:
+            found = get_db()[JOBS_COLLECTION].find(query).sort("_id", -1).limit(limit)
+            return jsonify({"jobs": encode_documents(list(found))}), 200
+        except PyMongoError as e:
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/jobs", methods=["POST"])
+    @jwt_required()
+    @admin_required
+    def create_job():
+        """Start an aggregate rebuild or index migration in the background."""
+        data = request.get_json() or {}
+        if data.get("type") not in API_JOB_TYPES:
+            return jsonify({"error": f"type must be one of {', '.join(sorted(API_JOB_TYPES))}"}), 400
+        payload = {}
+        if data.get("bathroom_ids"):
+            payload["bathroom_ids"] = [str(bathroom_id) for bathroom_id in data["bathroom_ids"]]
+        try:
+            job_id = get_job_runner().enqueue(data["type"], payload)
+        except PyMongoError as e:
+            return jsonify({"error": str(e)}), 500
+        return jsonify({"message": "Job queued", "job_id": job_id}), 202
+    
+    @app.route("/api/jobs/<job_id>", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def get_job(job_id):
+        """Get a background job's status, attempts, result and last error."""
+        try:
+            job = get_job_runner().get(job_id)
+        except PyMongoError as e:
+            return jsonify({"error": str(e)}), 500
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify({"job": encode_documents(job)}), 200
+    
+    @app.route("/metrics", methods=["GET"])
+    def prometheus_metrics():
+        """Expose request, MongoDB, geocoder and template metrics for Prometheus."""
+        if not app.config['METRICS_ENABLED']:
+            return jsonify({"error": "Resource not found"}), 404
+        return metrics.render_response()
+    
+    app.extensions['startup'].update(
+        import_ms=IMPORT_MS,
+        create_app_ms=round((time.perf_counter() - started) * 1000, 2)
+    )
+    app.logger.info("Application created in %.1f ms (bootstrap %s)",
+                    app.extensions['startup']['create_app_ms'], app.extensions['startup']['bootstrap'])
     return app
 
 if __name__ == "__main__":
@@ -0,0 +1,9 @@
+"""Benchmarks for the bathroom map API hot paths.
+
+Run from the web-app directory with::
+
+    python -m benchmarks --sizes 10,1000,10000 --output results.json
+"""
+from benchmarks.harness import SCENARIO_NAMES, run_benchmarks
+
+__all__ = ['SCENARIO_NAMES', 'run_benchmarks']
@@ -0,0 +1,56 @@
+"""Command line entry point: ``python -m benchmarks``."""
+import json
+from typing import Optional, Tuple
+import click
+from benchmarks.harness import SCENARIO_NAMES, run_benchmarks
+
+
+def _sizes(ctx: click.Context, param: click.Parameter, value: str) -> Tuple[int, ...]:
+    try:
+        sizes = tuple(int(size) for size in value.split(","))
+    except ValueError:
+        raise click.BadParameter("sizes must be comma separated integers")
+    if any(size < 1 for size in sizes):
+        raise click.BadParameter("sizes must be positive")
+    return sizes
+
+
+@click.command()
+@click.option("--backend", "backends", multiple=True, type=click.Choice(["mongomock", "mongod"]),
+              default=("mongomock", "mongod"), show_default=True,
+              help="Database to run against; mongod is skipped when no server answers.")
+@click.option("--sizes", default="10,1000,10000", callback=_sizes, show_default=True,
+              help="Comma separated dataset sizes, in bathrooms and in reviews (up to 1000000).")
+@click.option("--scenario", "scenarios", multiple=True, type=click.Choice(SCENARIO_NAMES),
+              help="Scenarios to run, defaults to all.")
+@click.option("--requests", default=200, show_default=True, help="Timed requests per scenario.")
+@click.option("--warmup", default=10, show_default=True, help="Untimed requests per scenario.")
+@click.option("--uri", envvar="MONGO_URI", default="mongodb://localhost:27017", show_default=True,
+              help="MongoDB server for the mongod backend.")
+@click.option("--seed", default=0, show_default=True, help="Dataset random seed.")
+@click.option("--response-cache/--no-response-cache", default=False, show_default=True,
+              help="Serve repeated reads from the response cache instead of timing the handlers.")
+@click.option("--output", type=click.Path(dir_okay=False, writable=True), help="Write JSON here instead of stdout.")
+def main(backends: Tuple[str, ...], sizes: Tuple[int, ...], scenarios: Tuple[str, ...], requests: int,
+         warmup: int, uri: str, seed: int, response_cache: bool, output: Optional[str]) -> None:
+    """Time the API hot paths and report throughput and latency percentiles as JSON."""
+    report = run_benchmarks(
+        backends, sizes, scenarios or None, requests=requests, warmup=warmup, uri=uri, seed=seed,
+        config={"RESPONSE_CACHE_ENABLED": response_cache}
+    )
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+        for result in report["results"]:
+            click.echo(
+                f"{result['backend']:<9} {result['size']:>8} {result['scenario']:<22} "
+                f"{result['throughput_rps']:>9} rps  p50 {result['latency_ms']['p50']:>8} ms  "
+                f"p99 {result['latency_ms']['p99']:>8} ms", err=True
+            )
+    else:
+        click.echo(text)
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,52 @@
+"""Deterministic bathroom and review datasets for benchmarks."""
+from typing import List, NamedTuple
+from pymongo.database import Database
+from schemas.migrations import missing_indexes
+from seed_bathrooms import DEFAULT_CAMPUSES, generate_dataset
+
+# Distinct reviewers in every dataset
+REVIEWER_COUNT = 100
+
+# Reviews whose bathrooms become request targets, so busy bathrooms are requested more often
+TARGET_SAMPLE = 100
+
+
+class Dataset(NamedTuple):
+    """What a benchmark needs to know about the seeded data.
+
+    Attributes:
+        size: Number of bathrooms, and of reviews
+        bathroom_ids: Reviewed bathrooms to request, weighted by popularity
+        center: (latitude, longitude) of the first campus
+    """
+    size: int
+    bathroom_ids: List[str]
+    center: tuple
+
+
+def seed_dataset(db: Database, size: int, seed: int = 0, zipf: float = 1.1) -> Dataset:
+    """Replace the data in db with a generated dataset of size bathrooms and reviews.
+
+    Args:
+        db: The database to fill
+        size: Number of bathrooms, and of reviews
+        seed: Random seed
+        zipf: Review popularity skew across bathrooms
+
+    Returns:
+        The dataset description
+
+    Raises:
+        RuntimeError: If a declared index is missing after seeding
+    """
+    generate_dataset(db, bathrooms=size, users=REVIEWER_COUNT, reviews=size, seed=seed, zipf=zipf, drop=True)
+    # Timings against a collection without its indexes would be meaningless
+    missing = missing_indexes(db)
+    if missing:
+        raise RuntimeError(f"Seeded database is missing indexes: {missing}")
+    targets = [
+        review["bathroom_id"]
+        for review in db.reviews.find({}, {"bathroom_id": 1}).sort("_id", 1).limit(TARGET_SAMPLE)
+    ]
+    campus = DEFAULT_CAMPUSES[0]
+    return Dataset(size=size, bathroom_ids=targets, center=(campus.latitude, campus.longitude))
@@ -0,0 +1,292 @@
+"""Time the API hot paths through the WSGI stack against a seeded database."""
+import os
+import platform
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+import mongomock
+from flask import Flask
+from flask.testing import FlaskClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from identity import get_user_cache
+from response_cache import get_response_cache
+from schemas import get_db, get_pool
+from spatial import get_locator, haversine_m
+from benchmarks.dataset import Dataset, seed_dataset
+
+BENCH_DBNAME = "bathroom_map_bench"
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+
+REVIEW_BODY = {"cleanliness": 4, "privacy": 3, "accessibility": 5, "best_for": "pee", "comment": "Benchmark"}
+
+
+class Scenario(NamedTuple):
+    """One request shape to time.
+
+    Attributes:
+        name: Name of the handler being timed
+        send: Issues request number i with the client and returns the response
+        iterations_divisor: Run requests // divisor iterations, for slow scenarios
+    """
+    name: str
+    send: Callable[[FlaskClient, Dataset, int], Any]
+    iterations_divisor: int = 1
+
+
+def _nearby(client: FlaskClient, dataset: Dataset, i: int) -> Any:
+    # Walk the query point around the campus so the same cell is not hit every time
+    lat = dataset.center[0] + ((i % 7) - 3) * 0.002
+    lng = dataset.center[1] + ((i % 5) - 2) * 0.002
+    return client.get(f"/api/bathrooms/nearby?v=2&lat={lat}&lng={lng}&max_distance=1000")
+
+def _complete(response: Any) -> Any:
+    """Read a response to the end, so streamed pages are timed in full, and release it."""
+    response.get_data()
+    response.close()
+    return response
+
+def _bathroom_id(dataset: Dataset, i: int) -> str:
+    return dataset.bathroom_ids[i % len(dataset.bathroom_ids)]
+
+
+SCENARIOS = [
+    Scenario("get_bathrooms", lambda client, dataset, i: client.get(
+        f"/api/bathrooms?v=2&gender=all&is_accessible=true&per_page=20&page={1 + i % 5}"
+    )),
+    Scenario("get_nearby_bathrooms", _nearby),
+    Scenario("get_reviews", lambda client, dataset, i: client.get(
+        f"/api/bathrooms/{_bathroom_id(dataset, i)}/reviews?v=2"
+    )),
+    Scenario("view_bathroom_page", lambda client, dataset, i: client.get(
+        f"/bathroom/{_bathroom_id(dataset, i)}"
+    )),
+    # Writes run after the reads so they do not change what the reads see
+    Scenario("create_review", lambda client, dataset, i: client.post(
+        f"/api/bathrooms/{_bathroom_id(dataset, i)}/reviews", json=REVIEW_BODY
+    )),
+    # Password hashing dominates, so fewer iterations
+    Scenario("login", lambda client, dataset, i: client.post(
+        "/api/auth/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD}
+    ), iterations_divisor=10),
+]
+
+SCENARIO_NAMES = [scenario.name for scenario in SCENARIOS]
+
+
+def mongod_available(uri: str, timeout_ms: int = 1000) -> bool:
+    """Check whether a MongoDB server answers at uri."""
+    try:
+        MongoClient(uri, serverSelectionTimeoutMS=timeout_ms).admin.command("ping")
+    except PyMongoError:
+        return False
+    return True
+
+def build_app(backend: str, uri: str, config: Optional[Dict[str, Any]] = None) -> Flask:
+    """Create the application without its startup seeding, pointed at a benchmark database.
+
+    Args:
+        backend: "mongomock" or "mongod"
+        uri: MongoDB connection string for the mongod backend
+        config: Extra configuration applied after creation
+
+    Returns:
+        The application
+    """
+    # Importing here keeps `--help` fast and lets TESTING skip create_app's own seeding
+    previous = os.environ.get("TESTING")
+    os.environ["TESTING"] = "true"
+    try:
+        from app import create_app
+        app = create_app()
+    finally:
+        if previous is None:
+            os.environ.pop("TESTING")
+        else:
+            os.environ["TESTING"] = previous
+    app.config.update(MONGO_URI=uri, MONGO_DBNAME=BENCH_DBNAME, **(config or {}))
+    if backend == "mongomock":
+        app.mock_db = mongomock.MongoClient()[BENCH_DBNAME]
+    return app
+
+def summarize(durations: List[float], elapsed: float) -> Dict[str, Any]:
+    """Throughput and latency percentiles for one scenario run.
+
+    Args:
+        durations: Seconds taken by each request
+        elapsed: Wall-clock seconds for the whole run
+
+    Returns:
+        Throughput in requests per second and latencies in milliseconds
+    """
+    ordered = sorted(durations)
+
+    def percentile(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "iterations": len(ordered),
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3),
+        },
+    }
+
+def run_scenario(client: FlaskClient, dataset: Dataset, scenario: Scenario,
+                 iterations: int, warmup: int) -> Dict[str, Any]:
+    """Time one scenario after a few untimed warmup requests.
+
+    Args:
+        client: Logged-in test client
+        dataset: The seeded dataset
+        scenario: What to request
+        iterations: Timed requests
+        warmup: Untimed requests sent first, to load caches and indexes
+
+    Returns:
+        The scenario summary, with the status codes seen
+    """
+    for i in range(warmup):
+        _complete(scenario.send(client, dataset, i))
+    statuses: Counter = Counter()
+    durations = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        request_started = time.perf_counter()
+        response = _complete(scenario.send(client, dataset, warmup + i))
+        durations.append(time.perf_counter() - request_started)
+        statuses[str(response.status_code)] += 1
+    result = summarize(durations, time.perf_counter() - started)
+    result["statuses"] = dict(statuses)
+    return result
+
+def check_nearby(client: FlaskClient, dataset: Dataset) -> int:
+    """Make sure nearby lookups around the campus return the seeded bathrooms.
+
+    The endpoint's answer is compared with a scan of the bathrooms
+    collection, so a spatial index or cached response left over from a
+    previous dataset is caught before it is timed.
+
+    Must be called inside an application context.
+
+    Args:
+        client: Test client for the application
+        dataset: The seeded dataset
+
+    Returns:
+        The number of bathrooms found
+
+    Raises:
+        RuntimeError: If nothing is found or the results differ from the database
+    """
+    lat, lng = dataset.center
+    max_distance = client.application.config['NEARBY_MAX_DISTANCE']
+    response = _complete(client.get(f"/api/bathrooms/nearby?v=2&lat={lat}&lng={lng}&max_distance={max_distance}"))
+    found = [bathroom["_id"] for bathroom in response.get_json().get("bathrooms", [])]
+    in_range = sorted(
+        (haversine_m(lat, lng, doc["location"]["coordinates"][1], doc["location"]["coordinates"][0]), str(doc["_id"]))
+        for doc in get_db().bathrooms.find({}, {"location.coordinates": 1})
+    )
+    expected = [bathroom_id for distance, bathroom_id in in_range if distance <= max_distance][:len(found) or 1]
+    if not found or set(found) != set(expected):
+        raise RuntimeError(
+            f"Nearby lookup returned {len(found)} bathrooms that do not match the seeded dataset of {dataset.size}"
+        )
+    return len(found)
+
+def run_size(app: Flask, backend: str, size: int, scenarios: Iterable[Scenario], requests: int,
+             warmup: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Seed one dataset size and time every scenario against it.
+
+    Args:
+        app: Application from build_app, reused across sizes
+        backend: "mongomock" or "mongod", for the report
+        size: Number of bathrooms, and of reviews
+        scenarios: Scenarios to run, in order
+        requests: Timed requests per scenario
+        warmup: Untimed requests per scenario
+        seed: Dataset random seed
+
+    Returns:
+        One result per scenario
+
+    Raises:
+        RuntimeError: If nearby lookups do not see the seeded bathrooms
+    """
+    results = []
+    with app.app_context():
+        seed_started = time.perf_counter()
+        dataset = seed_dataset(get_db(), size, seed)
+        seed_seconds = round(time.perf_counter() - seed_started, 3)
+        # The app outlives each size, so drop what it cached from the previous dataset
+        get_locator(app).reset()
+        get_response_cache(app).reset()
+        get_user_cache(app).reset()
+
+        client = app.test_client()
+        client.post("/api/auth/register", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD, "name": "Bench"})
+        client.post("/api/auth/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+        check_nearby(client, dataset)
+
+        for scenario in scenarios:
+            iterations = max(1, requests // scenario.iterations_divisor)
+            result = run_scenario(client, dataset, scenario, iterations, min(warmup, iterations))
+            results.append(dict({"scenario": scenario.name, "backend": backend, "size": size,
+                                 "seed_seconds": seed_seconds}, **result))
+    return results
+
+def run_benchmarks(backends: Iterable[str], sizes: Iterable[int], scenario_names: Optional[Iterable[str]] = None,
+                   requests: int = 200, warmup: int = 10, uri: str = "mongodb://localhost:27017",
+                   seed: int = 0, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Run every selected scenario at every size on every available backend.
+
+    Args:
+        backends: "mongomock" and/or "mongod"; mongod is skipped when no server answers
+        sizes: Dataset sizes, each the number of bathrooms and of reviews
+        scenario_names: Scenarios to run, defaults to all of them
+        requests: Timed requests per scenario
+        warmup: Untimed requests per scenario
+        uri: MongoDB connection string for the mongod backend
+        seed: Dataset random seed
+        config: Extra application configuration
+
+    Returns:
+        Run metadata, skipped backends and one result per backend, size and scenario
+    """
+    selected = set(scenario_names or SCENARIO_NAMES)
+    scenarios = [scenario for scenario in SCENARIOS if scenario.name in selected]
+    report: Dict[str, Any] = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat() + "Z",
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "requests": requests,
+            "warmup": warmup,
+            "seed": seed,
+            "config": config or {},
+        },
+        "skipped": [],
+        "results": [],
+    }
+    for backend in backends:
+        if backend == "mongod" and not mongod_available(uri):
+            report["skipped"].append({"backend": backend, "reason": f"no MongoDB server at {uri}"})
+            continue
+        # One app per backend: each create_app registers hooks and pools that live for the process
+        app = build_app(backend, uri, config)
+        try:
+            for size in sizes:
+                report["results"].extend(run_size(app, backend, size, scenarios, requests, warmup, seed))
+        finally:
+            if backend == "mongod":
+                with app.app_context():
+                    get_db().client.drop_database(BENCH_DBNAME)
+                get_pool(app).close()
+    return report
@@ -0,0 +1,189 @@
+"""One-time database setup: index migrations and seed data, guarded by a marker and a lock.
+
+Run it as a deploy step with ``flask bootstrap`` and set BOOTSTRAP_ON_STARTUP
+to false, so workers start without touching the database. With it left on,
+each process checks the marker with one point read and only the first
+process to find it stale does the work.
+"""
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+import click
+from flask import Flask, current_app
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from schemas import get_db
+from schemas.migrations import MIGRATIONS, applied_versions, migrate, pending_migrations
+
+BOOTSTRAP_DEFAULTS = {
+    'BOOTSTRAP_ON_STARTUP': os.environ.get('BOOTSTRAP_ON_STARTUP', 'true').lower() not in ('0', 'false', 'no'),
+    'BOOTSTRAP_SEED': True,
+    'BOOTSTRAP_LOCK_SECONDS': 300,
+    'MIGRATE_ON_STARTUP': True,
+}
+
+# Collection holding the marker and the lock
+BOOTSTRAP_COLLECTION = "_bootstrap"
+MARKER_ID = "state"
+LOCK_ID = "lock"
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def is_current(marker: Optional[Dict[str, Any]], seed: bool = True) -> bool:
+    """Whether a marker records every migration and, if wanted, the seed data.
+
+    Args:
+        marker: The marker document, or None
+        seed: Whether seeding is required
+
+    Returns:
+        True if there is nothing left to do
+    """
+    if not marker:
+        return False
+    # Compare whole sets, so a migration added with a lower version than the newest is still run
+    recorded = set(marker.get("migration_versions", []))
+    return recorded >= {migration.version for migration in MIGRATIONS} and (marker.get("seeded") or not seed)
+
+def acquire_lock(db: Database, seconds: float) -> bool:
+    """Take the bootstrap lock, replacing one whose holder has run out of time.
+
+    Args:
+        db: The database
+        seconds: How long the lock is held before others may take it over
+
+    Returns:
+        True if this process now holds the lock
+    """
+    now = datetime.utcnow()
+    lock = {"_id": LOCK_ID, "owner": _owner(), "acquired_at": now, "expires_at": now + timedelta(seconds=seconds)}
+    collection = db[BOOTSTRAP_COLLECTION]
+    try:
+        collection.insert_one(lock)
+        return True
+    except DuplicateKeyError:
+        pass
+    # Only one process can delete an expired lock, so only one retries the insert successfully
+    if collection.delete_one({"_id": LOCK_ID, "expires_at": {"$lt": now}}).deleted_count:
+        try:
+            collection.insert_one(lock)
+            return True
+        except DuplicateKeyError:
+            pass
+    return False
+
+def release_lock(db: Database) -> None:
+    """Release the bootstrap lock if this process holds it."""
+    db[BOOTSTRAP_COLLECTION].delete_one({"_id": LOCK_ID, "owner": _owner()})
+
+def run_bootstrap(db: Database, seed: bool = True, migrate_indexes: bool = True,
+                  lock_seconds: float = 300) -> Dict[str, Any]:
+    """Apply migrations and seed data under the lock, then record the marker.
+
+    Args:
+        db: The database
+        seed: Insert the NYU bathrooms into an empty database
+        migrate_indexes: Apply pending migrations; when False they are only reported
+        lock_seconds: How long the lock is held before others may take it over
+
+    Returns:
+        The outcome ("ran" or "locked"), migrations applied and pending, and duration
+    """
+    started = time.perf_counter()
+    if not acquire_lock(db, lock_seconds):
+        return {"status": "locked", "applied": [], "pending": []}
+    try:
+        applied = migrate(db) if migrate_indexes else []
+        if seed:
+            # The generator pulls in click, random and werkzeug.security, so load it only when seeding
+            from seed_bathrooms import seed_bathrooms
+            seed_bathrooms(db)
+        versions = applied_versions(db)
+        db[BOOTSTRAP_COLLECTION].replace_one({"_id": MARKER_ID}, {
+            "_id": MARKER_ID,
+            "migration_versions": sorted(versions),
+            "seeded": seed,
+            "completed_at": datetime.utcnow(),
+            "owner": _owner()
+        }, upsert=True)
+    finally:
+        release_lock(db)
+    return {
+        "status": "ran",
+        "applied": applied,
+        "pending": [migration.version for migration in pending_migrations(db)],
+        "ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+def bootstrap_on_startup(app: Flask) -> Dict[str, Any]:
+    """Bring the database up to date unless the marker says it already is.
+
+    A current marker costs one point read. A stale one is fixed by whichever
+    process takes the lock; the others carry on serving without waiting.
+
+    Args:
+        app: The Flask application instance
+
+    Returns:
+        The outcome: "current", "ran" or "locked", with details
+    """
+    seed = app.config['BOOTSTRAP_SEED']
+    with app.app_context():
+        db = get_db()
+        if is_current(db[BOOTSTRAP_COLLECTION].find_one({"_id": MARKER_ID}), seed):
+            return {"status": "current"}
+        result = run_bootstrap(
+            db,
+            seed=seed,
+            migrate_indexes=app.config['MIGRATE_ON_STARTUP'],
+            lock_seconds=app.config['BOOTSTRAP_LOCK_SECONDS']
+        )
+    if result["applied"]:
+        app.logger.info("Applied database migrations %s", result["applied"])
+    if result["pending"]:
+        app.logger.warning(
+            "Database migrations %s are pending, run python -m schemas.migrations migrate", result["pending"]
+        )
+    if result["status"] == "locked":
+        app.logger.info("Another process is bootstrapping the database, starting without waiting")
+    return result
+
+
+def init_app(app: Flask, run: bool = True) -> None:
+    """Register bootstrap settings and the ``flask bootstrap`` command, and bootstrap if enabled.
+
+    Args:
+        app: The Flask application instance
+        run: Whether this process may bootstrap at all, False in tests
+    """
+    for key, value in BOOTSTRAP_DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    @app.cli.command("bootstrap")
+    @click.option("--no-seed", is_flag=True, help="Apply migrations without inserting seed data.")
+    def bootstrap_command(no_seed):
+        """Apply migrations and seed data once, for a deploy step."""
+        result = run_bootstrap(
+            get_db(), seed=not no_seed, lock_seconds=current_app.config['BOOTSTRAP_LOCK_SECONDS']
+        )
+        if result["status"] == "locked":
+            raise click.ClickException("Another process holds the bootstrap lock.")
+        click.echo(f"Bootstrap finished in {result['ms']} ms, applied migrations: {result['applied'] or 'none'}.")
+
+    status = "disabled"
+    started = time.perf_counter()
+    if run and app.config['BOOTSTRAP_ON_STARTUP']:
+        try:
+            status = bootstrap_on_startup(app)["status"]
+        except PyMongoError as e:
+            # Serving reads beats refusing to start; the next process or deploy job retries
+            app.logger.error("Database bootstrap failed: %s", e)
+            status = "failed"
+    app.extensions['startup'] = {
+        "bootstrap": status,
+        "bootstrap_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
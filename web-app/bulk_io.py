@@ -0,0 +1,384 @@
+"""Streaming bulk import and export of bathrooms and reviews as NDJSON and CSV."""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+from bson import ObjectId
+from flask import Flask, current_app
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, PyMongoError
+from schemas import Bathroom
+from serialization import MongoJSONEncoder
+
+BULK_DEFAULTS = {
+    'BULK_IMPORT_BATCH_SIZE': 1000,
+    'BULK_IMPORT_MAX_ERRORS': 1000,
+    'EXPORT_BATCH_SIZE': 500,
+    'EXPORT_CHUNK_BYTES': 64 * 1024,
+}
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+CSV_MEDIA_TYPES = ("text/csv",)
+
+# Row number paired with either a parsed row or the reason it could not be parsed
+ParsedRow = Tuple[int, Any]
+
+TRUE_VALUES = {"true", "1", "yes", "y"}
+FALSE_VALUES = {"false", "0", "no", "n", ""}
+
+
+def iter_text_lines(stream: IO[bytes], encoding: str = "utf-8-sig") -> Iterator[str]:
+    """Decode an upload one line at a time without reading it all into memory.
+
+    Args:
+        stream: Binary request body
+        encoding: Text encoding of the body, by default UTF-8 with an optional byte order mark
+
+    Returns:
+        An iterator of decoded lines, with undecodable lines replaced
+    """
+    for line in iter(stream.readline, b""):
+        yield line.decode(encoding, errors="replace")
+
+def iter_ndjson_rows(lines: Iterable[str]) -> Iterator[ParsedRow]:
+    """Parse one JSON object per line, skipping blank lines.
+
+    Args:
+        lines: Decoded lines of the upload
+
+    Returns:
+        An iterator of (line number, dict or ValueError) pairs
+    """
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield number, ValueError("Each line must be a JSON object")
+            continue
+        yield number, row
+
+def iter_csv_rows(lines: Iterable[str]) -> Iterator[ParsedRow]:
+    """Parse CSV rows keyed by the header line.
+
+    Args:
+        lines: Decoded lines of the upload, starting with the header
+
+    Returns:
+        An iterator of (line number, dict or ValueError) pairs
+    """
+    reader = csv.DictReader(lines)
+    try:
+        for row in reader:
+            if None in row:
+                yield reader.line_num, ValueError("Row has more fields than the header")
+                continue
+            yield reader.line_num, row
+    except csv.Error as e:
+        yield reader.line_num, ValueError(f"Invalid CSV: {e}")
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"Invalid boolean: {value!r}")
+
+def bathroom_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate an uploaded row and build its bathroom document.
+
+    Args:
+        row: Field values from an NDJSON object or CSV row
+
+    Returns:
+        A bathroom document ready for insertion
+
+    Raises:
+        ValueError: If a field is missing or invalid
+    """
+    missing = [field for field in ("building", "floor", "latitude", "longitude") if row.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    try:
+        floor = int(row["floor"])
+        latitude = float(row["latitude"])
+        longitude = float(row["longitude"])
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid number: {e}") from e
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("Coordinates are out of range")
+    return Bathroom.create_document(
+        building=str(row["building"]),
+        floor=floor,
+        latitude=latitude,
+        longitude=longitude,
+        is_accessible=_parse_bool(row.get("is_accessible", False)),
+        gender=row.get("gender") or "all"
+    )
+
+
+class ImportAborted(PyMongoError):
+    """Raised when a database error stops a bulk import part way through.
+
+    Args:
+        message: Description of the underlying error
+        report: The import report for the rows handled before the error, with
+            ``unconfirmed`` counting the rows of the batch being written when
+            it failed, which may or may not have been inserted
+    """
+
+    def __init__(self, message: str, report: Dict[str, Any]) -> None:
+        super().__init__(message)
+        self.report = report
+
+
+class ImportReport:
+    """Counts and per-row errors for one bulk import.
+
+    Args:
+        max_errors: Number of row errors kept for the response
+    """
+
+    def __init__(self, max_errors: int) -> None:
+        self.max_errors = max_errors
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def add_error(self, row: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row, "error": error})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors)
+        }
+
+
+def _flush(
+    collection: Collection,
+    batch: List[Tuple[int, Dict[str, Any]]],
+    report: ImportReport,
+    on_inserted: Optional[Callable[[List[Dict[str, Any]]], None]]
+) -> None:
+    """Insert a batch unordered and record rows the server rejected."""
+    documents = [document for _, document in batch]
+    failed = set()
+    try:
+        collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            failed.add(write_error["index"])
+            report.add_error(batch[write_error["index"]][0], write_error.get("errmsg", "Write failed"))
+    inserted = [document for index, document in enumerate(documents) if index not in failed]
+    report.inserted += len(inserted)
+    if on_inserted is not None and inserted:
+        on_inserted(inserted)
+
+def _flush_or_abort(
+    collection: Collection,
+    batch: List[Tuple[int, Dict[str, Any]]],
+    report: ImportReport,
+    on_inserted: Optional[Callable[[List[Dict[str, Any]]], None]]
+) -> None:
+    """Flush a batch, turning a database failure into ImportAborted with the counts so far."""
+    try:
+        _flush(collection, batch, report, on_inserted)
+    except PyMongoError as e:
+        partial = report.to_dict()
+        partial["unconfirmed"] = len(batch)
+        raise ImportAborted(str(e), partial) from e
+
+def import_bathrooms(
+    collection: Collection,
+    rows: Iterable[ParsedRow],
+    batch_size: int = 1000,
+    max_errors: int = 1000,
+    on_inserted: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+) -> Dict[str, Any]:
+    """Validate rows and insert them in unordered batches as they arrive.
+
+    At most one batch of documents is held in memory at a time.
+
+    Args:
+        collection: The bathrooms collection
+        rows: (row number, row or ValueError) pairs from a row parser
+        batch_size: Number of documents per insert_many call
+        max_errors: Number of row errors kept in the report
+        on_inserted: Called with each batch's inserted documents
+
+    Returns:
+        The import report with inserted and failed counts and row errors
+
+    Raises:
+        ImportAborted: If a database error other than rejected rows stops the import
+    """
+    report = ImportReport(max_errors)
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    for number, row in rows:
+        if isinstance(row, ValueError):
+            report.add_error(number, str(row))
+            continue
+        try:
+            batch.append((number, bathroom_from_row(row)))
+        except ValueError as e:
+            report.add_error(number, str(e))
+            continue
+        if len(batch) >= batch_size:
+            _flush_or_abort(collection, batch, report, on_inserted)
+            batch = []
+    if batch:
+        _flush_or_abort(collection, batch, report, on_inserted)
+    return report.to_dict()
+
+def row_parser(mimetype: str) -> Optional[Callable[[Iterable[str]], Iterator[ParsedRow]]]:
+    """Pick the row parser for an upload's media type, or None if unsupported."""
+    if mimetype in NDJSON_MEDIA_TYPES:
+        return iter_ndjson_rows
+    if mimetype in CSV_MEDIA_TYPES:
+        return iter_csv_rows
+    return None
+
+# CSV columns for each exported collection, mapped to a getter on the document
+EXPORT_COLUMNS: Dict[str, List[Tuple[str, Callable[[Dict[str, Any]], Any]]]] = {
+    "bathrooms": [
+        ("_id", lambda doc: doc.get("_id")),
+        ("building", lambda doc: doc.get("building")),
+        ("floor", lambda doc: doc.get("floor")),
+        ("latitude", lambda doc: (doc.get("location") or {}).get("coordinates", [None, None])[1]),
+        ("longitude", lambda doc: (doc.get("location") or {}).get("coordinates", [None, None])[0]),
+        ("is_accessible", lambda doc: doc.get("is_accessible")),
+        ("gender", lambda doc: doc.get("gender")),
+        ("review_count", lambda doc: (doc.get("rating_stats") or {}).get("review_count", 0)),
+        ("created_at", lambda doc: doc.get("created_at")),
+        ("updated_at", lambda doc: doc.get("updated_at")),
+    ],
+    "reviews": [
+        ("_id", lambda doc: doc.get("_id")),
+        ("bathroom_id", lambda doc: doc.get("bathroom_id")),
+        ("user_id", lambda doc: doc.get("user_id")),
+        ("cleanliness", lambda doc: (doc.get("ratings") or {}).get("cleanliness")),
+        ("privacy", lambda doc: (doc.get("ratings") or {}).get("privacy")),
+        ("accessibility", lambda doc: (doc.get("ratings") or {}).get("accessibility")),
+        ("best_for", lambda doc: doc.get("best_for")),
+        ("comment", lambda doc: doc.get("comment")),
+        ("created_at", lambda doc: doc.get("created_at")),
+        ("updated_at", lambda doc: doc.get("updated_at")),
+    ],
+}
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+_json_encoder = MongoJSONEncoder(ensure_ascii=False)
+
+
+def _csv_value(value: Any) -> Any:
+    """Flatten a BSON value into a CSV cell."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (ObjectId, datetime)):
+        return _json_encoder.default(value)
+    return value
+
+def iter_ndjson_lines(documents: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Encode each document as one line of JSON, in the v2 API format."""
+    for document in documents:
+        yield _json_encoder.encode(document) + "\n"
+
+def iter_csv_lines(documents: Iterable[Dict[str, Any]], kind: str) -> Iterator[str]:
+    """Encode documents as CSV lines, starting with the header.
+
+    Args:
+        documents: Documents to encode
+        kind: Collection name selecting the columns in EXPORT_COLUMNS
+
+    Returns:
+        An iterator of CSV lines
+    """
+    columns = EXPORT_COLUMNS[kind]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for document in documents:
+        writer.writerow([_csv_value(getter(document)) for _, getter in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # A header is still sent for an empty export
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def iter_chunks(lines: Iterable[str], chunk_bytes: int) -> Iterator[bytes]:
+    """Group encoded lines into chunks of roughly chunk_bytes for the response."""
+    parts: List[bytes] = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        parts.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            yield b"".join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b"".join(parts)
+
+def export_documents(
+    collection: Collection,
+    query: Dict[str, Any],
+    fmt: str,
+    batch_size: int = 500,
+    chunk_bytes: int = 64 * 1024
+) -> Iterator[bytes]:
+    """Stream a collection as NDJSON or CSV without loading it into memory.
+
+    The cursor fetches batch_size documents per round trip and each one is
+    encoded as soon as it arrives. The response status has already been sent
+    when a database error interrupts the stream, so the error is logged and
+    re-raised to abort the response, letting the client see an incomplete
+    transfer rather than a shorter file that looks complete.
+
+    Args:
+        collection: The collection to export
+        query: Filter selecting the exported documents
+        fmt: "ndjson" or "csv"
+        batch_size: Documents fetched per cursor batch
+        chunk_bytes: Approximate size of each response chunk
+
+    Returns:
+        An iterator of encoded response chunks
+    """
+    documents = collection.find(query).sort("_id", 1).batch_size(batch_size)
+    if fmt == "csv":
+        lines = iter_csv_lines(documents, collection.name)
+    else:
+        lines = iter_ndjson_lines(documents)
+    try:
+        yield from iter_chunks(lines, chunk_bytes)
+    except PyMongoError:
+        current_app.logger.exception("Export of %s failed part way through", collection.name)
+        raise
+    finally:
+        documents.close()
+
+def init_app(app: Flask) -> None:
+    """Register bulk import and export settings on the Flask application.
+
+    Args:
+        app: The Flask application instance
+    """
+    for key, value in BULK_DEFAULTS.items():
+        app.config.setdefault(key, value)
@@ -0,0 +1,271 @@
+"""Caching primitives and storage backends shared by the application's caches."""
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+# Sentinel returned for cache misses, so None can be cached as a real value
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a time-to-live.
+
+    Args:
+        maxsize: Maximum number of entries kept before the least recently used is evicted
+        ttl: Default lifetime of an entry in seconds
+        timer: Clock used for expiry, injectable for tests
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, timer: Callable[[], float] = time.monotonic) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Return a live entry and mark it as recently used.
+
+        Args:
+            key: Cache key
+            default: Value returned when the key is absent or expired
+
+        Returns:
+            The cached value or default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > self._timer():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry if full.
+
+        Args:
+            key: Cache key
+            value: Value to cache, which may be None
+            ttl: Lifetime in seconds, defaults to the cache's ttl
+        """
+        expires_at = self._timer() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Any:
+        """Remove an entry if present.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The removed value or MISSING
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return MISSING if entry is None else entry[0]
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[1] > self._timer()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit, miss and eviction counters for the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class MemoryBackend:
+    """Tagged cache storage in the current process, bounded by a TTLCache.
+
+    Args:
+        maxsize: Maximum number of cached entries
+        ttl: Default lifetime of an entry in seconds
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 60) -> None:
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._tags: Dict[str, set] = {}
+        self._key_tags: Dict[str, Iterable[str]] = {}
+        self.invalidations = 0
+
+    def get(self, key: str) -> Any:
+        """Return the cached value or MISSING."""
+        return self.entries.get(key)
+
+    def set(self, key: str, value: Any, tags: Iterable[str], ttl: Optional[float] = None) -> None:
+        """Store a value under a key and index it by tags."""
+        tags = tuple(tags)
+        self.entries.set(key, value, ttl)
+        with self._lock:
+            self._key_tags[key] = tags
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            if len(self._key_tags) > 2 * self.entries.maxsize:
+                self._prune()
+
+    def _prune(self) -> None:
+        """Forget tag entries for keys that were evicted or expired."""
+        for key in [key for key in self._key_tags if key not in self.entries]:
+            for tag in self._key_tags.pop(key):
+                keys = self._tags.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tags[tag]
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Drop every entry carrying any of the tags.
+
+        Returns:
+            The number of entries removed
+        """
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._key_tags.pop(key, None)
+                    if self.entries.pop(key) is not MISSING:
+                        removed += 1
+            self.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self.entries.clear()
+            self._tags.clear()
+            self._key_tags.clear()
+            self.invalidations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit rate, eviction and invalidation counters."""
+        stats = self.entries.stats()
+        stats["backend"] = "memory"
+        stats["invalidations"] = self.invalidations
+        return stats
+
+
+class RedisBackend:
+    """Tagged cache storage shared between processes through Redis.
+
+    Values must be JSON serializable, with bytes stored as base64. Each tag is
+    a Redis set of the keys carrying it, expiring with the longest-lived member.
+
+    Args:
+        client: A redis-py compatible client
+        ttl: Default lifetime of an entry in seconds
+        prefix: Namespace for keys written by this backend
+    """
+
+    def __init__(self, client: Any, ttl: float = 60, prefix: str = "bathroom_map:cache:") -> None:
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _encode(value: Any) -> str:
+        return json.dumps(value, default=lambda o: {"__bytes__": base64.b64encode(o).decode("ascii")})
+
+    @staticmethod
+    def _decode(raw: Any) -> Any:
+        def hook(obj: Dict[str, Any]) -> Any:
+            if set(obj) == {"__bytes__"}:
+                return base64.b64decode(obj["__bytes__"])
+            return obj
+        return json.loads(raw, object_hook=hook)
+
+    def get(self, key: str) -> Any:
+        """Return the cached value or MISSING."""
+        raw = self.client.get(self.prefix + key)
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return MISSING
+            self.hits += 1
+        return self._decode(raw)
+
+    def set(self, key: str, value: Any, tags: Iterable[str], ttl: Optional[float] = None) -> None:
+        """Store a value under a key and index it by tags."""
+        ttl = int(self.ttl if ttl is None else ttl)
+        self.client.setex(self.prefix + key, ttl, self._encode(value))
+        for tag in tags:
+            tag_key = self.prefix + "tag:" + tag
+            self.client.sadd(tag_key, key)
+            self.client.expire(tag_key, ttl)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Drop every entry carrying any of the tags.
+
+        Returns:
+            The number of entries removed
+        """
+        removed = 0
+        for tag in tags:
+            tag_key = self.prefix + "tag:" + tag
+            keys = [self.prefix + (k.decode() if isinstance(k, bytes) else k) for k in self.client.smembers(tag_key)]
+            if keys:
+                removed += self.client.delete(*keys)
+            self.client.delete(tag_key)
+        with self._lock:
+            self.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        """Reset the local counters; shared entries are left to expire."""
+        with self._lock:
+            self.hits = self.misses = self.invalidations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return this process's hit rate and invalidation counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "redis",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": None,
+                "invalidations": self.invalidations,
+            }
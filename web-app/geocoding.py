@@ -0,0 +1,335 @@
+"""Address geocoding with a shared rate-limited worker and a two-tier result cache."""
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+from flask import Flask, current_app
+from pymongo.errors import PyMongoError
+from cache import MISSING, TTLCache
+from schemas import get_db
+
+# Result shape returned by geocoder backends and stored in the cache
+GeocodeResult = Dict[str, Any]
+GeocoderBackend = Callable[[str], Optional[GeocodeResult]]
+
+GEOCODER_DEFAULTS = {
+    'GEOCODER_USER_AGENT': 'bathroom_map_app',
+    'GEOCODER_MIN_DELAY_SECONDS': 1.0,
+    'GEOCODER_BACKEND': None,
+    'GEOCODE_CACHE_SIZE': 1024,
+    'GEOCODE_CACHE_TTL': 30 * 24 * 3600,
+    'GEOCODE_NEGATIVE_TTL': 3600,
+    'GEOCODER_QUEUE_SIZE': 100,
+    'GEOCODER_TIMEOUT_SECONDS': 10.0,
+}
+
+
+class GeocodingError(Exception):
+    """Raised when the upstream geocoding service fails or times out."""
+
+
+class GeocoderBusy(GeocodingError):
+    """Raised when the geocoding queue is full."""
+
+
+class GeocoderTimeout(GeocodingError):
+    """Raised when a queued lookup is not answered in time."""
+
+
+def normalize_address(address: str) -> str:
+    """Normalize an address so equivalent spellings share a cache entry.
+
+    Args:
+        address: Free-form address typed by a user
+
+    Returns:
+        The lowercased address with collapsed whitespace and comma spacing
+    """
+    address = " ".join(address.lower().split())
+    address = re.sub(r"\s*,\s*", ", ", address)
+    return address.strip(" ,.")
+
+def nominatim_backend(user_agent: str) -> GeocoderBackend:
+    """Build a Nominatim backend.
+
+    Rate limiting is left to the GeocodeWorker, which is the only caller.
+
+    Args:
+        user_agent: User agent sent to Nominatim
+
+    Returns:
+        A callable mapping an address to a GeocodeResult or None
+    """
+    # geopy is only needed once an address actually misses the cache
+    from geopy.geocoders import Nominatim
+    from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+
+    geocode = Nominatim(user_agent=user_agent).geocode
+
+    def lookup(address: str) -> Optional[GeocodeResult]:
+        try:
+            location = geocode(address)
+        except (GeocoderTimedOut, GeocoderServiceError) as e:
+            raise GeocodingError(str(e)) from e
+        if not location:
+            return None
+        return {
+            "lat": location.latitude,
+            "long": location.longitude,
+            "display_name": location.address
+        }
+
+    return lookup
+
+
+class GeocodeWorker:
+    """Single background thread that owns the upstream geocoder's rate budget.
+
+    Requests enqueue an address and wait on a future. Identical addresses that
+    are already queued or in flight share one future, so they cost a single
+    upstream call. The worker sleeps between calls instead of request threads.
+
+    Args:
+        app: The Flask application, read for the rate limit on every call
+        backend: Callable returning the backend to use
+        max_queue: Maximum number of distinct addresses waiting for the worker
+        on_result: Called with the key and result of each successful lookup,
+            inside an app context, before its future resolves
+    """
+
+    def __init__(self, app: Flask, backend: Callable[[], GeocoderBackend], max_queue: int,
+                 on_result: Optional[Callable[[str, Optional[GeocodeResult]], None]] = None) -> None:
+        self.app = app
+        self._backend = backend
+        self._on_result = on_result
+        self._queue: "queue.Queue[Optional[Tuple[str, str, Future]]]" = queue.Queue(maxsize=max_queue)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._next_call = 0.0
+        self.counters = {"submitted": 0, "coalesced": 0, "rejected": 0, "upstream_calls": 0}
+
+    def _ensure_started(self) -> None:
+        """Start the worker thread, or restart it in a forked child."""
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="geocode-worker", daemon=True)
+            self._thread.start()
+
+    def submit(self, key: str, address: str) -> Tuple[Future, bool]:
+        """Queue an address, or join the lookup already pending for it.
+
+        Args:
+            key: Normalized address used to coalesce duplicates
+            address: Address as typed, sent upstream
+
+        Returns:
+            The future for the lookup and whether this call created it
+
+        Raises:
+            GeocoderBusy: If the queue is full
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.counters["coalesced"] += 1
+                return future, False
+            self._ensure_started()
+            future = Future()
+            try:
+                self._queue.put_nowait((key, address, future))
+            except queue.Full:
+                self.counters["rejected"] += 1
+                raise GeocoderBusy("Geocoding queue is full")
+            self._inflight[key] = future
+            self.counters["submitted"] += 1
+            return future, True
+
+    def _run(self) -> None:
+        """Answer queued lookups one at a time within the rate limit."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            key, address, future = item
+            delay = self._next_call - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                with self._lock:
+                    self.counters["upstream_calls"] += 1
+                result = self._backend()(address)
+                # Caching here rather than in a request keeps the answer even if every waiter timed out
+                if self._on_result is not None:
+                    with self.app.app_context():
+                        self._on_result(key, result)
+                future.set_result(result)
+            except Exception as e:  # pylint: disable=broad-except
+                future.set_exception(e if isinstance(e, GeocodingError) else GeocodingError(str(e)))
+            finally:
+                self._next_call = time.monotonic() + self.app.config['GEOCODER_MIN_DELAY_SECONDS']
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Ask the worker thread to exit once the queue drains."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and coalescing counters."""
+        with self._lock:
+            stats = dict(self.counters)
+            stats["in_flight"] = len(self._inflight)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+
+class GeocodingService:
+    """Two-tier geocoding cache in front of a pluggable backend.
+
+    Lookups are answered from an in-process LRU first, then from the
+    persistent ``geocode_cache`` collection, and only then from the backend.
+    Addresses that cannot be found are cached too, with a shorter lifetime.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        config = app.config
+        self.ttl = config['GEOCODE_CACHE_TTL']
+        self.negative_ttl = config['GEOCODE_NEGATIVE_TTL']
+        self.memory = TTLCache(maxsize=config['GEOCODE_CACHE_SIZE'], ttl=self.ttl)
+        self._backend: Optional[GeocoderBackend] = config['GEOCODER_BACKEND']
+        self._lock = threading.Lock()
+        self.worker = GeocodeWorker(
+            app, lambda: self.backend, config['GEOCODER_QUEUE_SIZE'], on_result=self._store_result
+        )
+        self.counters = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "errors": 0}
+
+    @property
+    def backend(self) -> GeocoderBackend:
+        """Return the geocoder backend, building the default one on first use."""
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = nominatim_backend(self.app.config['GEOCODER_USER_AGENT'])
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend: GeocoderBackend) -> None:
+        self._backend = backend
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _load_persistent(self, key: str) -> Any:
+        """Read a live entry from the geocode_cache collection."""
+        try:
+            entry = get_db().geocode_cache.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.utcnow()}}
+            )
+        except PyMongoError:
+            current_app.logger.warning("Geocode cache read failed", exc_info=True)
+            return MISSING
+        return MISSING if entry is None else entry.get("result")
+
+    def _store_persistent(self, key: str, result: Optional[GeocodeResult], ttl: float) -> None:
+        """Write an entry to the geocode_cache collection."""
+        now = datetime.utcnow()
+        try:
+            get_db().geocode_cache.replace_one(
+                {"_id": key},
+                {"result": result, "created_at": now, "expires_at": now + timedelta(seconds=ttl)},
+                upsert=True
+            )
+        except PyMongoError:
+            current_app.logger.warning("Geocode cache write failed", exc_info=True)
+
+    def _store_result(self, key: str, result: Optional[GeocodeResult]) -> None:
+        """Cache a backend answer in both tiers, found or not."""
+        ttl = self.ttl if result else self.negative_ttl
+        self.memory.set(key, result, ttl)
+        self._store_persistent(key, result, ttl)
+
+    def lookup(self, address: str) -> Optional[GeocodeResult]:
+        """Resolve an address to coordinates.
+
+        Args:
+            address: Free-form address
+
+        Returns:
+            The geocode result, or None if the address could not be found
+
+        Raises:
+            GeocoderBusy: If the geocoding queue is full
+            GeocoderTimeout: If the worker does not answer in time
+            GeocodingError: If the backend fails for an uncached address
+        """
+        key = normalize_address(address)
+
+        result = self.memory.get(key)
+        if result is not MISSING:
+            self._count("memory_hits")
+            return result
+
+        result = self._load_persistent(key)
+        if result is not MISSING:
+            self._count("persistent_hits")
+            self.memory.set(key, result, self.ttl if result else self.negative_ttl)
+            return result
+
+        self._count("misses")
+        # The worker caches the answer itself, so waiters only need the future
+        future, _ = self.worker.submit(key, address)
+        try:
+            return future.result(timeout=self.app.config['GEOCODER_TIMEOUT_SECONDS'])
+        except FutureTimeoutError as e:
+            self._count("errors")
+            raise GeocoderTimeout("Timed out waiting for the geocoding service") from e
+        except GeocodingError:
+            self._count("errors")
+            raise
+
+    def reset(self) -> None:
+        """Clear the in-process tier and the counters."""
+        self.memory.clear()
+        with self._lock:
+            self.counters = dict.fromkeys(self.counters, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit and miss counters for both cache tiers."""
+        with self._lock:
+            stats = dict(self.counters)
+        stats["memory"] = self.memory.stats()
+        stats["worker"] = self.worker.stats()
+        return stats
+
+
+def get_geocoder(app: Optional[Flask] = None) -> GeocodingService:
+    """Get the geocoding service owned by the application.
+
+    Args:
+        app: The Flask application instance, defaults to the current app
+
+    Returns:
+        The application's GeocodingService
+    """
+    app = app or current_app._get_current_object()
+    return app.extensions['geocoder']
+
+def init_app(app: Flask) -> None:
+    """Attach a geocoding service to the Flask application.
+
+    Args:
+        app: The Flask application instance
+    """
+    for key, value in GEOCODER_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    app.extensions['geocoder'] = GeocodingService(app)
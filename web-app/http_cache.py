@@ -0,0 +1,77 @@
+"""ETag and conditional GET helpers for API resources."""
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from flask import Response, make_response, request
+from serialization import wants_native_json
+
+# Projection that loads just enough of a document to compute its validators
+VALIDATOR_PROJECTION = {"version": 1, "updated_at": 1, "created_at": 1}
+
+
+def document_validators(kind: str, document: Dict[str, Any], *variant: Any) -> Tuple[str, Optional[datetime]]:
+    """Compute the strong ETag and Last-Modified time for a document.
+
+    The ETag covers the document's version counter and modification time plus
+    anything else that changes the representation, such as the response
+    format and query arguments.
+
+    Args:
+        kind: Resource type, e.g. "bathroom" or "reviews"
+        document: The document, or its VALIDATOR_PROJECTION
+        variant: Extra values that select between representations
+
+    Returns:
+        The ETag value (unquoted) and the Last-Modified datetime
+    """
+    last_modified = document.get("updated_at") or document.get("created_at")
+    parts = [
+        kind,
+        str(document["_id"]),
+        document.get("version", 0),
+        last_modified.isoformat() if last_modified else "",
+        "v2" if wants_native_json() else "v1",
+        *variant
+    ]
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return digest, last_modified
+
+def is_not_modified(etag: str) -> bool:
+    """Check whether the client already holds the current representation.
+
+    Args:
+        etag: The current ETag
+
+    Returns:
+        True if the request's If-None-Match matches the ETag
+    """
+    return etag in request.if_none_match
+
+def with_validators(response: Any, etag: str, last_modified: Optional[datetime]) -> Response:
+    """Attach ETag and Last-Modified headers to a response.
+
+    Args:
+        response: Anything make_response accepts
+        etag: The ETag value (unquoted)
+        last_modified: The document's modification time
+
+    Returns:
+        The response with validator headers set
+    """
+    response = make_response(response)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+def not_modified(etag: str, last_modified: Optional[datetime]) -> Response:
+    """Build an empty 304 response carrying the current validators.
+
+    Args:
+        etag: The ETag value (unquoted)
+        last_modified: The document's modification time
+
+    Returns:
+        A 304 Not Modified response
+    """
+    return with_validators(("", 304), etag, last_modified)
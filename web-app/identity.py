@@ -0,0 +1,194 @@
+"""Request-scoped and short-lived process-wide cache of user profiles."""
+import hashlib
+import os
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Flask, current_app, g, has_request_context, jsonify
+from flask_jwt_extended import get_jwt_identity
+from cache import MISSING, TTLCache
+from schemas import get_db
+
+IDENTITY_DEFAULTS = {
+    'USER_CACHE_SIZE': 4096,
+    'USER_CACHE_TTL': 60,
+    # Accounts allowed to use the /api/admin and /api/jobs endpoints; nobody by default
+    'ADMIN_EMAILS': [email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()],
+}
+
+# Fields of a user document that are safe to show and to cache
+PUBLIC_USER_PROJECTION = {"email": 1, "name": 1, "created_at": 1, "updated_at": 1}
+
+UserProfile = Dict[str, Any]
+
+
+class UserCache:
+    """Two-level cache mapping user ids to public profiles.
+
+    Lookups are answered from a per-request dict first, then from a process
+    LRU whose entries live for USER_CACHE_TTL seconds, and only then from
+    MongoDB. Profile changes made through the API call ``invalidate``; changes
+    made by other worker processes show up once the TTL runs out.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        self.memory = TTLCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+        self.queries = 0
+
+    @staticmethod
+    def _request_cache() -> Dict[str, Optional[UserProfile]]:
+        if not has_request_context():
+            return {}
+        if 'user_profiles' not in g:
+            g.user_profiles = {}
+        return g.user_profiles
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, Optional[UserProfile]]:
+        """Look up several profiles with at most one query.
+
+        Args:
+            user_ids: User ids as strings
+
+        Returns:
+            Profiles keyed by user id, with None for unknown or invalid ids
+        """
+        request_cache = self._request_cache()
+        found: Dict[str, Optional[UserProfile]] = {}
+        missing: Dict[ObjectId, str] = {}
+        for user_id in user_ids:
+            user_id = str(user_id)
+            if user_id in found or user_id in request_cache:
+                found[user_id] = request_cache.get(user_id, found.get(user_id))
+                continue
+            profile = self.memory.get(user_id)
+            if profile is not MISSING:
+                found[user_id] = request_cache[user_id] = profile
+                continue
+            try:
+                missing[ObjectId(user_id)] = user_id
+            except (InvalidId, TypeError):
+                found[user_id] = request_cache[user_id] = None
+
+        if missing:
+            self.queries += 1
+            for user in get_db().users.find({"_id": {"$in": list(missing)}}, PUBLIC_USER_PROJECTION):
+                profile = dict(user, _id=str(user["_id"]))
+                self.memory.set(profile["_id"], profile)
+                found[profile["_id"]] = request_cache[profile["_id"]] = profile
+            for user_id in missing.values():
+                if user_id not in found:
+                    # Unknown users are only remembered for the rest of the request
+                    found[user_id] = request_cache[user_id] = None
+        return found
+
+    def get(self, user_id: Optional[str]) -> Optional[UserProfile]:
+        """Look up one profile.
+
+        Args:
+            user_id: User id as a string
+
+        Returns:
+            The public profile, or None if the user does not exist
+        """
+        if not user_id:
+            return None
+        return self.get_many([user_id])[str(user_id)]
+
+    def invalidate(self, user_id: str) -> None:
+        """Forget a user's profile after it changed."""
+        self.memory.pop(str(user_id))
+        self._request_cache().pop(str(user_id), None)
+
+    def reset(self) -> None:
+        """Drop every cached profile and reset the counters."""
+        self.memory.clear()
+        self.queries = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit rate counters and the number of user queries issued."""
+        stats = self.memory.stats()
+        stats["queries"] = self.queries
+        return stats
+
+
+def get_user_cache(app: Optional[Flask] = None) -> UserCache:
+    """Get the user profile cache owned by the application.
+
+    Args:
+        app: The Flask application instance, defaults to the current app
+
+    Returns:
+        The application's UserCache
+    """
+    app = app or current_app._get_current_object()
+    return app.extensions['user_cache']
+
+def current_user() -> Optional[UserProfile]:
+    """Profile of the user identified by the request's JWT, if any."""
+    return get_user_cache().get(get_jwt_identity())
+
+def is_admin(profile: Optional[UserProfile]) -> bool:
+    """Whether a profile belongs to an account listed in ADMIN_EMAILS."""
+    admins = {email.lower() for email in current_app.config['ADMIN_EMAILS']}
+    return bool(profile) and str(profile.get("email", "")).lower() in admins
+
+def admin_required(view: Callable[..., Any]) -> Callable[..., Any]:
+    """Reject requests from users who are not admins with 403.
+
+    Goes below ``jwt_required()``, which establishes the identity.
+    """
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not is_admin(current_user()):
+            return jsonify({"error": "Admin access required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def attach_reviewer_names(reviews: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Set ``reviewer_name`` on each review from one batched profile lookup.
+
+    Args:
+        reviews: Review documents with a ``user_id``
+
+    Returns:
+        The same reviews; the name is None when the reviewer no longer exists
+    """
+    profiles = get_user_cache().get_many({str(review["user_id"]) for review in reviews if review.get("user_id")})
+    for review in reviews:
+        profile = profiles.get(str(review.get("user_id")))
+        review["reviewer_name"] = profile.get("name") if profile else None
+    return reviews
+
+def reviewer_fingerprint(reviews: List[Dict[str, Any]]) -> str:
+    """Digest of the reviewers' profile versions, for ETags of listings that show their names.
+
+    Reads the profiles attach_reviewer_names already loaded, so it costs no query.
+
+    Args:
+        reviews: Review documents with a ``user_id``
+
+    Returns:
+        A hex digest that changes when any reviewer's profile changes
+    """
+    profiles = get_user_cache().get_many({str(review["user_id"]) for review in reviews if review.get("user_id")})
+    parts = sorted(
+        f"{user_id}:{(profile or {}).get('updated_at', '')}:{(profile or {}).get('name', '')}"
+        for user_id, profile in profiles.items()
+    )
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+def invalidate_user(user_id: str) -> None:
+    """Forget a user's cached profile in the current app."""
+    get_user_cache().invalidate(user_id)
+
+def init_app(app: Flask) -> None:
+    """Attach a user profile cache to the Flask application.
+
+    Args:
+        app: The Flask application instance
+    """
+    for key, value in IDENTITY_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    app.extensions['user_cache'] = UserCache(app)
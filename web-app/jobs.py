@@ -0,0 +1,351 @@
+"""Background jobs backed by a persistent ``jobs`` collection.
+
+Jobs are inserted as documents, claimed with an atomic find_one_and_update
+and run on a small pool of worker threads. A job whose worker dies is
+claimed again once its lease expires, and failures are retried with
+exponential backoff, so work survives restarts and crashes.
+"""
+import atexit
+import os
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Flask, current_app
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.database import Database
+from pymongo.errors import PyMongoError
+from response_cache import BATHROOMS_TAG, bathroom_tag, get_response_cache, invalidate
+from schemas import get_db, migrate, rebuild_rating_stats
+
+JOB_DEFAULTS = {
+    # Worker threads per process; 0 runs nothing in the background
+    'JOBS_WORKERS': 2,
+    'JOBS_MAX_ATTEMPTS': 5,
+    'JOBS_RETRY_BASE_SECONDS': 2.0,
+    # Idle workers look for due retries and abandoned jobs this often
+    'JOBS_POLL_SECONDS': 5.0,
+    # A running job not finished within its lease is claimed again
+    'JOBS_LEASE_SECONDS': 300,
+    # How long shutdown waits for running jobs
+    'JOBS_DRAIN_SECONDS': 10.0,
+    # Reviews removed per delete_many when cascading a bathroom delete
+    'JOBS_CASCADE_BATCH_SIZE': 1000,
+}
+
+JOBS_COLLECTION = "jobs"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Job types that may be started through the API; the rest are internal
+API_JOB_TYPES = {"rebuild_ratings", "migrate"}
+
+Handler = Callable[[Database, Dict[str, Any], Flask], Optional[Dict[str, Any]]]
+
+
+def cascade_delete_reviews(db: Database, payload: Dict[str, Any], app: Flask) -> Dict[str, Any]:
+    """Delete a removed bathroom's reviews in batches, so each write stays short."""
+    batch_size = app.config['JOBS_CASCADE_BATCH_SIZE']
+    deleted = 0
+    while True:
+        ids = [doc["_id"] for doc in db.reviews.find({"bathroom_id": payload["bathroom_id"]}, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            return {"deleted": deleted}
+        deleted += db.reviews.delete_many({"_id": {"$in": ids}}).deleted_count
+
+def rebuild_ratings(db: Database, payload: Dict[str, Any], app: Flask) -> Dict[str, Any]:
+    """Recompute rating aggregates, optionally for some bathrooms only, and drop cached copies."""
+    bathroom_ids = payload.get("bathroom_ids")
+    rebuilt = rebuild_rating_stats(db, bathroom_ids)
+    if bathroom_ids:
+        invalidate(BATHROOMS_TAG, *(bathroom_tag(bathroom_id) for bathroom_id in bathroom_ids))
+    else:
+        # Every bathroom changed, so every cached response built from one is stale
+        get_response_cache(app).reset()
+    return {"rebuilt": rebuilt}
+
+def apply_migrations(db: Database, payload: Dict[str, Any], app: Flask) -> Dict[str, Any]:
+    """Apply pending index migrations."""
+    return {"applied": migrate(db)}
+
+
+DEFAULT_HANDLERS: Dict[str, Handler] = {
+    "cascade_delete_reviews": cascade_delete_reviews,
+    "rebuild_ratings": rebuild_ratings,
+    "migrate": apply_migrations,
+}
+
+
+# Runners of every app in this process, drained by one exit hook
+_RUNNERS: "weakref.WeakSet[JobRunner]" = weakref.WeakSet()
+
+
+def _shutdown_runners() -> None:
+    for runner in list(_RUNNERS):
+        runner.shutdown()
+
+
+# Registered once per process; an atexit hook per app would keep every runner alive
+atexit.register(_shutdown_runners)
+
+
+class UnknownJobType(ValueError):
+    """Raised when enqueuing a job type without a handler."""
+
+
+class JobRunner:
+    """Enqueues jobs and runs them on a pool of worker threads.
+
+    Each worker claims the oldest due job, runs it inside an application
+    context and records the outcome on the job document. Workers start on
+    the first enqueue or request in each process, so forked servers get
+    their own.
+
+    Args:
+        app: The Flask application, read for settings on every claim
+        handlers: Job type to handler, defaults to DEFAULT_HANDLERS
+    """
+
+    def __init__(self, app: Flask, handlers: Optional[Dict[str, Handler]] = None) -> None:
+        self.app = app
+        self.handlers = dict(DEFAULT_HANDLERS if handlers is None else handlers)
+        self.owner = f"{os.uname().nodename}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._pid: Optional[int] = None
+        self.counters = {"enqueued": 0, "succeeded": 0, "failed": 0, "retried": 0}
+        _RUNNERS.add(self)
+
+    def register(self, job_type: str, handler: Handler) -> None:
+        """Add or replace the handler for a job type."""
+        self.handlers[job_type] = handler
+
+    def _collection(self) -> Any:
+        return get_db()[JOBS_COLLECTION]
+
+    def enqueue(self, job_type: str, payload: Optional[Dict[str, Any]] = None,
+                max_attempts: Optional[int] = None) -> str:
+        """Persist a job and wake a worker for it.
+
+        Must be called inside an application context.
+
+        Args:
+            job_type: A registered job type
+            payload: Arguments for the handler
+            max_attempts: Runs before the job is marked failed
+
+        Returns:
+            The job id
+
+        Raises:
+            UnknownJobType: If no handler is registered for job_type
+        """
+        if job_type not in self.handlers:
+            raise UnknownJobType(f"Unknown job type: {job_type}")
+        now = datetime.utcnow()
+        job = {
+            "type": job_type,
+            "payload": payload or {},
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": max_attempts or self.app.config['JOBS_MAX_ATTEMPTS'],
+            "run_after": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        job_id = self._collection().insert_one(job).inserted_id
+        with self._lock:
+            self.counters["enqueued"] += 1
+        self.ensure_started()
+        self._wakeup.set()
+        return str(job_id)
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest due job, or one whose lease has expired.
+
+        Must be called inside an application context.
+        """
+        now = datetime.utcnow()
+        return self._collection().find_one_and_update(
+            {"$or": [
+                {"status": QUEUED, "run_after": {"$lte": now}},
+                {"status": RUNNING, "lease_expires_at": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "owner": self.owner,
+                    "started_at": now,
+                    "updated_at": now,
+                    "lease_expires_at": now + timedelta(seconds=self.app.config['JOBS_LEASE_SECONDS']),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_after", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def run_job(self, job: Dict[str, Any]) -> None:
+        """Run a claimed job and record success, a retry or failure.
+
+        Must be called inside an application context.
+        """
+        handler = self.handlers.get(job["type"])
+        try:
+            if handler is None:
+                raise UnknownJobType(f"Unknown job type: {job['type']}")
+            result = handler(get_db(), job["payload"], self.app)
+        except Exception as e:  # pylint: disable=broad-except
+            now = datetime.utcnow()
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] < job["max_attempts"] and not isinstance(e, UnknownJobType):
+                delay = self.app.config['JOBS_RETRY_BASE_SECONDS'] * 2 ** (job["attempts"] - 1)
+                update = {"status": QUEUED, "run_after": now + timedelta(seconds=delay), "error": error}
+                counter = "retried"
+            else:
+                update = {"status": FAILED, "finished_at": now, "error": error}
+                counter = "failed"
+            self.app.logger.warning("Job %s (%s) attempt %d failed: %s", job["_id"], job["type"], job["attempts"], error)
+        else:
+            now = datetime.utcnow()
+            update = {"status": SUCCEEDED, "finished_at": now, "result": result or {}, "error": None}
+            counter = "succeeded"
+        update["updated_at"] = now
+        # Only the current owner may record an outcome, in case the lease was taken over
+        self._collection().update_one(
+            {"_id": job["_id"], "owner": self.owner, "status": RUNNING},
+            {"$set": update, "$unset": {"lease_expires_at": ""}}
+        )
+        with self._lock:
+            self.counters[counter] += 1
+
+    def run_pending(self, limit: Optional[int] = None) -> int:
+        """Run due jobs on the calling thread until none are left.
+
+        Must be called inside an application context.
+
+        Args:
+            limit: Most jobs to run
+
+        Returns:
+            The number of jobs run
+        """
+        ran = 0
+        while limit is None or ran < limit:
+            job = self.claim()
+            if job is None:
+                break
+            self.run_job(job)
+            ran += 1
+        return ran
+
+    def _work(self) -> None:
+        """Worker loop: run due jobs, then sleep until woken or the poll interval passes."""
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    ran = self.run_pending(limit=1)
+            except PyMongoError as e:
+                self.app.logger.error("Job worker could not reach the database: %s", e)
+                ran = 0
+            if not ran:
+                self._wakeup.wait(self.app.config['JOBS_POLL_SECONDS'])
+                self._wakeup.clear()
+
+    def ensure_started(self) -> None:
+        """Start the workers in this process if they are not running."""
+        workers = self.app.config['JOBS_WORKERS']
+        with self._lock:
+            if workers <= 0 or (self._threads and self._pid == os.getpid()):
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            # Daemon threads are not joined at exit before atexit runs, so shutdown() can drain them
+            self._threads = [
+                threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True) for i in range(workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Stop claiming jobs and wait for running ones to finish.
+
+        Queued jobs stay in the collection for the next process.
+
+        Args:
+            timeout: Seconds to wait, defaults to JOBS_DRAIN_SECONDS
+
+        Returns:
+            True if every worker finished in time
+        """
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if not threads or self._pid != os.getpid():
+            return True
+        self._stopping.set()
+        self._wakeup.set()
+        deadline = time.monotonic() + (self.app.config['JOBS_DRAIN_SECONDS'] if timeout is None else timeout)
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        not_done = [thread for thread in threads if thread.is_alive()]
+        if not_done:
+            self.app.logger.warning("%d job workers still running at shutdown; their jobs will be retried", len(not_done))
+        return not not_done
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Load a job by id, or None if the id is unknown or malformed."""
+        try:
+            return self._collection().find_one({"_id": ObjectId(job_id)})
+        except InvalidId:
+            return None
+
+    def reset(self) -> None:
+        """Zero the counters."""
+        with self._lock:
+            self.counters = dict.fromkeys(self.counters, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return worker state and job counters for this process."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.counters)
+            stats["workers"] = len(self._threads)
+        stats["running"] = bool(stats["workers"]) and not self._stopping.is_set()
+        return stats
+
+
+def get_job_runner(app: Optional[Flask] = None) -> JobRunner:
+    """Get the job runner owned by the application.
+
+    Args:
+        app: The Flask application instance, defaults to the current app
+
+    Returns:
+        The application's JobRunner
+    """
+    app = app or current_app._get_current_object()
+    return app.extensions['job_runner']
+
+def enqueue(job_type: str, payload: Optional[Dict[str, Any]] = None) -> str:
+    """Enqueue a job on the current application's runner."""
+    return get_job_runner().enqueue(job_type, payload)
+
+def init_app(app: Flask) -> None:
+    """Register the job runner, starting its workers with the first request.
+
+    Args:
+        app: The Flask application instance
+    """
+    for key, value in JOB_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    runner = JobRunner(app)
+    app.extensions['job_runner'] = runner
+    # Picks up retries and jobs abandoned by other processes without waiting for an enqueue
+    app.before_request(runner.ensure_started)
@@ -0,0 +1,459 @@
+"""Request, MongoDB, geocoder and template metrics in Prometheus text format."""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from flask import Flask, Response, current_app, g, has_app_context, request, before_render_template, template_rendered
+from pymongo import monitoring
+from schemas import get_pool
+
+METRICS_DEFAULTS = {
+    'METRICS_ENABLED': True,
+    'METRICS_PREFIX': 'bathroom_map',
+}
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from cache hits to slow geocoder calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Buckets for MongoDB round trips made by one request
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+# Quantiles estimated from the latency histogram for each endpoint
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = Tuple[str, ...]
+
+
+class ShardedValues:
+    """Per-thread storage for metric values.
+
+    Each thread writes only to its own dict, so recording never takes a lock.
+    Readers copy every shard and merge them. Shards of threads that have
+    exited are folded into one retired shard at read time, so servers that
+    start a thread per request do not accumulate them.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Tuple[threading.Thread, Dict[Labels, Any]]] = []
+        self._retired: Dict[Labels, Any] = {}
+
+    def shard(self) -> Dict[Labels, Any]:
+        """Return the calling thread's shard, registering it on first use."""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def snapshots(self) -> List[Dict[Labels, Any]]:
+        """Copy every shard, retiring those of finished threads."""
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    for labels, value in shard.items():
+                        self._retired[labels] = _merge(self._retired.get(labels), value)
+            self._shards = live
+            return [self._retired.copy()] + [shard.copy() for _, shard in live]
+
+    def clear(self) -> None:
+        with self._lock:
+            for _, shard in self._shards:
+                shard.clear()
+            self._retired.clear()
+
+
+def _merge(total: Any, value: Any) -> Any:
+    """Add a counter value or histogram bucket list onto a running total."""
+    if total is None:
+        return list(value) if isinstance(value, list) else value
+    if isinstance(value, list):
+        return [a + b for a, b in zip(total, value)]
+    return total + value
+
+
+class Metric:
+    """A named metric with a fixed set of label names.
+
+    Args:
+        name: Metric name without the application prefix
+        description: HELP text
+        labelnames: Names of the labels every sample carries
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.values = ShardedValues()
+
+    def collect(self) -> Dict[Labels, Any]:
+        """Merge every thread's values."""
+        merged: Dict[Labels, Any] = {}
+        for shard in self.values.snapshots():
+            for labels, value in shard.items():
+                merged[labels] = _merge(merged.get(labels), value)
+        return merged
+
+
+class Counter(Metric):
+    """Monotonic total."""
+
+    kind = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        shard = self.values.shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that goes up and down, such as requests in flight."""
+
+    kind = "gauge"
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        shard = self.values.shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+
+class Histogram(Metric):
+    """Bucketed observations with their sum and count.
+
+    Args:
+        name: Metric name without the application prefix
+        description: HELP text
+        labelnames: Names of the labels every sample carries
+        buckets: Upper bounds of the buckets, in increasing order
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels: Labels, value: float) -> None:
+        shard = self.values.shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # One slot per bucket plus +Inf, then sum and count
+            entry = shard[labels] = [0] * (len(self.buckets) + 3)
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def quantile(self, entry: List[float], q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside the bucket that holds it.
+
+        Args:
+            entry: Merged bucket counts, sum and count for one label set
+            q: Quantile between 0 and 1
+
+        Returns:
+            The estimate, or None without observations
+        """
+        count = entry[-1]
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for index, upper in enumerate(self.buckets):
+            in_bucket = entry[index]
+            if seen + in_bucket >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                fraction = (rank - seen) / in_bucket if in_bucket else 0.0
+                return lower + (upper - lower) * fraction
+            seen += in_bucket
+        return self.buckets[-1]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _RequestTiming:
+    """Measurements for one request, kept until its response is finished.
+
+    Args:
+        endpoint: The matched endpoint name
+        method: The HTTP method
+    """
+
+    def __init__(self, endpoint: str, method: str) -> None:
+        self.endpoint = endpoint
+        self.method = method
+        self.started = time.perf_counter()
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        self.streaming = False
+        self.finished = False
+
+
+class _CountingBody:
+    """Wrap a streamed response body to count the bytes sent.
+
+    Args:
+        chunks: The response's iterable of str or bytes chunks
+        charset: Encoding used for str chunks
+    """
+
+    def __init__(self, chunks: Iterable[Any], charset: str) -> None:
+        self.chunks = chunks
+        self.charset = charset
+        self.sent = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.chunks:
+            data = chunk.encode(self.charset) if isinstance(chunk, str) else chunk
+            self.sent += len(data)
+            yield data
+
+    def close(self) -> None:
+        close = getattr(self.chunks, "close", None)
+        if close is not None:
+            close()
+
+
+class MetricsRegistry(monitoring.CommandListener):
+    """All of the application's metrics, plus the hooks that feed them.
+
+    Request middleware records latency, status codes, response sizes and
+    in-flight counts per endpoint. Streamed responses are measured until the
+    server closes them. A command listener on the MongoDB pool
+    counts round trips and their time for the request that issued them.
+    Template render time comes from Flask's template signals.
+
+    Args:
+        prefix: Prefix added to every metric name
+    """
+
+    def __init__(self, prefix: str = "bathroom_map") -> None:
+        self.prefix = prefix
+        self.requests = Counter("http_requests_total", "HTTP requests by endpoint, method and status.",
+                                ("endpoint", "method", "status"))
+        self.latency = Histogram("http_request_duration_seconds", "Time to build a response.", ("endpoint",))
+        self.response_bytes = Counter("http_response_bytes_total", "Response body bytes sent.", ("endpoint",))
+        self.in_flight = Gauge("http_requests_in_flight", "Requests being handled.", ("endpoint",))
+        self.mongo_commands = Counter("mongo_commands_total", "MongoDB commands by endpoint and command.",
+                                      ("endpoint", "command"))
+        self.mongo_seconds = Counter("mongo_command_seconds_total", "Time spent in MongoDB commands.",
+                                     ("endpoint",))
+        self.mongo_round_trips = Histogram("mongo_round_trips_per_request", "MongoDB commands issued per request.",
+                                           ("endpoint",), ROUND_TRIP_BUCKETS)
+        self.mongo_request_seconds = Histogram("mongo_seconds_per_request", "MongoDB time per request.",
+                                               ("endpoint",))
+        self.geocode = Histogram("geocode_duration_seconds", "Time to resolve an address.", ("outcome",))
+        self.template_render = Histogram("template_render_seconds", "Template render time.", ("template",))
+        self.metrics: List[Metric] = [
+            self.requests, self.latency, self.response_bytes, self.in_flight,
+            self.mongo_commands, self.mongo_seconds, self.mongo_round_trips, self.mongo_request_seconds,
+            self.geocode, self.template_render,
+        ]
+
+    # Request middleware
+
+    @staticmethod
+    def _endpoint() -> str:
+        return request.endpoint or "unmatched"
+
+    def before_request(self) -> None:
+        g.metrics_request = _RequestTiming(self._endpoint(), request.method)
+        self.in_flight.inc((g.metrics_request.endpoint,))
+
+    def after_request(self, response: Response) -> Response:
+        timing = g.get("metrics_request")
+        if timing is None:
+            return response
+        # Error pages are wrapped as iterators too, but their length is known
+        if not response.is_streamed or response.content_length is not None:
+            self._finish(timing, response.status_code, response.content_length or 0)
+            return response
+        # A streamed body is generated after this returns, and the MongoDB
+        # commands it issues still belong to the request, so finish once the
+        # server closes the response
+        timing.streaming = True
+        body = _CountingBody(response.response, response.charset)
+        response.response = body
+        response.call_on_close(lambda: self._finish(timing, response.status_code, body.sent))
+        return response
+
+    def teardown_request(self, error: Optional[BaseException] = None) -> None:
+        # after_request is skipped when a view raises, so finish the request here
+        timing = g.get("metrics_request")
+        if timing is not None and not timing.streaming:
+            self._finish(timing, 500, 0)
+
+    def _finish(self, timing: "_RequestTiming", status: int, size: int) -> None:
+        if timing.finished:
+            return
+        timing.finished = True
+        endpoint = timing.endpoint
+        self.in_flight.dec((endpoint,))
+        self.requests.inc((endpoint, timing.method, str(status)))
+        self.latency.observe((endpoint,), time.perf_counter() - timing.started)
+        self.response_bytes.inc((endpoint,), size)
+        self.mongo_round_trips.observe((endpoint,), timing.mongo_commands)
+        self.mongo_request_seconds.observe((endpoint,), timing.mongo_seconds)
+
+    # MongoDB command listener, called on the thread that issued the command
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._command_done(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._command_done(event)
+
+    def _command_done(self, event: Any) -> None:
+        seconds = event.duration_micros / 1e6
+        endpoint = "(no request)"
+        timing = g.get("metrics_request") if has_app_context() else None
+        if timing is not None and not timing.finished:
+            endpoint = timing.endpoint
+            timing.mongo_commands += 1
+            timing.mongo_seconds += seconds
+        self.mongo_commands.inc((endpoint, event.command_name))
+        self.mongo_seconds.inc((endpoint,), seconds)
+
+    # Template signals
+
+    def template_started(self, sender: Any, template: Any, context: Dict[str, Any], **extra: Any) -> None:
+        g.setdefault("template_starts", []).append(time.perf_counter())
+
+    def template_finished(self, sender: Any, template: Any, context: Dict[str, Any], **extra: Any) -> None:
+        starts = g.get("template_starts")
+        if starts:
+            self.template_render.observe((template.name or "(string)",), time.perf_counter() - starts.pop())
+
+    @contextmanager
+    def time_geocode(self) -> Iterator[Dict[str, str]]:
+        """Time a geocoder lookup; set ``outcome`` on the yielded dict to label it."""
+        labels = {"outcome": "error"}
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.geocode.observe((labels["outcome"],), time.perf_counter() - started)
+
+    # Exposition
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self.metrics:
+            name = f"{self.prefix}_{metric.name}"
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            samples = sorted(metric.collect().items())
+            for labels, value in samples:
+                if not isinstance(metric, Histogram):
+                    lines.append(f"{name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for upper, count in zip(metric.buckets + (float("inf"),), value):
+                    cumulative += count
+                    label_text = _format_labels(metric.labelnames + ("le",), labels + (_format_value(upper),))
+                    lines.append(f"{name}_bucket{label_text} {cumulative}")
+                label_text = _format_labels(metric.labelnames, labels)
+                lines.append(f"{name}_sum{label_text} {_format_value(float(value[-2]))}")
+                lines.append(f"{name}_count{label_text} {value[-1]}")
+            if metric is self.latency and samples:
+                lines.extend(self._render_quantiles(name, samples))
+        return "\n".join(lines) + "\n"
+
+    def _render_quantiles(self, name: str, samples: List[Tuple[Labels, Any]]) -> List[str]:
+        """Estimated p50, p95 and p99 per endpoint, for dashboards without PromQL."""
+        quantile_name = f"{name}_quantile"
+        lines = [
+            f"# HELP {quantile_name} Latency quantiles estimated from the histogram buckets.",
+            f"# TYPE {quantile_name} gauge",
+        ]
+        for labels, entry in samples:
+            for q in QUANTILES:
+                estimate = self.latency.quantile(entry, q)
+                if estimate is not None:
+                    label_text = _format_labels(("endpoint", "quantile"), labels + (str(q),))
+                    lines.append(f"{quantile_name}{label_text} {_format_value(estimate)}")
+        return lines
+
+    def reset(self) -> None:
+        """Clear every metric."""
+        for metric in self.metrics:
+            metric.values.clear()
+
+
+def get_metrics(app: Optional[Flask] = None) -> MetricsRegistry:
+    """Get the metrics registry owned by the application.
+
+    Args:
+        app: The Flask application instance, defaults to the current app
+
+    Returns:
+        The application's MetricsRegistry
+    """
+    app = app or current_app._get_current_object()
+    return app.extensions['metrics']
+
+def init_app(app: Flask) -> None:
+    """Attach metrics middleware, the MongoDB listener and template signals.
+
+    Must run before the MongoDB pool creates its client.
+
+    Args:
+        app: The Flask application instance
+    """
+    for key, value in METRICS_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    registry = MetricsRegistry(app.config['METRICS_PREFIX'])
+    app.extensions['metrics'] = registry
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    app.before_request(registry.before_request)
+    app.after_request(registry.after_request)
+    app.teardown_request(registry.teardown_request)
+    get_pool(app).listeners.append(registry)
+    before_render_template.connect(registry.template_started, app)
+    template_rendered.connect(registry.template_finished, app)
+
+def render_response(registry: Optional[MetricsRegistry] = None) -> Response:
+    """Build a Prometheus scrape response.
+
+    Args:
+        registry: Metrics to render, defaults to the current app's
+
+    Returns:
+        The text exposition response
+    """
+    registry = registry or get_metrics()
+    response = Response(registry.render())
+    response.headers['Content-Type'] = PROMETHEUS_CONTENT_TYPE
+    return response
+
@@ -0,0 +1,136 @@
+"""Keyset (cursor) pagination helpers for the list endpoints."""
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from bson import Decimal128, ObjectId, json_util
+from bson.errors import BSONError
+from pymongo import ASCENDING, DESCENDING
+from pymongo.collection import Collection
+
+# Largest page a cursor-mode client may request
+MAX_PER_PAGE = 100
+
+SortSpec = Sequence[Tuple[str, int]]
+
+# Types a sort key value may have in a cursor; bool and Int64 are int subclasses
+CURSOR_VALUE_TYPES = (ObjectId, datetime, str, int, float, Decimal128)
+
+# Newest reviews first, served by the bathroom_id_1_created_at_-1__id_-1 index
+NEWEST_FIRST: SortSpec = (("created_at", DESCENDING), ("_id", DESCENDING))
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor that cannot be decoded."""
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode the sort key values of the last returned document as an opaque token.
+
+    Args:
+        values: Sort key values, ending with the document's _id
+
+    Returns:
+        A URL-safe cursor string
+    """
+    raw = json_util.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str, size: int) -> List[Any]:
+    """Decode a cursor produced by encode_cursor.
+
+    Args:
+        token: The opaque cursor string
+        size: Number of sort key values the cursor must contain
+
+    Returns:
+        The decoded sort key values
+
+    Raises:
+        InvalidCursor: If the token is malformed or does not match the sort
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, ValueError, UnicodeError, TypeError, IndexError, BSONError) as e:
+        # Malformed extended JSON such as {"$oid": "zz"} raises more than ValueError
+        raise InvalidCursor("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Invalid cursor")
+    # Anything else, such as a dict or a Regex, would reach the filter as an operator or pattern
+    if not all(value is None or isinstance(value, CURSOR_VALUE_TYPES) for value in values):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+def _get_path(document: Dict[str, Any], path: str) -> Any:
+    """Read a dotted field path from a document."""
+    value = document
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+def keyset_filter(query: Dict[str, Any], sort: SortSpec, values: List[Any]) -> Dict[str, Any]:
+    """Extend a query so it only matches documents after the cursor position.
+
+    Args:
+        query: The base filter
+        sort: Sort specification ending with _id
+        values: Sort key values of the last document already returned
+
+    Returns:
+        A filter that seeks past the cursor using the sort index
+    """
+    branches = []
+    for index, (field, direction) in enumerate(sort):
+        branch = {prev_field: values[prev] for prev, (prev_field, _) in enumerate(sort[:index])}
+        branch[field] = {"$gt" if direction == ASCENDING else "$lt": values[index]}
+        branches.append(branch)
+    seek = branches[0] if len(branches) == 1 else {"$or": branches}
+    return {"$and": [query, seek]} if query else seek
+
+def cursor_page(
+    collection: Collection,
+    query: Dict[str, Any],
+    per_page: int,
+    cursor: Optional[str] = None,
+    sort: SortSpec = (("_id", ASCENDING),)
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Fetch one page of documents by seeking from a cursor instead of skipping.
+
+    Args:
+        collection: Collection to read from
+        query: The base filter
+        per_page: Number of documents to return, clamped to MAX_PER_PAGE
+        cursor: Cursor returned with the previous page, or None for the first page
+        sort: Sort specification ending with _id
+
+    Returns:
+        The page of documents and the cursor for the next page, or None at the end
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    if cursor:
+        query = keyset_filter(query, sort, decode_cursor(cursor, len(sort)))
+
+    documents = list(collection.find(query).sort(list(sort)).limit(per_page + 1))
+    next_cursor = None
+    if len(documents) > per_page:
+        documents = documents[:per_page]
+        next_cursor = encode_cursor([_get_path(documents[-1], field) for field, _ in sort])
+    return documents, next_cursor
+
+def count_total(collection: Collection, query: Dict[str, Any]) -> Tuple[int, bool]:
+    """Count matching documents as cheaply as the query allows.
+
+    Args:
+        collection: Collection to count
+        query: The filter used for the listing
+
+    Returns:
+        The total and whether it is an estimate taken from collection metadata
+    """
+    if not query:
+        return collection.estimated_document_count(), True
+    return collection.count_documents(query), False
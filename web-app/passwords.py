@@ -0,0 +1,208 @@
+"""Password hashing on a bounded worker pool with configurable cost."""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Deque, Dict, Optional
+from flask import Flask, current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+PASSWORD_DEFAULTS = {
+    'PASSWORD_HASH_METHOD': f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}',
+    'PASSWORD_SALT_LENGTH': 16,
+    'PASSWORD_HASH_WORKERS': 2,
+    'PASSWORD_HASH_QUEUE_SIZE': 16,
+    'PASSWORD_HASH_TIMEOUT_SECONDS': 10.0,
+}
+
+# Number of recent hash durations kept for the latency percentiles
+LATENCY_SAMPLES = 1024
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash is not ready in time."""
+
+
+def normalize_method(method: str) -> str:
+    """Spell out the iteration count werkzeug applies to a bare pbkdf2 method.
+
+    Args:
+        method: A werkzeug hash method such as ``pbkdf2:sha256``
+
+    Returns:
+        The method as it appears in stored hashes
+    """
+    parts = method.split(":")
+    if parts[0] == "pbkdf2" and len(parts) == 2:
+        return f"{method}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method
+
+
+class PasswordHasher:
+    """Runs password hashing on a small pool of dedicated threads.
+
+    PBKDF2 releases the GIL while it iterates, so hashing on a pool keeps
+    request threads free for other routes. Work beyond the pool size waits in
+    a queue of PASSWORD_HASH_QUEUE_SIZE entries; further requests are rejected
+    with PasswordHasherBusy instead of piling up.
+
+    Args:
+        app: The Flask application, read for the hash parameters on every call
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._pending = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.counters = {"hashes": 0, "verifications": 0, "rehashes": 0, "rejected": 0, "timeouts": 0}
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        """Create the pool on first use, or again in a forked child."""
+        if self._executor is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.app.config['PASSWORD_HASH_WORKERS'],
+                thread_name_prefix="password-hasher"
+            )
+        return self._executor
+
+    def _timed(self, func: Callable[..., Any], *args: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._latencies.append(time.perf_counter() - started)
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _run(self, counter: str, func: Callable[..., Any], *args: Any) -> Any:
+        """Run func on the pool and wait for its result.
+
+        Raises:
+            PasswordHasherBusy: If the queue is full or the result is late
+        """
+        config = self.app.config
+        with self._lock:
+            if self._pending >= config['PASSWORD_HASH_WORKERS'] + config['PASSWORD_HASH_QUEUE_SIZE']:
+                self.counters["rejected"] += 1
+                raise PasswordHasherBusy("Password hashing queue is full")
+            self._pending += 1
+            self.counters[counter] += 1
+            executor = self._ensure_executor()
+        future: Future = executor.submit(self._timed, func, *args)
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=config['PASSWORD_HASH_TIMEOUT_SECONDS'])
+        except FutureTimeoutError as e:
+            future.cancel()
+            with self._lock:
+                self.counters["timeouts"] += 1
+            raise PasswordHasherBusy("Timed out waiting for password hashing") from e
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured method and salt length.
+
+        Args:
+            password: The plaintext password
+
+        Returns:
+            The werkzeug password hash
+        """
+        return self._run(
+            "hashes",
+            generate_password_hash,
+            password,
+            self.app.config['PASSWORD_HASH_METHOD'],
+            self.app.config['PASSWORD_SALT_LENGTH']
+        )
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Check a password against a stored hash.
+
+        Args:
+            password_hash: The stored werkzeug hash
+            password: The plaintext password
+
+        Returns:
+            True if the password matches
+        """
+        return self._run("verifications", check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Check whether a stored hash was made with different parameters.
+
+        Args:
+            password_hash: The stored werkzeug hash
+
+        Returns:
+            True if the hash should be replaced on the next successful login
+        """
+        if password_hash.count("$") < 2:
+            return True
+        method, salt, _ = password_hash.split("$", 2)
+        return (
+            method != normalize_method(self.app.config['PASSWORD_HASH_METHOD'])
+            or len(salt) != self.app.config['PASSWORD_SALT_LENGTH']
+        )
+
+    def record_rehash(self) -> None:
+        """Count a stored hash upgraded after login."""
+        with self._lock:
+            self.counters["rehashes"] += 1
+
+    def shutdown(self) -> None:
+        """Stop the pool once queued work finishes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def reset(self) -> None:
+        """Clear the counters and latency samples."""
+        with self._lock:
+            self.counters = dict.fromkeys(self.counters, 0)
+            self._latencies.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, counters and hash latency percentiles in milliseconds."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.counters)
+            stats["pending"] = self._pending
+            samples = sorted(self._latencies)
+        stats["workers"] = self.app.config['PASSWORD_HASH_WORKERS']
+        stats["latency_ms"] = {
+            "samples": len(samples),
+            "p50": round(samples[len(samples) // 2] * 1000, 2) if samples else None,
+            "p95": round(samples[int(len(samples) * 0.95)] * 1000, 2) if samples else None,
+            "max": round(samples[-1] * 1000, 2) if samples else None,
+        }
+        return stats
+
+
+def get_hasher(app: Optional[Flask] = None) -> PasswordHasher:
+    """Get the password hasher owned by the application.
+
+    Args:
+        app: The Flask application instance, defaults to the current app
+
+    Returns:
+        The application's PasswordHasher
+    """
+    app = app or current_app._get_current_object()
+    return app.extensions['password_hasher']
+
+def init_app(app: Flask) -> None:
+    """Attach a password hasher to the Flask application.
+
+    Args:
+        app: The Flask application instance
+    """
+    for key, value in PASSWORD_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    app.extensions['password_hasher'] = PasswordHasher(app)
@@ -0,0 +1,304 @@
+"""Per-request MongoDB command counts, route budgets and N+1 detection."""
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from flask import Flask, Response, current_app, g, has_request_context, request
+from pymongo import monitoring
+from schemas import get_pool
+
+QUERY_BUDGET_DEFAULTS = {
+    'QUERY_BUDGET_ENABLED': True,
+    # Commands a request may issue before it is logged; None disables the default
+    'QUERY_BUDGET_DEFAULT': 10,
+    # Per-endpoint overrides; None means unlimited
+    'QUERY_BUDGETS': {
+        'bulk_create_bathrooms': None,
+        'export_collection': None,
+    },
+    # Identical commands on one collection in one request that suggest an N+1
+    'QUERY_BUDGET_REPEAT_THRESHOLD': 5,
+    'QUERY_BUDGET_LOG_SIZE': 100,
+}
+
+# Commands the driver issues on its own, which no handler asked for
+IGNORED_COMMANDS = {"hello", "isMaster", "ismaster", "endSessions", "explain", "killCursors"}
+
+# Collection methods and the server command each one sends
+COMMAND_NAMES = {
+    "find": "find",
+    "find_one": "find",
+    "aggregate": "aggregate",
+    "count_documents": "aggregate",
+    "estimated_document_count": "count",
+    "distinct": "distinct",
+    "insert_one": "insert",
+    "insert_many": "insert",
+    "update_one": "update",
+    "update_many": "update",
+    "replace_one": "update",
+    "delete_one": "delete",
+    "delete_many": "delete",
+    "find_one_and_update": "findAndModify",
+    "find_one_and_replace": "findAndModify",
+    "find_one_and_delete": "findAndModify",
+    "bulk_write": "bulkWrite",
+    "create_index": "createIndexes",
+    "create_indexes": "createIndexes",
+    "drop_index": "dropIndexes",
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by assert_max_queries when a block issues too many commands."""
+
+
+def repeated_commands(commands: List[Dict[str, Any]], threshold: int) -> List[Dict[str, Any]]:
+    """Find command and collection pairs issued at least threshold times.
+
+    Args:
+        commands: Commands recorded for one request
+        threshold: Repeat count at which a pair is reported
+
+    Returns:
+        The repeated pairs with their counts, most repeated first
+    """
+    counts = Counter((entry["command"], entry["collection"]) for entry in commands)
+    return [
+        {"command": command, "collection": collection, "count": count}
+        for (command, collection), count in counts.most_common()
+        if count >= threshold
+    ]
+
+def _describe(commands: List[Dict[str, Any]]) -> str:
+    return ", ".join(f"{entry['command']} {entry['collection']}" for entry in commands)
+
+
+class QueryCounter(monitoring.CommandListener):
+    """Counts the MongoDB commands issued by each request.
+
+    Commands arrive from PyMongo command monitoring, or from a
+    CountingDatabase wrapper when the database is a mock that emits no
+    events. Each request's commands are compared with its endpoint's budget
+    when the response is built; requests over budget, or repeating the same
+    command on a collection QUERY_BUDGET_REPEAT_THRESHOLD times, are logged
+    as warnings and kept in a ring buffer.
+
+    Args:
+        app: The Flask application, read for budgets on every request
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._violations: Deque[Dict[str, Any]] = deque(maxlen=app.config['QUERY_BUDGET_LOG_SIZE'])
+        self.counters = {"requests": 0, "commands": 0, "over_budget": 0, "repeated": 0}
+
+    # CommandListener callbacks run on the thread that issued the command
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        self.record(event.command_name, event.command.get(event.command_name))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+    def record(self, command: str, collection: Any) -> None:
+        """Attribute one command to the current request and any open captures.
+
+        Args:
+            command: Server command name, such as find or insert
+            collection: Collection the command targets
+        """
+        if command in IGNORED_COMMANDS:
+            return
+        entry = {"command": command, "collection": collection if isinstance(collection, str) else None}
+        for captured in getattr(self._local, "captures", ()):
+            captured.append(entry)
+        if has_request_context() and "query_commands" in g:
+            g.query_commands.append(entry)
+
+    @contextmanager
+    def capture(self) -> Iterator[List[Dict[str, Any]]]:
+        """Collect every command issued by the calling thread inside the block."""
+        captures = self._local.__dict__.setdefault("captures", [])
+        captured: List[Dict[str, Any]] = []
+        captures.append(captured)
+        try:
+            yield captured
+        finally:
+            captures.remove(captured)
+
+    # Request hooks
+
+    def budget_for(self, endpoint: Optional[str]) -> Optional[int]:
+        """Command budget for an endpoint, or None if it is unlimited."""
+        budgets = self.app.config['QUERY_BUDGETS']
+        if endpoint in budgets:
+            return budgets[endpoint]
+        return self.app.config['QUERY_BUDGET_DEFAULT']
+
+    def before_request(self) -> None:
+        g.query_commands = []
+
+    def after_request(self, response: Response) -> Response:
+        commands = g.pop("query_commands", None)
+        if commands is None:
+            return response
+        endpoint = request.endpoint or "unmatched"
+        budget = self.budget_for(request.endpoint)
+        repeated = repeated_commands(commands, self.app.config['QUERY_BUDGET_REPEAT_THRESHOLD'])
+        over_budget = budget is not None and len(commands) > budget
+        with self._lock:
+            self.counters["requests"] += 1
+            self.counters["commands"] += len(commands)
+            self.counters["over_budget"] += over_budget
+            self.counters["repeated"] += bool(repeated)
+        if not over_budget and not repeated:
+            return response
+
+        self.app.logger.warning(
+            "%s %s issued %d MongoDB commands (budget %s): %s",
+            request.method, endpoint, len(commands), budget, _describe(commands)
+        )
+        with self._lock:
+            self._violations.append({
+                "at": datetime.utcnow(),
+                "endpoint": endpoint,
+                "method": request.method,
+                "commands": len(commands),
+                "budget": budget,
+                "over_budget": over_budget,
+                "repeated": repeated,
+            })
+        return response
+
+    def violations(self) -> List[Dict[str, Any]]:
+        """Requests that went over budget or repeated a command, newest first."""
+        with self._lock:
+            return [dict(entry) for entry in reversed(self._violations)]
+
+    def reset(self) -> None:
+        """Clear the violation log and counters."""
+        with self._lock:
+            self._violations.clear()
+            self.counters = dict.fromkeys(self.counters, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return request, command and violation counters."""
+        with self._lock:
+            return dict(self.counters, logged=len(self._violations))
+
+
+class CountingCollection:
+    """Collection proxy that reports each command it sends to a QueryCounter.
+
+    Cursors are counted once when find is called, whatever their size.
+
+    Args:
+        collection: The wrapped collection
+        counter: Receives one record per command
+    """
+
+    def __init__(self, collection: Any, counter: QueryCounter) -> None:
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._collection, name)
+        command = COMMAND_NAMES.get(name)
+        if command is None or not callable(attribute):
+            return attribute
+
+        def counted(*args: Any, **kwargs: Any) -> Any:
+            self._counter.record(command, self._collection.name)
+            return attribute(*args, **kwargs)
+        return counted
+
+
+class CountingDatabase:
+    """Database proxy for drivers without command monitoring, such as mongomock.
+
+    Args:
+        database: The wrapped database
+        counter: Receives one record per command
+    """
+
+    def __init__(self, database: Any, counter: QueryCounter) -> None:
+        self._database = database
+        self._counter = counter
+
+    def __getitem__(self, name: str) -> CountingCollection:
+        return CountingCollection(self._database[name], self._counter)
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._database, name)
+        if name == "command":
+            def counted(command: Any, *args: Any, **kwargs: Any) -> Any:
+                command_name = command if isinstance(command, str) else next(iter(command))
+                self._counter.record(command_name, None)
+                return attribute(command, *args, **kwargs)
+            return counted
+        # Collections are callable, so recognize them by their methods instead
+        if name.startswith("_") or not hasattr(attribute, "insert_one"):
+            return attribute
+        return CountingCollection(attribute, self._counter)
+
+
+def get_query_counter(app: Optional[Flask] = None) -> QueryCounter:
+    """Get the query counter owned by the application.
+
+    Args:
+        app: The Flask application instance, defaults to the current app
+
+    Returns:
+        The application's QueryCounter
+    """
+    app = app or current_app._get_current_object()
+    return app.extensions['query_counter']
+
+@contextmanager
+def assert_max_queries(limit: int, app: Optional[Flask] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Fail if the block issues more than limit MongoDB commands.
+
+    Counts commands from the calling thread, which includes requests made
+    through the Flask test client.
+
+    Args:
+        limit: Most commands the block may issue
+        app: The Flask application instance, defaults to the current app
+
+    Yields:
+        The list of recorded commands, filled in as the block runs
+
+    Raises:
+        QueryBudgetExceeded: If the block issued more than limit commands
+    """
+    counter = get_query_counter(app)
+    with counter.capture() as captured:
+        yield captured
+    if len(captured) > limit:
+        raise QueryBudgetExceeded(
+            f"Expected at most {limit} MongoDB commands, got {len(captured)}: {_describe(captured)}"
+        )
+
+def init_app(app: Flask) -> None:
+    """Register the query counter on the app's MongoDB pool and requests.
+
+    Must run before the pool creates its client.
+
+    Args:
+        app: The Flask application instance
+    """
+    for key, value in QUERY_BUDGET_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    counter = QueryCounter(app)
+    app.extensions['query_counter'] = counter
+    get_pool(app).listeners.append(counter)
+    if app.config['QUERY_BUDGET_ENABLED']:
+        app.before_request(counter.before_request)
+        app.after_request(counter.after_request)
@@ -0,0 +1,299 @@
+"""Slow query log fed by PyMongo command monitoring, with background explain plans."""
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from flask import Flask, current_app, has_request_context, request
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+from schemas import get_pool
+
+QUERY_LOG_DEFAULTS = {
+    'SLOW_QUERY_MS': 100,
+    'SLOW_QUERY_LOG_SIZE': 200,
+    'SLOW_QUERY_EXPLAIN': True,
+    'SLOW_QUERY_EXPLAIN_QUEUE': 50,
+    'SLOW_QUERY_SCAN_RATIO': 100,
+}
+
+# Commands whose plan can be explained by re-running them under explain
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+
+# Command fields added by the driver that explain does not accept
+DRIVER_FIELDS = {"lsid", "txnNumber", "$clusterTime", "$db", "$readPreference", "readConcern", "writeConcern"}
+
+# Fields describing the query itself, shown in the log with their values masked
+SHAPE_FIELDS = ("filter", "query", "pipeline", "sort", "updates", "deletes")
+
+
+def query_shape(value: Any) -> Any:
+    """Replace literal values with "?" so the log shows structure, not user data.
+
+    Args:
+        value: A filter, pipeline or other command field
+
+    Returns:
+        The same structure with every leaf value masked
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(item) for item in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value in (1, -1):
+        # Keep sort directions and projection flags readable
+        return value
+    return "?"
+
+def _find_key(document: Any, key: str) -> Optional[Any]:
+    """Depth-first search for the first value stored under key."""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        values = document.values()
+    elif isinstance(document, list):
+        values = document
+    else:
+        return None
+    for value in values:
+        found = _find_key(value, key)
+        if found is not None:
+            return found
+    return None
+
+def _plan_stages(plan: Any) -> List[str]:
+    """Collect stage names from a winning plan tree."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for key in ("inputStage", "queryPlan"):
+            stages.extend(_plan_stages(plan.get(key)))
+        for child in plan.get("inputStages", []):
+            stages.extend(_plan_stages(child))
+    return stages
+
+def summarize_plan(explain: Dict[str, Any], scan_ratio: float) -> Dict[str, Any]:
+    """Pull the interesting parts out of an explain result.
+
+    Args:
+        explain: Output of the explain command at executionStats verbosity
+        scan_ratio: docsExamined / nReturned ratio above which a plan is flagged
+
+    Returns:
+        Plan stages, examined and returned counts and warning flags
+    """
+    stages = _plan_stages(_find_key(explain, "winningPlan"))
+    execution = _find_key(explain, "executionStats") or {}
+    docs_examined = execution.get("totalDocsExamined")
+    keys_examined = execution.get("totalKeysExamined")
+    returned = execution.get("nReturned")
+    flags = []
+    if "COLLSCAN" in stages:
+        flags.append("COLLSCAN")
+    if "SORT" in stages:
+        flags.append("IN_MEMORY_SORT")
+    if docs_examined is not None and returned is not None and docs_examined / max(returned, 1) >= scan_ratio:
+        flags.append("HIGH_EXAMINED_RATIO")
+    return {
+        "stages": stages,
+        "docs_examined": docs_examined,
+        "keys_examined": keys_examined,
+        "returned": returned,
+        "flags": flags,
+    }
+
+
+class QueryLog(monitoring.CommandListener):
+    """Times every MongoDB command and keeps the slow ones in a ring buffer.
+
+    Commands are attributed to the Flask endpoint that issued them. Commands
+    slower than SLOW_QUERY_MS are logged and, when SLOW_QUERY_EXPLAIN is on,
+    re-run under explain by a background thread so request threads never
+    wait for it. Explains that do not fit in the queue are skipped.
+
+    Args:
+        app: The Flask application, read for the thresholds on every command
+        client_getter: Returns the client used to run explain
+    """
+
+    def __init__(self, app: Flask, client_getter: Callable[[], Any]) -> None:
+        self.app = app
+        self._client_getter = client_getter
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[int, Any], Dict[str, Any]] = {}
+        self._entries: Deque[Dict[str, Any]] = deque(maxlen=app.config['SLOW_QUERY_LOG_SIZE'])
+        self._routes: Dict[str, Dict[str, Any]] = {}
+        self._explain_queue: "queue.Queue[Tuple[Dict[str, Any], str, Dict[str, Any]]]" = queue.Queue(
+            maxsize=app.config['SLOW_QUERY_EXPLAIN_QUEUE']
+        )
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {"commands": 0, "slow": 0, "explained": 0, "explain_skipped": 0, "explain_failed": 0}
+
+    # CommandListener callbacks run on the thread that issued the command
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name == "explain":
+            return
+        route = request.endpoint if has_request_context() else None
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = {
+                "route": route or "(no request)",
+                "command": event.command_name,
+                "database": event.database_name,
+                "collection": event.command.get("collection", event.command.get(event.command_name)),
+                "body": {k: v for k, v in event.command.items() if k not in DRIVER_FIELDS},
+            }
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, failed=True)
+
+    def _finish(self, event: Any, failed: bool) -> None:
+        with self._lock:
+            started = self._pending.pop((event.request_id, event.connection_id), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        with self._lock:
+            self.counters["commands"] += 1
+            route = self._routes.setdefault(started["route"], {"commands": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0})
+            route["commands"] += 1
+            route["total_ms"] += duration_ms
+            route["max_ms"] = max(route["max_ms"], duration_ms)
+        if duration_ms < self.app.config['SLOW_QUERY_MS']:
+            return
+
+        body = started["body"]
+        entry = {
+            "at": datetime.utcnow(),
+            "route": started["route"],
+            "command": started["command"],
+            "collection": started["collection"],
+            "duration_ms": round(duration_ms, 2),
+            "failed": failed,
+            "shape": {field: query_shape(body[field]) for field in SHAPE_FIELDS if field in body},
+            "plan": None,
+        }
+        with self._lock:
+            self.counters["slow"] += 1
+            route["slow"] += 1
+            self._entries.append(entry)
+        if self.app.config['SLOW_QUERY_EXPLAIN'] and not failed and started["command"] in EXPLAINABLE_COMMANDS:
+            self._queue_explain(entry, started["database"], body)
+
+    def _queue_explain(self, entry: Dict[str, Any], database: str, body: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="slow-query-explain", daemon=True)
+                self._thread.start()
+        try:
+            self._explain_queue.put_nowait((entry, database, body))
+        except queue.Full:
+            with self._lock:
+                self.counters["explain_skipped"] += 1
+
+    def _run(self) -> None:
+        """Explain queued slow commands one at a time."""
+        while True:
+            item = self._explain_queue.get()
+            if item is None:
+                return
+            entry, database, body = item
+            self.explain(entry, database, body)
+
+    def explain(self, entry: Dict[str, Any], database: str, body: Dict[str, Any]) -> None:
+        """Run explain for a logged command and attach the plan summary.
+
+        Args:
+            entry: The ring buffer entry to update
+            database: Database the command ran against
+            body: The command without driver-added fields
+        """
+        started = time.monotonic()
+        try:
+            explain = self._client_getter()[database].command(
+                {"explain": body, "verbosity": "executionStats"}
+            )
+        except (PyMongoError, TypeError, ValueError) as e:
+            with self._lock:
+                self.counters["explain_failed"] += 1
+                entry["plan"] = {"error": str(e)}
+            return
+        plan = summarize_plan(explain, self.app.config['SLOW_QUERY_SCAN_RATIO'])
+        plan["explain_ms"] = round((time.monotonic() - started) * 1000, 2)
+        with self._lock:
+            self.counters["explained"] += 1
+            entry["plan"] = plan
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Ask the explain thread to exit once its queue drains."""
+        if self._thread is not None and self._thread.is_alive():
+            self._explain_queue.put(None)
+            self._thread.join(timeout)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Logged slow commands, newest first."""
+        with self._lock:
+            return [dict(entry) for entry in reversed(self._entries)]
+
+    def routes(self) -> Dict[str, Dict[str, Any]]:
+        """Command count and timing per endpoint."""
+        with self._lock:
+            return {
+                name: dict(
+                    stats,
+                    total_ms=round(stats["total_ms"], 2),
+                    max_ms=round(stats["max_ms"], 2),
+                    avg_ms=round(stats["total_ms"] / stats["commands"], 2)
+                )
+                for name, stats in self._routes.items()
+            }
+
+    def reset(self) -> None:
+        """Clear the log, route timings and counters."""
+        with self._lock:
+            self._pending.clear()
+            self._entries.clear()
+            self._routes.clear()
+            self.counters = dict.fromkeys(self.counters, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return command and explain counters."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.counters)
+            stats["logged"] = len(self._entries)
+        stats["threshold_ms"] = self.app.config['SLOW_QUERY_MS']
+        stats["explain_queued"] = self._explain_queue.qsize()
+        return stats
+
+
+def get_query_log(app: Optional[Flask] = None) -> QueryLog:
+    """Get the slow query log owned by the application.
+
+    Args:
+        app: The Flask application instance, defaults to the current app
+
+    Returns:
+        The application's QueryLog
+    """
+    app = app or current_app._get_current_object()
+    return app.extensions['query_log']
+
+def init_app(app: Flask) -> None:
+    """Register the slow query log as a command listener on the app's MongoDB pool.
+
+    Must run before the pool creates its client.
+
+    Args:
+        app: The Flask application instance
+    """
+    for key, value in QUERY_LOG_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    pool = get_pool(app)
+    query_log = QueryLog(app, lambda: pool.client)
+    pool.listeners.append(query_log)
+    app.extensions['query_log'] = query_log
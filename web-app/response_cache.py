@@ -0,0 +1,211 @@
+"""Write-invalidated cache of rendered API responses."""
+import functools
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+from flask import Flask, Response, current_app, make_response, request
+from cache import MISSING, MemoryBackend, RedisBackend
+from http_cache import is_not_modified, not_modified
+from serialization import wants_native_json
+
+RESPONSE_CACHE_DEFAULTS = {
+    'RESPONSE_CACHE_ENABLED': True,
+    'RESPONSE_CACHE_BACKEND': 'memory',
+    'RESPONSE_CACHE_SIZE': 2048,
+    'RESPONSE_CACHE_TTL': 60,
+    'RESPONSE_CACHE_REDIS_URL': 'redis://localhost:6379/0',
+    'RESPONSE_CACHE_REDIS_CLIENT': None,
+}
+
+# Tag carried by every response that lists or searches bathrooms
+BATHROOMS_TAG = "bathrooms"
+
+# Headers replayed from a cached response
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+def bathroom_tag(bathroom_id: Any) -> str:
+    """Tag carried by responses built from one bathroom or its reviews."""
+    return f"bathroom:{bathroom_id}"
+
+def request_key() -> str:
+    """Build the cache key for the current request.
+
+    The key covers the endpoint, its URL arguments, the query string with
+    arguments sorted so their order does not matter, and the response format.
+
+    Returns:
+        The cache key
+    """
+    view_args = sorted((request.view_args or {}).items())
+    args = sorted(request.args.items(multi=True))
+    parts = [
+        request.endpoint or request.path,
+        "&".join(f"{name}={value}" for name, value in view_args),
+        "&".join(f"{name}={value}" for name, value in args),
+        "v2" if wants_native_json() else "v1"
+    ]
+    return "|".join(parts)
+
+
+class ResponseCache:
+    """Response cache in front of the read endpoints.
+
+    Entries are tagged with the resources they were built from and dropped by
+    the write routes through ``invalidate``. A local generation counter per tag
+    stops a read that raced with a write from storing what it read before it.
+    Backend failures are logged and treated as misses.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        self._lock = threading.Lock()
+        self._generations: Dict[str, int] = {}
+        self.errors = 0
+        self.backend = self._build_backend()
+
+    def _build_backend(self) -> Any:
+        config = self.app.config
+        if config['RESPONSE_CACHE_BACKEND'] == 'redis':
+            client = config['RESPONSE_CACHE_REDIS_CLIENT']
+            if client is None:
+                # redis is only required when the shared backend is configured
+                import redis
+                client = redis.Redis.from_url(config['RESPONSE_CACHE_REDIS_URL'])
+            return RedisBackend(client, ttl=config['RESPONSE_CACHE_TTL'])
+        return MemoryBackend(maxsize=config['RESPONSE_CACHE_SIZE'], ttl=config['RESPONSE_CACHE_TTL'])
+
+    @property
+    def enabled(self) -> bool:
+        return self.app.config['RESPONSE_CACHE_ENABLED']
+
+    def _failed(self, action: str) -> None:
+        with self._lock:
+            self.errors += 1
+        current_app.logger.warning("Response cache %s failed", action, exc_info=True)
+
+    def generation(self, tags: Iterable[str]) -> tuple:
+        """Snapshot the invalidation counters of some tags."""
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def get(self, key: str) -> Any:
+        """Return a cached response entry or MISSING."""
+        try:
+            return self.backend.get(key)
+        except Exception:  # pylint: disable=broad-except
+            self._failed("read")
+            return MISSING
+
+    def store(self, key: str, response: Response, tags: Iterable[str], generation: tuple) -> None:
+        """Cache a response unless one of its tags was invalidated since generation.
+
+        Args:
+            key: Cache key from request_key
+            response: A finished 200 response
+            tags: Tags of the resources the response was built from
+            generation: Snapshot taken before the response was built
+        """
+        tags = list(tags)
+        if self.generation(tags) != generation:
+            return
+        entry = {
+            "status": response.status_code,
+            "body": response.get_data(),
+            "headers": [[name, response.headers[name]] for name in CACHED_HEADERS if name in response.headers]
+        }
+        try:
+            self.backend.set(key, entry, tags)
+        except Exception:  # pylint: disable=broad-except
+            self._failed("write")
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop every cached response built from the tagged resources."""
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+        try:
+            self.backend.invalidate_tags(tags)
+        except Exception:  # pylint: disable=broad-except
+            self._failed("invalidation")
+
+    def reset(self) -> None:
+        """Drop every local entry and reset the counters."""
+        self.backend.clear()
+        with self._lock:
+            self._generations.clear()
+            self.errors = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit rate, eviction and invalidation counters."""
+        stats = self.backend.stats()
+        stats["enabled"] = self.enabled
+        stats["errors"] = self.errors
+        return stats
+
+
+def replay(entry: Dict[str, Any]) -> Response:
+    """Rebuild a response from a cache entry, answering 304 when the client is current."""
+    response = Response(entry["body"], status=entry["status"])
+    for name, value in entry["headers"]:
+        response.headers[name] = value
+    etag, _ = response.get_etag()
+    if etag and is_not_modified(etag):
+        return not_modified(etag, response.last_modified)
+    return response
+
+def cached_response(*tags: str) -> Callable:
+    """Serve a read endpoint from the response cache.
+
+    Only 200 responses are stored. Tags may reference the view's URL
+    arguments, e.g. ``"bathroom:{bathroom_id}"``.
+
+    Args:
+        tags: Tags the write routes invalidate when the response goes stale
+
+    Returns:
+        The view decorator
+    """
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(**kwargs: Any) -> Any:
+            cache = get_response_cache()
+            if not cache.enabled:
+                return view(**kwargs)
+            key = request_key()
+            entry = cache.get(key)
+            if entry is not MISSING:
+                return replay(entry)
+            entry_tags = [tag.format(**kwargs) for tag in tags]
+            generation = cache.generation(entry_tags)
+            response = make_response(view(**kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                cache.store(key, response, entry_tags, generation)
+            return response
+        return wrapper
+    return decorator
+
+def invalidate(*tags: str) -> None:
+    """Drop cached responses for the tagged resources of the current app."""
+    get_response_cache().invalidate(*tags)
+
+def get_response_cache(app: Optional[Flask] = None) -> ResponseCache:
+    """Get the response cache owned by the application.
+
+    Args:
+        app: The Flask application instance, defaults to the current app
+
+    Returns:
+        The application's ResponseCache
+    """
+    app = app or current_app._get_current_object()
+    return app.extensions['response_cache']
+
+def init_app(app: Flask) -> None:
+    """Attach a response cache to the Flask application.
+
+    Args:
+        app: The Flask application instance
+    """
+    for key, value in RESPONSE_CACHE_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    app.extensions['response_cache'] = ResponseCache(app)
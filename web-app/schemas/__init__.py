@@ -1,13 +1,29 @@
 """Schema package for the bathroom map application."""
-from .database import get_db, close_db, init_app
-from .models import Bathroom, Review, User, init_db
+from .database import get_db, get_client, get_pool, close_db, init_app
+from .models import Bathroom, Review, User
+from .migrations import migrate, pending_migrations
+from .aggregates import (
+    rating_summary,
+    rebuild_rating_stats,
+    record_review_created,
+    record_review_updated,
+    record_review_deleted
+)
 
 __all__ = [
     'Bathroom',
     'Review',
     'User',
-    'init_db',
+    'migrate',
+    'pending_migrations',
     'get_db',
+    'get_client',
+    'get_pool',
     'close_db',
-    'init_app'
+    'init_app',
+    'rating_summary',
+    'rebuild_rating_stats',
+    'record_review_created',
+    'record_review_updated',
+    'record_review_deleted'
 ] 
\ No newline at end of file
@@ -0,0 +1,254 @@
+"""Per-bathroom rating aggregates maintained alongside review writes."""
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterable
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.database import Database
+
+# Rating fields tracked on every review
+RATING_FIELDS = ("cleanliness", "privacy", "accessibility")
+
+# Number of bathroom updates sent per bulk_write during a rebuild
+REBUILD_BATCH_SIZE = 1000
+
+
+def empty_rating_stats() -> Dict[str, Any]:
+    """Create the aggregate block stored on a bathroom with no reviews.
+
+    Returns:
+        A rating_stats sub-document with zeroed counters
+    """
+    return {
+        "review_count": 0,
+        "sums": {field: 0 for field in RATING_FIELDS},
+        "averages": {field: None for field in RATING_FIELDS},
+        "best_for": {}
+    }
+
+def best_for_key(value: Any) -> Optional[str]:
+    """Normalize a best_for label so it can be used as a document key.
+
+    Args:
+        value: Raw best_for value from a review
+
+    Returns:
+        A lowercase key without dots or a leading dollar sign, or None if empty
+    """
+    if not isinstance(value, str):
+        return None
+    key = " ".join(value.split()).lower().replace(".", "_")
+    if key.startswith("$"):
+        key = "_" + key[1:]
+    return key or None
+
+def compute_averages(stats: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Compute rating averages from the stored counters.
+
+    Args:
+        stats: A rating_stats sub-document
+
+    Returns:
+        Average per rating field, rounded to two decimals, or None without reviews
+    """
+    count = stats.get("review_count", 0)
+    sums = stats.get("sums", {})
+    return {
+        field: round(sums.get(field, 0) / count, 2) if count > 0 else None
+        for field in RATING_FIELDS
+    }
+
+def rating_summary(bathroom: Dict[str, Any]) -> Dict[str, Any]:
+    """Read a bathroom's stored aggregates without touching the reviews collection.
+
+    Args:
+        bathroom: A bathroom document
+
+    Returns:
+        The bathroom's rating_stats, or an empty block for legacy documents
+    """
+    stats = bathroom.get("rating_stats") or empty_rating_stats()
+    if stats.get("averages") is None:
+        stats = dict(stats, averages=compute_averages(stats))
+    return stats
+
+def _review_increments(review: Dict[str, Any], sign: int) -> Dict[str, int]:
+    """Build the $inc document that adds (sign=1) or removes (sign=-1) a review."""
+    increments = {"rating_stats.review_count": sign}
+    ratings = review.get("ratings", {})
+    for field in RATING_FIELDS:
+        increments[f"rating_stats.sums.{field}"] = sign * ratings.get(field, 0)
+    key = best_for_key(review.get("best_for"))
+    if key:
+        increments[f"rating_stats.best_for.{key}"] = sign
+    return increments
+
+def apply_rating_increments(
+    db: Database,
+    bathroom_id: str,
+    increments: Dict[str, int]
+) -> Optional[Dict[str, Any]]:
+    """Atomically apply counter increments to a bathroom and refresh its averages.
+
+    The counters are updated with a single $inc, which also bumps the bathroom's
+    version so cached copies of it and of its review listing are revalidated.
+    Averages are then written with a filter on the counters that were just read
+    back, so a concurrent writer that has already moved the counters on is never
+    overwritten with stale values.
+
+    Args:
+        db: MongoDB database instance
+        bathroom_id: ID of the bathroom to update
+        increments: Dotted rating_stats paths mapped to their increments
+
+    Returns:
+        The bathroom's updated rating_stats, or None if the bathroom does not exist
+    """
+    increments = {path: amount for path, amount in increments.items() if amount}
+    bathroom = db.bathrooms.find_one_and_update(
+        {"_id": ObjectId(bathroom_id)},
+        {"$inc": dict(increments, version=1), "$set": {"updated_at": datetime.utcnow()}},
+        projection={"rating_stats": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if bathroom is None or not increments:
+        return None
+
+    stats = bathroom["rating_stats"]
+    stats.setdefault("review_count", 0)
+    stats.setdefault("sums", {})
+    stats["averages"] = compute_averages(stats)
+    update = {"$set": {"rating_stats.averages": stats["averages"]}}
+    spent_keys = [key for key, count in stats.get("best_for", {}).items() if count <= 0]
+    if spent_keys:
+        update["$unset"] = {f"rating_stats.best_for.{key}": "" for key in spent_keys}
+        for key in spent_keys:
+            stats["best_for"].pop(key)
+
+    guard = {"_id": bathroom["_id"], "rating_stats.review_count": stats["review_count"]}
+    for field in RATING_FIELDS:
+        guard[f"rating_stats.sums.{field}"] = stats["sums"].get(field, 0)
+    db.bathrooms.update_one(guard, update)
+    return stats
+
+def record_review_created(db: Database, review: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Add a new review to its bathroom's aggregates.
+
+    Args:
+        db: MongoDB database instance
+        review: The review document that was inserted
+
+    Returns:
+        The bathroom's updated rating_stats, or None if the bathroom does not exist
+    """
+    return apply_rating_increments(db, review["bathroom_id"], _review_increments(review, 1))
+
+def record_review_updated(
+    db: Database,
+    old_review: Dict[str, Any],
+    new_review: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """Move a bathroom's aggregates from a review's old values to its new ones.
+
+    Args:
+        db: MongoDB database instance
+        old_review: The review document before the update
+        new_review: The review document after the update
+
+    Returns:
+        The bathroom's updated rating_stats, or None if no rating changed
+    """
+    increments = _review_increments(new_review, 1)
+    for path, amount in _review_increments(old_review, -1).items():
+        increments[path] = increments.get(path, 0) + amount
+    return apply_rating_increments(db, old_review["bathroom_id"], increments)
+
+def record_review_deleted(db: Database, review: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Remove a deleted review from its bathroom's aggregates.
+
+    Args:
+        db: MongoDB database instance
+        review: The review document that was deleted
+
+    Returns:
+        The bathroom's updated rating_stats, or None if the bathroom does not exist
+    """
+    return apply_rating_increments(db, review["bathroom_id"], _review_increments(review, -1))
+
+def _flush(db: Database, operations: list) -> None:
+    """Send pending rebuild updates in a single unordered bulk write."""
+    if operations:
+        db.bathrooms.bulk_write(operations, ordered=False)
+        operations.clear()
+
+def rebuild_rating_stats(db: Database, bathroom_ids: Optional[Iterable[str]] = None) -> int:
+    """Recompute rating aggregates from the reviews collection.
+
+    Args:
+        db: MongoDB database instance
+        bathroom_ids: Optional bathroom IDs to limit the rebuild to
+
+    Returns:
+        The number of bathrooms whose aggregates were rewritten
+    """
+    review_match = {}
+    bathroom_match = {}
+    if bathroom_ids is not None:
+        bathroom_ids = [str(bathroom_id) for bathroom_id in bathroom_ids]
+        review_match = {"bathroom_id": {"$in": bathroom_ids}}
+        bathroom_match = {"_id": {"$in": [ObjectId(bathroom_id) for bathroom_id in bathroom_ids]}}
+
+    group = {"_id": "$bathroom_id", "review_count": {"$sum": 1}}
+    for field in RATING_FIELDS:
+        group[field] = {"$sum": f"$ratings.{field}"}
+
+    stats_by_bathroom = {}
+    for row in db.reviews.aggregate([{"$match": review_match}, {"$group": group}]):
+        stats = empty_rating_stats()
+        stats["review_count"] = row["review_count"]
+        stats["sums"] = {field: row[field] for field in RATING_FIELDS}
+        stats["averages"] = compute_averages(stats)
+        stats_by_bathroom[row["_id"]] = stats
+
+    tally_pipeline = [
+        {"$match": review_match},
+        {"$group": {"_id": {"bathroom_id": "$bathroom_id", "best_for": "$best_for"}, "count": {"$sum": 1}}}
+    ]
+    for row in db.reviews.aggregate(tally_pipeline):
+        key = best_for_key(row["_id"].get("best_for"))
+        stats = stats_by_bathroom.get(row["_id"]["bathroom_id"])
+        if key and stats is not None:
+            stats["best_for"][key] = stats["best_for"].get(key, 0) + row["count"]
+
+    rebuilt = 0
+    operations = []
+    now = datetime.utcnow()
+    for bathroom in db.bathrooms.find(bathroom_match, {"_id": 1}):
+        stats = stats_by_bathroom.get(str(bathroom["_id"])) or empty_rating_stats()
+        # Bumping the version changes the bathroom's ETags, so clients refetch the new ratings
+        operations.append(UpdateOne(
+            {"_id": bathroom["_id"]},
+            {"$set": {"rating_stats": stats, "updated_at": now}, "$inc": {"version": 1}}
+        ))
+        rebuilt += 1
+        if len(operations) >= REBUILD_BATCH_SIZE:
+            _flush(db, operations)
+    _flush(db, operations)
+    return rebuilt
+
+def backfill_rating_stats(db: Database) -> int:
+    """Rebuild aggregates for bathrooms written before rating_stats existed.
+
+    Without a block to increment, the first new review would start the
+    counters from zero and leave every older review out of the averages.
+
+    Args:
+        db: MongoDB database instance
+
+    Returns:
+        The number of bathrooms that were given aggregates
+    """
+    bathroom_ids = [str(doc["_id"]) for doc in db.bathrooms.find({"rating_stats": {"$exists": False}}, {"_id": 1})]
+    backfilled = 0
+    for start in range(0, len(bathroom_ids), REBUILD_BATCH_SIZE):
+        backfilled += rebuild_rating_stats(db, bathroom_ids[start:start + REBUILD_BATCH_SIZE])
+    return backfilled
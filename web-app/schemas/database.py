@@ -1,43 +1,226 @@
 """Database connection module for the bathroom map application."""
-from typing import Dict, Any
+import os
+import threading
+import weakref
+from typing import Dict, Any, Callable, List, Optional
 from flask import Flask, current_app, g
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 from pymongo.database import Database
 
+# Defaults for the shared connection pool, overridable through app.config
+POOL_DEFAULTS = {
+    'MONGO_MAX_POOL_SIZE': 100,
+    'MONGO_MIN_POOL_SIZE': 0,
+    'MONGO_MAX_IDLE_TIME_MS': 60000,
+    'MONGO_CONNECT_TIMEOUT_MS': 5000,
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': 5000,
+    'MONGO_SOCKET_TIMEOUT_MS': None,
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': 2000,
+}
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Connection pool listener that keeps running counters for the shared client."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters = {
+            'connections_created': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'checkins': 0,
+            'checkout_failures': 0,
+            'pool_clears': 0,
+        }
+
+    def _incr(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return a copy of the counters plus derived gauges."""
+        with self._lock:
+            stats = dict(self._counters)
+        stats['open_connections'] = stats['connections_created'] - stats['connections_closed']
+        stats['checked_out'] = stats['checkouts'] - stats['checkins']
+        return stats
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        self._incr('pool_clears')
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_created(self, event) -> None:
+        self._incr('connections_created')
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        self._incr('connections_closed')
+
+    def connection_check_out_started(self, event) -> None:
+        pass
+
+    def connection_check_out_failed(self, event) -> None:
+        self._incr('checkout_failures')
+
+    def connection_checked_out(self, event) -> None:
+        self._incr('checkouts')
+
+    def connection_checked_in(self, event) -> None:
+        self._incr('checkins')
+
+
+# Every pool in the process, reset together by a single fork hook
+_POOLS: "weakref.WeakSet[MongoPool]" = weakref.WeakSet()
+
+
+def _reset_pools_after_fork() -> None:
+    for pool in list(_POOLS):
+        pool.reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    # Registered once per process; hooks cannot be removed, so one per app would pile up
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+class MongoPool:
+    """Process-wide MongoClient owned by a Flask application.
+
+    The client is created lazily on first use and recreated if the process
+    has forked since it was built, so pre-fork servers such as gunicorn never
+    share sockets between workers.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        self._lock = threading.Lock()
+        self._client: Optional[MongoClient] = None
+        self._pid: Optional[int] = None
+        self.stats_listener = PoolStatsListener()
+        self.listeners: List[Any] = []
+        _POOLS.add(self)
+
+    def client_options(self) -> Dict[str, Any]:
+        """Build the MongoClient keyword arguments from app.config."""
+        config = self.app.config
+        options = {
+            'maxPoolSize': config['MONGO_MAX_POOL_SIZE'],
+            'minPoolSize': config['MONGO_MIN_POOL_SIZE'],
+            'maxIdleTimeMS': config['MONGO_MAX_IDLE_TIME_MS'],
+            'connectTimeoutMS': config['MONGO_CONNECT_TIMEOUT_MS'],
+            'serverSelectionTimeoutMS': config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+            'socketTimeoutMS': config['MONGO_SOCKET_TIMEOUT_MS'],
+            'waitQueueTimeoutMS': config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+            'event_listeners': [self.stats_listener] + self.listeners,
+            'connect': False,
+        }
+        return {key: value for key, value in options.items() if value is not None}
+
+    @property
+    def client(self) -> MongoClient:
+        """Return the shared client, creating it on first use in this process."""
+        pid = os.getpid()
+        if self._client is None or self._pid != pid:
+            with self._lock:
+                if self._client is None or self._pid != pid:
+                    factory: Callable[..., Any] = self.app.config.get('MONGO_CLIENT_FACTORY') or MongoClient
+                    self._client = factory(self.app.config['MONGO_URI'], **self.client_options())
+                    self._pid = pid
+        return self._client
+
+    def reset_after_fork(self) -> None:
+        """Forget the parent's client in a forked child without closing its sockets."""
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        """Close the shared client if this process owns one."""
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._pid = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return connection pool statistics for the shared client."""
+        stats = self.stats_listener.snapshot()
+        stats['connected'] = self._client is not None and self._pid == os.getpid()
+        stats['max_pool_size'] = self.app.config['MONGO_MAX_POOL_SIZE']
+        stats['min_pool_size'] = self.app.config['MONGO_MIN_POOL_SIZE']
+        return stats
+
+
+def get_pool(app: Optional[Flask] = None) -> MongoPool:
+    """Get the connection pool owned by the application.
+
+    Args:
+        app: The Flask application instance, defaults to the current app
+
+    Returns:
+        The application's MongoPool
+    """
+    app = app or current_app._get_current_object()
+    return app.extensions['mongo_pool']
+
+def get_client() -> MongoClient:
+    """Get the shared MongoClient for the current application.
+
+    Returns:
+        The process-wide MongoClient
+    """
+    return get_pool().client
+
 def get_db() -> Database:
     """Get the MongoDB database connection.
-    
+
     Returns:
         The MongoDB database instance
     """
     # In testing mode, use the mock database if it exists
     if current_app.config.get('TESTING') and hasattr(current_app, 'mock_db'):
         return current_app.mock_db
-    
-    # Normal production/dev behavior
+
+    # Normal production/dev behavior, backed by the shared pool
     if 'db' not in g:
-        client = MongoClient(current_app.config['MONGO_URI'])
-        g.db = client[current_app.config['MONGO_DBNAME']]
+        g.db = get_client()[current_app.config['MONGO_DBNAME']]
     return g.db
 
 def close_db(e=None) -> None:
-    """Close the MongoDB connection when the application context ends.
-    
+    """Release the database handle when the application context ends.
+
+    The underlying client is shared by the whole process, so its sockets go
+    back to the pool rather than being closed.
+
     Args:
         e: Optional exception that caused the context to end
     """
-    db_client = g.pop('db_client', None)
-    if db_client is not None:
-        db_client.close()
+    g.pop('db', None)
 
 def init_app(app: Flask) -> None:
     """Initialize the database connection for the Flask application.
-    
+
     Args:
         app: The Flask application instance
     """
+    for key, value in POOL_DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    pool = MongoPool(app)
+    app.extensions['mongo_pool'] = pool
+
     app.teardown_appcontext(close_db)
-    
+
     # Create collection helpers
     @app.context_processor
     def utility_processor() -> Dict[str, Any]:
@@ -46,4 +229,4 @@ def init_app(app: Flask) -> None:
             'bathrooms': lambda: get_db().bathrooms,
             'reviews': lambda: get_db().reviews,
             'users': lambda: get_db().users
-        } 
\ No newline at end of file
+        }
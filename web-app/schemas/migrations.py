@@ -0,0 +1,242 @@
+"""Versioned index and data migrations for the bathroom map database.
+
+Run outside the web process with::
+
+    python -m schemas.migrations status
+    python -m schemas.migrations migrate
+"""
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+import click
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel, MongoClient
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from .aggregates import backfill_rating_stats
+
+# Collection recording which migrations have been applied
+MIGRATIONS_COLLECTION = "_migrations"
+
+# Server error code for dropping an index that does not exist
+INDEX_NOT_FOUND = 27
+
+
+class Migration(NamedTuple):
+    """One versioned change to the index spec or the stored documents.
+
+    Attributes:
+        version: Position in the migration sequence, starting at 1
+        description: What the migration changes
+        create: Indexes to build, keyed by collection
+        drop: Index names to remove, keyed by collection
+        run: Data change applied after the indexes, which must be safe to run twice
+    """
+    version: int
+    description: str
+    create: Dict[str, List[IndexModel]]
+    drop: Dict[str, List[str]] = {}
+    run: Optional[Callable[[Database], Any]] = None
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Baseline indexes", create={
+        "bathrooms": [IndexModel([("location", GEOSPHERE)], name="location_2dsphere")],
+        "reviews": [IndexModel([("bathroom_id", ASCENDING)], name="bathroom_id_1")],
+        "users": [IndexModel([("email", ASCENDING)], name="email_1", unique=True)],
+        "geocode_cache": [IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0)],
+    }),
+    Migration(2, "Indexes for paginated reviews, profiles and building search", create={
+        # Review pages in _id order, and newest first
+        "reviews": [
+            IndexModel([("bathroom_id", ASCENDING), ("_id", ASCENDING)], name="bathroom_id_1__id_1"),
+            IndexModel(
+                [("bathroom_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                name="bathroom_id_1_created_at_-1__id_-1"
+            ),
+            # Profile page lists a user's reviews
+            IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_1_created_at_-1"),
+        ],
+        # Case-insensitive regexes still scan, but scan index keys instead of documents
+        "bathrooms": [IndexModel([("building", ASCENDING)], name="building_1")],
+    }, drop={
+        # Covered by the prefix of bathroom_id_1__id_1
+        "reviews": ["bathroom_id_1"],
+    }),
+    Migration(3, "Indexes for the background job queue", create={
+        "jobs": [
+            # Workers claim the oldest due job in each status
+            IndexModel([("status", ASCENDING), ("run_after", ASCENDING)], name="status_1_run_after_1"),
+            # Finished jobs are kept for a week for status lookups
+            IndexModel([("finished_at", ASCENDING)], name="finished_at_1", expireAfterSeconds=7 * 24 * 3600),
+        ],
+    }),
+    # Bathrooms from before rating_stats would otherwise count only reviews written after the upgrade
+    Migration(4, "Backfill rating aggregates on older bathrooms", create={}, run=backfill_rating_stats),
+]
+
+
+def declared_indexes() -> Dict[str, Dict[str, IndexModel]]:
+    """The index spec after every migration, keyed by collection and index name."""
+    spec: Dict[str, Dict[str, IndexModel]] = {}
+    for migration in MIGRATIONS:
+        for collection, indexes in migration.create.items():
+            for index in indexes:
+                spec.setdefault(collection, {})[index.document["name"]] = index
+        for collection, names in migration.drop.items():
+            for name in names:
+                spec.get(collection, {}).pop(name, None)
+    return spec
+
+def applied_versions(db: Database) -> List[int]:
+    """Versions recorded in the migrations collection, in ascending order."""
+    return sorted(doc["_id"] for doc in db[MIGRATIONS_COLLECTION].find({}, {"_id": 1}))
+
+def pending_migrations(db: Database) -> List[Migration]:
+    """Migrations that have not been recorded as applied."""
+    applied = set(applied_versions(db))
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+def _background(index: IndexModel) -> IndexModel:
+    """Copy an index model with the background build option set."""
+    options = dict(index.document)
+    keys = list(options.pop("key").items())
+    return IndexModel(keys, background=True, **options)
+
+def apply_migration(db: Database, migration: Migration, background: bool = True) -> bool:
+    """Build and drop one migration's indexes, run its data change and record it.
+
+    Index creation and data changes are idempotent, so two processes racing
+    on the same migration both succeed and only the first records it.
+
+    Args:
+        db: The database
+        migration: The migration to apply
+        background: Ask servers older than 4.2 for a non-blocking build
+
+    Returns:
+        True if this call recorded the migration
+    """
+    started = time.monotonic()
+    for collection, indexes in migration.create.items():
+        if background:
+            indexes = [_background(index) for index in indexes]
+        db[collection].create_indexes(indexes)
+    for collection, names in migration.drop.items():
+        for name in names:
+            try:
+                db[collection].drop_index(name)
+            except OperationFailure as e:
+                if e.code != INDEX_NOT_FOUND and "not found" not in str(e):
+                    raise
+    if migration.run is not None:
+        migration.run(db)
+    try:
+        db[MIGRATIONS_COLLECTION].insert_one({
+            "_id": migration.version,
+            "description": migration.description,
+            "applied_at": datetime.utcnow(),
+            "duration_seconds": round(time.monotonic() - started, 3)
+        })
+    except DuplicateKeyError:
+        return False
+    return True
+
+def migrate(db: Database, background: bool = True) -> List[int]:
+    """Apply every pending migration in order.
+
+    When nothing is pending this costs a single query, so it is cheap to call
+    at startup.
+
+    Args:
+        db: The database
+        background: Ask servers older than 4.2 for non-blocking builds
+
+    Returns:
+        Versions applied by this call
+    """
+    applied = []
+    for migration in pending_migrations(db):
+        if apply_migration(db, migration, background):
+            applied.append(migration.version)
+    return applied
+
+def ensure_indexes(db: Database, collections: Optional[Iterable[str]] = None,
+                   background: bool = True) -> Dict[str, List[str]]:
+    """Build the declared indexes whatever the migrations collection records.
+
+    Dropping a collection drops its indexes while its migrations stay
+    recorded, so code that recreates collections calls this afterwards.
+
+    Args:
+        db: The database
+        collections: Collections to index, defaults to every declared one
+        background: Ask servers older than 4.2 for non-blocking builds
+
+    Returns:
+        Index names built, keyed by collection
+    """
+    built = {}
+    for collection, indexes in declared_indexes().items():
+        if collections is not None and collection not in collections:
+            continue
+        models = [_background(index) if background else index for index in indexes.values()]
+        built[collection] = db[collection].create_indexes(models)
+    return built
+
+def missing_indexes(db: Database) -> Dict[str, List[str]]:
+    """Declared indexes that do not exist in the database, keyed by collection."""
+    missing = {}
+    for collection, indexes in declared_indexes().items():
+        existing = db[collection].index_information()
+        names = [name for name in indexes if name not in existing]
+        if names:
+            missing[collection] = names
+    return missing
+
+def status(db: Database) -> List[Dict[str, Any]]:
+    """Describe each migration and whether it has been applied."""
+    records = {doc["_id"]: doc for doc in db[MIGRATIONS_COLLECTION].find()}
+    return [
+        {
+            "version": migration.version,
+            "description": migration.description,
+            "applied_at": records.get(migration.version, {}).get("applied_at")
+        }
+        for migration in MIGRATIONS
+    ]
+
+
+def _connect(uri: Optional[str], dbname: Optional[str]) -> Database:
+    uri = uri or os.environ.get('MONGO_URI', 'mongodb://localhost:27017')
+    dbname = dbname or os.environ.get('MONGO_DBNAME', 'bathroom_map')
+    return MongoClient(uri)[dbname]
+
+
+@click.group()
+@click.option("--uri", help="MongoDB connection string, defaults to $MONGO_URI.")
+@click.option("--db", "dbname", help="Database name, defaults to $MONGO_DBNAME.")
+@click.pass_context
+def cli(ctx: click.Context, uri: Optional[str], dbname: Optional[str]) -> None:
+    """Manage database indexes and data migrations."""
+    ctx.obj = _connect(uri, dbname)
+
+@cli.command("status")
+@click.pass_obj
+def status_command(db: Database) -> None:
+    """List migrations and when they were applied."""
+    for entry in status(db):
+        applied = entry["applied_at"].isoformat() if entry["applied_at"] else "pending"
+        click.echo(f"{entry['version']:>3}  {applied:<26}  {entry['description']}")
+
+@cli.command("migrate")
+@click.option("--foreground", is_flag=True, help="Do not request background index builds.")
+@click.pass_obj
+def migrate_command(db: Database, foreground: bool) -> None:
+    """Apply pending migrations."""
+    applied = migrate(db, background=not foreground)
+    click.echo(f"Applied migrations: {', '.join(map(str, applied))}" if applied else "Database is up to date.")
+
+
+if __name__ == "__main__":
+    cli()  # pylint: disable=no-value-for-parameter
@@ -1,31 +1,7 @@
 """Database models for the bathroom map application."""
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-from pymongo import MongoClient, GEOSPHERE
-from flask import current_app
-import os
-
-def init_db(app) -> None:
-    """Initialize database with required indexes.
-    
-    Args:
-        app: The Flask application instance
-    """
-    # Skip creating real indexes in test mode - check both config and environment
-    if app.config.get('TESTING', False) or os.environ.get('TESTING') == 'true':
-        return
-        
-    with app.app_context():
-        client = MongoClient(current_app.config['MONGO_URI'])
-        db = client[current_app.config['MONGO_DBNAME']]
-        
-        # Create geospatial index for bathroom locations
-        db.bathrooms.create_index([("location", GEOSPHERE)])
-        
-        # Create indexes for other collections
-        db.reviews.create_index("bathroom_id")
-        db.users.create_index("email", unique=True)
-
+from .aggregates import empty_rating_stats
 
 # Typing aliases for clarity
 BathroomDocument = Dict[str, Any]
@@ -80,6 +56,8 @@ class Bathroom:
             },
             "is_accessible": is_accessible,
             "gender": gender,
+            "rating_stats": empty_rating_stats(),
+            "version": 1,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
@@ -136,7 +114,9 @@ class Review:
             },
             "best_for": best_for,
             "comment": comment,
-            "created_at": datetime.utcnow()
+            "version": 1,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
         }
 
 
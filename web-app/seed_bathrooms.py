@@ -1,6 +1,75 @@
-"""Seed script to populate the database with initial NYU campus bathroom data."""
-from schemas import Bathroom
+"""Seed script to populate the database with NYU campus bathroom data.
+
+Besides the hard-coded NYU rows used at startup, this module generates
+synthetic datasets of any size. Run it outside the web process with::
+
+    python seed_bathrooms.py generate --bathrooms 100000 --users 5000 --reviews 1000000 --drop
+"""
+import bisect
+import calendar
+import hashlib
+import itertools
+import math
+import os
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+import click
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+from pymongo.database import Database
 from pymongo.errors import PyMongoError
+from werkzeug.security import SALT_CHARS
+from passwords import PASSWORD_DEFAULTS, normalize_method
+from schemas import Bathroom, Review, User, migrate
+from schemas.migrations import ensure_indexes
+from schemas.aggregates import RATING_FIELDS, best_for_key, compute_averages, empty_rating_stats
+
+# Documents per insert_many while streaming a generated dataset
+GENERATE_BATCH_SIZE = 5000
+
+# Generated documents are spread evenly over this period, starting at GENERATED_EPOCH
+GENERATED_EPOCH = datetime(2023, 1, 1)
+GENERATED_SPAN = timedelta(days=365)
+
+# Password shared by every generated user, hashed once per seed
+GENERATED_PASSWORD = "password"
+
+# Distinguishes generated ObjectIds per collection
+ID_KINDS = {"bathrooms": 1, "users": 2, "reviews": 3}
+
+BEST_FOR = ["pee", "poop", "makeup", "changing", "quick stop", "phone call"]
+COMMENTS = [
+    "Clean and quiet.",
+    "Usually a line between classes.",
+    "Out of paper towels again.",
+    "Best one in the building.",
+    None,
+]
+
+
+class Campus(NamedTuple):
+    """A cluster of buildings to scatter bathrooms over.
+
+    Attributes:
+        name: Campus name, used as the building name prefix
+        latitude: Latitude of the campus center
+        longitude: Longitude of the campus center
+        radius_m: Typical distance of a building from the center, in meters
+    """
+    name: str
+    latitude: float
+    longitude: float
+    radius_m: float = 600
+
+
+DEFAULT_CAMPUSES = [
+    Campus("Washington Square", 40.7295, -73.9965, 600),
+    Campus("Brooklyn", 40.6942, -73.9866, 400),
+    Campus("Midtown", 40.7549, -73.9840, 800),
+]
 
 def seed_bathrooms(db):
     """Seed the database with NYU campus bathrooms.
@@ -119,4 +188,416 @@ def seed_bathrooms(db):
             db.bathrooms.insert_many(bathroom_documents)
             print(f"Successfully seeded {len(bathroom_documents)} bathrooms into the database.")
         except PyMongoError as e:
-            print(f"Error seeding bathrooms: {e}") 
\ No newline at end of file
+            print(f"Error seeding bathrooms: {e}") 
+
+
+def synthetic_object_id(kind: str, seed: int, index: int, created_at: datetime) -> ObjectId:
+    """Build a deterministic ObjectId whose timestamp matches created_at.
+
+    Args:
+        kind: Collection the document belongs to, a key of ID_KINDS
+        seed: Dataset seed
+        index: Position of the document in its collection
+        created_at: Creation time, stored in the id's timestamp
+
+    Returns:
+        An ObjectId unique per kind, seed and index
+    """
+    timestamp = calendar.timegm(created_at.utctimetuple())
+    return ObjectId(
+        timestamp.to_bytes(4, "big")
+        + bytes([ID_KINDS[kind]])
+        + (seed & 0xFFFFFF).to_bytes(3, "big")
+        + index.to_bytes(4, "big")
+    )
+
+def _created_at(index: int, count: int) -> datetime:
+    return GENERATED_EPOCH + GENERATED_SPAN * (index / max(count, 1))
+
+def generated_id(kind: str, index: int, count: int, seed: int = 0) -> str:
+    """Id the generator gives one document of a collection of count documents, without generating it."""
+    return str(synthetic_object_id(kind, seed, index, _created_at(index, count)))
+
+def generated_ids(kind: str, count: int, seed: int = 0) -> List[str]:
+    """Ids the generator gives the documents of one collection, without generating them."""
+    return [generated_id(kind, index, count, seed) for index in range(count)]
+
+def generated_password_hash(seed: int = 0, password: str = GENERATED_PASSWORD) -> str:
+    """Hash a password as werkzeug would, with a salt drawn from the seed.
+
+    werkzeug salts from the system random source, so its hashes differ between
+    runs; a seeded salt keeps generated users identical for equal seeds.
+
+    Args:
+        seed: Dataset seed
+        password: Password to hash
+
+    Returns:
+        A hash check_password_hash accepts
+    """
+    method = normalize_method(PASSWORD_DEFAULTS['PASSWORD_HASH_METHOD'])
+    _, hash_name, iterations = method.split(":")
+    rng = random.Random(f"password-salt-{seed}")
+    salt = "".join(rng.choice(SALT_CHARS) for _ in range(PASSWORD_DEFAULTS['PASSWORD_SALT_LENGTH']))
+    digest = hashlib.pbkdf2_hmac(hash_name, password.encode(), salt.encode(), int(iterations)).hex()
+    return f"{method}${salt}${digest}"
+
+
+class ZipfSampler:
+    """Draws ranks 0..n-1 with probability proportional to 1 / (rank + 1) ** exponent.
+
+    An exponent of 0 draws uniformly.
+
+    Args:
+        n: Number of ranks
+        exponent: Skew, around 1 for typical popularity
+        rng: Random source
+    """
+
+    def __init__(self, n: int, exponent: float, rng: random.Random) -> None:
+        self.rng = rng
+        # A packed array keeps the table at 8 bytes per rank
+        self.cumulative = array("d", itertools.accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+    def sample(self) -> int:
+        position = self.rng.random() * self.cumulative[-1]
+        return min(bisect.bisect_right(self.cumulative, position), len(self.cumulative) - 1)
+
+
+def _offset(latitude: float, north_m: float, east_m: float) -> tuple:
+    """Convert a displacement in meters to degrees of latitude and longitude."""
+    return north_m / 111320, east_m / (111320 * math.cos(math.radians(latitude)))
+
+def generate_buildings(campuses: Sequence[Campus], per_campus: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """Place buildings around each campus center, denser near the middle.
+
+    Args:
+        campuses: Campuses to fill
+        per_campus: Buildings per campus
+        rng: Random source
+
+    Returns:
+        Building names, positions and floor counts
+    """
+    buildings = []
+    for campus in campuses:
+        for number in range(1, per_campus + 1):
+            d_lat, d_lng = _offset(
+                campus.latitude, rng.gauss(0, campus.radius_m / 2), rng.gauss(0, campus.radius_m / 2)
+            )
+            buildings.append({
+                "name": f"{campus.name} Hall {number}",
+                "latitude": campus.latitude + d_lat,
+                "longitude": campus.longitude + d_lng,
+                "floors": rng.randint(1, 15),
+            })
+    return buildings
+
+def generate_bathrooms(count: int, seed: int = 0, campuses: Sequence[Campus] = DEFAULT_CAMPUSES,
+                       buildings_per_campus: int = 40) -> Iterator[Dict[str, Any]]:
+    """Yield bathroom documents clustered in buildings around the campuses.
+
+    Args:
+        count: Number of bathrooms
+        seed: Random seed
+        campuses: Campuses to scatter buildings over
+        buildings_per_campus: Buildings per campus
+
+    Yields:
+        Bathroom documents with deterministic ids
+    """
+    rng = random.Random(seed)
+    buildings = generate_buildings(campuses, buildings_per_campus, rng)
+    for index in range(count):
+        building = rng.choice(buildings)
+        # Bathrooms sit within a few meters of their building's center
+        d_lat, d_lng = _offset(building["latitude"], rng.gauss(0, 8), rng.gauss(0, 8))
+        document = Bathroom.create_document(
+            building=building["name"],
+            floor=rng.randint(0, building["floors"]),
+            latitude=building["latitude"] + d_lat,
+            longitude=building["longitude"] + d_lng,
+            is_accessible=rng.random() < 0.6,
+            gender=rng.choice(Bathroom.VALID_GENDERS)
+        )
+        document["created_at"] = document["updated_at"] = _created_at(index, count)
+        document["_id"] = synthetic_object_id("bathrooms", seed, index, document["created_at"])
+        yield document
+
+def generate_users(count: int, seed: int = 0, password_hash: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Yield user documents that all share one password.
+
+    Args:
+        count: Number of users
+        seed: Random seed
+        password_hash: Hash stored for every user, defaults to a seeded hash of GENERATED_PASSWORD
+
+    Yields:
+        User documents with deterministic ids and emails user<n>@example.com
+    """
+    # Hashing once keeps a million users to seconds instead of hours
+    password_hash = password_hash or generated_password_hash(seed)
+    for index in range(count):
+        document = User.create_document(
+            email=f"user{index}@example.com",
+            password_hash=password_hash,
+            name=f"User {index}"
+        )
+        document["created_at"] = document["updated_at"] = _created_at(index, count)
+        document["_id"] = synthetic_object_id("users", seed, index, document["created_at"])
+        yield document
+
+def generate_reviews(count: int, bathrooms: int, users: int, seed: int = 0,
+                     zipf: float = 1.1) -> Iterator[Dict[str, Any]]:
+    """Yield reviews of generated bathrooms whose popularity follows a Zipf curve.
+
+    Popularity ranks are scattered over the bathrooms by a seeded modular
+    permutation, so the busiest ones are spread across campuses rather than
+    being the first ones generated. Bathroom and user ids are derived from
+    their index, so no id list is held in memory.
+
+    Args:
+        count: Number of reviews
+        bathrooms: Number of generated bathrooms to review
+        users: Number of generated users, chosen uniformly as reviewers
+        seed: Random seed, the same one the bathrooms and users were generated with
+        zipf: Popularity skew; 0 spreads reviews uniformly
+
+    Yields:
+        Review documents with deterministic ids, oldest first
+    """
+    rng = random.Random(seed + 1)
+    # Any stride coprime to the bathroom count visits every bathroom exactly once
+    stride = rng.randrange(1, bathrooms + 1)
+    while math.gcd(stride, bathrooms) != 1:
+        stride = rng.randrange(1, bathrooms + 1)
+    offset = rng.randrange(bathrooms)
+    sampler = ZipfSampler(bathrooms, zipf, rng)
+    for index in range(count):
+        rank = sampler.sample()
+        document = Review.create_document(
+            bathroom_id=generated_id("bathrooms", (rank * stride + offset) % bathrooms, bathrooms, seed),
+            user_id=generated_id("users", rng.randrange(users), users, seed),
+            cleanliness=rng.randint(1, 5),
+            privacy=rng.randint(1, 5),
+            accessibility=rng.randint(1, 5),
+            best_for=rng.choice(BEST_FOR),
+            comment=rng.choice(COMMENTS)
+        )
+        document["created_at"] = document["updated_at"] = _created_at(index, count)
+        document["_id"] = synthetic_object_id("reviews", seed, index, document["created_at"])
+        yield document
+
+def _tally_review(stats_by_bathroom: Dict[str, Dict[str, Any]], review: Dict[str, Any]) -> Dict[str, Any]:
+    """Add a generated review to its bathroom's aggregates, as rebuild_rating_stats would."""
+    stats = stats_by_bathroom.get(review["bathroom_id"])
+    if stats is None:
+        stats = stats_by_bathroom[review["bathroom_id"]] = empty_rating_stats()
+    stats["review_count"] += 1
+    for field in RATING_FIELDS:
+        stats["sums"][field] += review["ratings"][field]
+    key = best_for_key(review["best_for"])
+    if key:
+        stats["best_for"][key] = stats["best_for"].get(key, 0) + 1
+    return review
+
+def _apply_review_batch(db: Database, reviews: Sequence[Dict[str, Any]]) -> None:
+    """Add one inserted batch of reviews to their bathrooms' counters, one $inc per bathroom."""
+    stats_by_bathroom: Dict[str, Dict[str, Any]] = {}
+    for review in reviews:
+        _tally_review(stats_by_bathroom, review)
+    operations = []
+    for bathroom_id, stats in stats_by_bathroom.items():
+        increments = {"rating_stats.review_count": stats["review_count"]}
+        for field in RATING_FIELDS:
+            increments[f"rating_stats.sums.{field}"] = stats["sums"][field]
+        for key, count in stats["best_for"].items():
+            increments[f"rating_stats.best_for.{key}"] = count
+        operations.append(UpdateOne({"_id": ObjectId(bathroom_id)}, {"$inc": increments}))
+    if operations:
+        db.bathrooms.bulk_write(operations, ordered=False)
+
+def _write_averages(db: Database, batch_size: int) -> None:
+    """Compute the averages of every reviewed bathroom once its counters are complete."""
+    operations = []
+    for bathroom in db.bathrooms.find({"rating_stats.review_count": {"$gt": 0}}, {"rating_stats": 1}):
+        averages = compute_averages(bathroom["rating_stats"])
+        operations.append(UpdateOne({"_id": bathroom["_id"]}, {"$set": {"rating_stats.averages": averages}}))
+        if len(operations) >= batch_size:
+            db.bathrooms.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        db.bathrooms.bulk_write(operations, ordered=False)
+
+def _finish_stats(stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    stats = stats or empty_rating_stats()
+    stats["averages"] = compute_averages(stats)
+    return stats
+
+def insert_batches(collection: Any, documents: Iterable[Dict[str, Any]], batch_size: int = GENERATE_BATCH_SIZE,
+                   on_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> int:
+    """Stream documents into a collection with unordered insert_many calls.
+
+    Args:
+        collection: Target collection
+        documents: Documents to insert, consumed lazily
+        batch_size: Documents per insert_many
+        on_batch: Called with each batch once it is inserted
+
+    Returns:
+        The number of inserted documents
+    """
+    inserted = 0
+    batch: List[Dict[str, Any]] = []
+
+    def flush() -> None:
+        nonlocal inserted
+        collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+        if on_batch:
+            on_batch(batch)
+
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    return inserted
+
+def generate_dataset(db: Database, bathrooms: int, users: int, reviews: int, seed: int = 0,
+                     campuses: Sequence[Campus] = DEFAULT_CAMPUSES, buildings_per_campus: int = 40,
+                     zipf: float = 1.1, batch_size: int = GENERATE_BATCH_SIZE,
+                     drop: bool = False) -> Dict[str, Any]:
+    """Generate and insert a synthetic dataset, with rating aggregates and indexes.
+
+    Documents are streamed in batches and ids are derived from their index,
+    so memory stays bounded by the batch size rather than the dataset size.
+    Each review batch adds to its bathrooms' counters, and averages are
+    written in one pass at the end. Indexes are built after the load, which
+    is faster than maintaining them while inserting.
+
+    Args:
+        db: Target database
+        bathrooms: Number of bathrooms
+        users: Number of users, at least 1 when there are reviews
+        reviews: Number of reviews
+        seed: Random seed; the same seed always produces the same documents
+        campuses: Campuses to scatter buildings over
+        buildings_per_campus: Buildings per campus
+        zipf: Review popularity skew across bathrooms
+        batch_size: Documents per insert_many
+        drop: Drop the bathrooms, users and reviews collections first
+
+    Returns:
+        Document counts and the seconds each phase took
+
+    Raises:
+        ValueError: If the collections already hold documents and drop is False,
+            or reviews are requested without bathrooms and users
+    """
+    if reviews and (not bathrooms or not users):
+        raise ValueError("Reviews need at least one bathroom and one user")
+    if drop:
+        for collection in ("bathrooms", "users", "reviews"):
+            db[collection].drop()
+    elif any(db[collection].estimated_document_count() for collection in ("bathrooms", "users", "reviews")):
+        raise ValueError("Database already contains data; drop it first")
+
+    timings = {}
+
+    started = time.monotonic()
+    user_count = insert_batches(db.users, generate_users(users, seed), batch_size)
+    timings["users"] = round(time.monotonic() - started, 2)
+
+    started = time.monotonic()
+    with_stats = (
+        dict(bathroom, rating_stats=_finish_stats(None))
+        for bathroom in generate_bathrooms(bathrooms, seed, campuses, buildings_per_campus)
+    )
+    bathroom_count = insert_batches(db.bathrooms, with_stats, batch_size)
+    timings["bathrooms"] = round(time.monotonic() - started, 2)
+
+    started = time.monotonic()
+    if reviews:
+        insert_batches(
+            db.reviews, generate_reviews(reviews, bathrooms, users, seed, zipf), batch_size,
+            on_batch=lambda batch: _apply_review_batch(db, batch)
+        )
+        _write_averages(db, batch_size)
+    timings["reviews"] = round(time.monotonic() - started, 2)
+
+    started = time.monotonic()
+    migrate(db, background=False)
+    # A drop removed these collections' indexes, but their migrations are still recorded
+    ensure_indexes(db, ("bathrooms", "users", "reviews"), background=False)
+    timings["indexes"] = round(time.monotonic() - started, 2)
+
+    return {
+        "bathrooms": bathroom_count,
+        "users": user_count,
+        "reviews": reviews,
+        "seconds": timings,
+    }
+
+
+def _parse_campus(ctx: click.Context, param: click.Parameter, values: Sequence[str]) -> List[Campus]:
+    campuses = []
+    for value in values:
+        parts = value.split(":")
+        try:
+            campuses.append(Campus(parts[0], float(parts[1]), float(parts[2]), *map(float, parts[3:4])))
+        except (IndexError, ValueError):
+            raise click.BadParameter(f"{value!r} is not NAME:LAT:LNG[:RADIUS_M]")
+    return campuses or DEFAULT_CAMPUSES
+
+def _connect(uri: Optional[str], dbname: Optional[str]) -> Database:
+    uri = uri or os.environ.get('MONGO_URI', 'mongodb://localhost:27017')
+    dbname = dbname or os.environ.get('MONGO_DBNAME', 'bathroom_map')
+    return MongoClient(uri)[dbname]
+
+
+@click.group()
+@click.option("--uri", help="MongoDB connection string, defaults to $MONGO_URI.")
+@click.option("--db", "dbname", help="Database name, defaults to $MONGO_DBNAME.")
+@click.pass_context
+def cli(ctx: click.Context, uri: Optional[str], dbname: Optional[str]) -> None:
+    """Seed the bathroom map database."""
+    ctx.obj = _connect(uri, dbname)
+
+@cli.command("nyu")
+@click.pass_obj
+def nyu_command(db: Database) -> None:
+    """Insert the NYU campus bathrooms into an empty database."""
+    seed_bathrooms(db)
+
+@cli.command("generate")
+@click.option("--bathrooms", default=1000, show_default=True, help="Bathrooms to generate.")
+@click.option("--users", default=100, show_default=True, help="Users to generate.")
+@click.option("--reviews", default=10000, show_default=True, help="Reviews to generate.")
+@click.option("--seed", default=0, show_default=True, help="Random seed; equal seeds give equal data.")
+@click.option("--campus", "campuses", multiple=True, callback=_parse_campus, metavar="NAME:LAT:LNG[:RADIUS_M]",
+              help="Campus to place buildings around, repeatable. Defaults to three New York campuses.")
+@click.option("--buildings-per-campus", default=40, show_default=True, help="Buildings per campus.")
+@click.option("--zipf", default=1.1, show_default=True, help="Review popularity skew; 0 is uniform.")
+@click.option("--batch-size", default=GENERATE_BATCH_SIZE, show_default=True, help="Documents per insert_many.")
+@click.option("--drop", is_flag=True, help="Drop existing bathrooms, users and reviews first.")
+@click.pass_obj
+def generate_command(db: Database, bathrooms: int, users: int, reviews: int, seed: int, campuses: List[Campus],
+                     buildings_per_campus: int, zipf: float, batch_size: int, drop: bool) -> None:
+    """Generate a synthetic dataset. Every user's password is "password"."""
+    try:
+        result = generate_dataset(
+            db, bathrooms, users, reviews, seed=seed, campuses=campuses,
+            buildings_per_campus=buildings_per_campus, zipf=zipf, batch_size=batch_size, drop=drop
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    seconds = ", ".join(f"{phase} {value}s" for phase, value in result["seconds"].items())
+    click.echo(f"Generated {result['bathrooms']} bathrooms, {result['users']} users "
+               f"and {result['reviews']} reviews ({seconds}).")
+
+
+if __name__ == "__main__":
+    cli()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,58 @@
+"""JSON encoding helpers for API responses."""
+from datetime import datetime, timezone
+from typing import Any
+from bson import ObjectId
+from bson import json_util
+from flask import request
+from flask.json import JSONEncoder
+
+# Media type clients send in Accept to opt into native JSON documents
+API_V2_MEDIA_TYPE = "application/vnd.bathroom-map.v2+json"
+
+
+class MongoJSONEncoder(JSONEncoder):
+    """JSON encoder that converts BSON values in the same pass as the response.
+
+    ObjectIds become their hex string and datetimes become ISO 8601 strings in
+    UTC, so documents can be handed to jsonify as-is.
+    """
+
+    def default(self, o: Any) -> Any:
+        if isinstance(o, ObjectId):
+            return str(o)
+        if isinstance(o, datetime):
+            if o.tzinfo is not None:
+                o = o.astimezone(timezone.utc).replace(tzinfo=None)
+            return o.isoformat() + "Z"
+        return super().default(o)
+
+
+def wants_native_json() -> bool:
+    """Check whether the current request opted into version 2 of the API.
+
+    Clients opt in with ``?v=2`` or by listing the v2 media type in Accept.
+    Wildcard Accept headers keep the legacy format.
+
+    Returns:
+        True if documents should be embedded as real JSON
+    """
+    if request.args.get('v') == '2':
+        return True
+    return any(mimetype == API_V2_MEDIA_TYPE for mimetype, _ in request.accept_mimetypes)
+
+def encode_documents(value: Any) -> Any:
+    """Prepare one or more MongoDB documents for a JSON response.
+
+    Version 2 clients get the documents back unchanged for the response encoder
+    to serialize natively. Legacy clients keep receiving a MongoDB Extended JSON
+    string that they decode with a second JSON.parse.
+
+    Args:
+        value: A document, a list of documents or None
+
+    Returns:
+        The value to place in the jsonify payload
+    """
+    if wants_native_json():
+        return value
+    return json_util.dumps(value)
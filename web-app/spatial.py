@@ -0,0 +1,472 @@
+"""In-process spatial index over bathroom coordinates."""
+import math
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from flask import Flask, current_app
+from schemas import get_db
+
+# Mean Earth radius in meters, as used by MongoDB's spherical geometry
+EARTH_RADIUS_M = 6371008.8
+
+# Length of one degree of latitude in meters
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+SPATIAL_DEFAULTS = {
+    'SPATIAL_INDEX_CELL_DEGREES': 0.01,
+    'SPATIAL_INDEX_TTL': 300,
+    # Largest radius in meters a nearby query may ask for
+    'NEARBY_MAX_DISTANCE': 50000,
+    'VIEWPORT_CLUSTER_BELOW_ZOOM': 15,
+    'VIEWPORT_CELLS_PER_TILE': 4,
+    'VIEWPORT_MAX_MARKERS': 2000,
+}
+
+BoundingBox = Tuple[float, float, float, float]
+
+# Longest stretch of a viewport's top or bottom edge between polygon vertices
+EDGE_STEP_DEGREES = 0.5
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Compute the great-circle distance between two points.
+
+    Args:
+        lat1: Latitude of the first point
+        lng1: Longitude of the first point
+        lat2: Latitude of the second point
+        lng2: Longitude of the second point
+
+    Returns:
+        Distance in meters
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _wrap_lng(lng: float) -> float:
+    """Bring a longitude from a scrolled map back into [-180, 180]."""
+    return lng if -180 <= lng <= 180 else (lng + 180) % 360 - 180
+
+def parse_bbox(value: Optional[str]) -> BoundingBox:
+    """Parse a ``min_lng,min_lat,max_lng,max_lat`` bounding box.
+
+    Longitudes outside [-180, 180] are wrapped back into range, and a box
+    360 degrees wide or more becomes the whole world. A box crossing the
+    antimeridian is returned with min_lng greater than max_lng.
+
+    Args:
+        value: The raw query string value
+
+    Returns:
+        The bounding box as four floats
+
+    Raises:
+        ValueError: If the value is missing, malformed or out of range
+    """
+    if not value:
+        raise ValueError("Missing bbox")
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise ValueError("bbox must be min_lng,min_lat,max_lng,max_lat")
+    min_lng, min_lat, max_lng, max_lat = (float(part) for part in parts)
+    if not all(math.isfinite(part) for part in (min_lng, min_lat, max_lng, max_lat)):
+        raise ValueError("bbox is out of range")
+    if not -90 <= min_lat < max_lat <= 90:
+        raise ValueError("bbox is out of range")
+    if max_lng - min_lng >= 360:
+        return -180.0, min_lat, 180.0, max_lat
+    min_lng, max_lng = _wrap_lng(min_lng), _wrap_lng(max_lng)
+    if min_lng == max_lng:
+        raise ValueError("bbox is out of range")
+    return min_lng, min_lat, max_lng, max_lat
+
+def _box_polygon(min_lng: float, min_lat: float, max_lng: float, max_lat: float) -> Dict[str, Any]:
+    """Build a closed GeoJSON polygon for a box.
+
+    MongoDB joins polygon vertices with great-circle arcs, which bow toward
+    the pole between two points on the same parallel. The top and bottom
+    edges therefore get a vertex every EDGE_STEP_DEGREES of longitude, which
+    keeps them within a few tens of meters of the parallel.
+    """
+    steps = max(1, math.ceil((max_lng - min_lng) / EDGE_STEP_DEGREES))
+    lngs = [min_lng + (max_lng - min_lng) * i / steps for i in range(steps)] + [max_lng]
+    ring = [[lng, min_lat] for lng in lngs] + [[lng, max_lat] for lng in reversed(lngs)]
+    ring.append([min_lng, min_lat])
+    return {"type": "Polygon", "coordinates": [ring]}
+
+def _lng_ranges(min_lng: float, max_lng: float) -> List[Tuple[float, float]]:
+    """Split a box's longitudes into west-to-east ranges each under 180 degrees wide."""
+    if min_lng > max_lng:
+        ranges = [(min_lng, 180.0), (-180.0, max_lng)]
+    else:
+        ranges = [(min_lng, max_lng)]
+    split = []
+    for west, east in ranges:
+        if west == east:
+            continue
+        if east - west < 180:
+            split.append((west, east))
+        else:
+            middle = (west + east) / 2
+            split.extend([(west, middle), (middle, east)])
+    return split
+
+def bbox_filter(bbox: BoundingBox) -> Dict[str, Any]:
+    """Build a $geoWithin filter for a bounding box that the 2dsphere index can serve.
+
+    GeoJSON polygons must be smaller than a hemisphere and cannot cross the
+    antimeridian, so such boxes are split into several polygons.
+
+    Args:
+        bbox: The viewport bounding box, from parse_bbox
+
+    Returns:
+        A filter on the location field
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    clauses = [
+        {"location": {"$geoWithin": {"$geometry": _box_polygon(west, min_lat, east, max_lat)}}}
+        for west, east in _lng_ranges(min_lng, max_lng)
+    ]
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+def cluster_cell_degrees(zoom: int, cells_per_tile: int) -> float:
+    """Size of a clustering grid cell at a map zoom level.
+
+    Args:
+        zoom: Web map zoom level, where a tile spans 360 / 2**zoom degrees
+        cells_per_tile: Number of grid cells across one map tile
+
+    Returns:
+        The cell width and height in degrees
+    """
+    return 360.0 / (2 ** zoom) / cells_per_tile
+
+def cluster_pipeline(bbox: BoundingBox, cell_degrees: float) -> List[Dict[str, Any]]:
+    """Aggregation pipeline that counts bathrooms per grid cell inside a viewport.
+
+    Args:
+        bbox: The viewport bounding box
+        cell_degrees: Grid cell size in degrees
+
+    Returns:
+        Pipeline stages producing one document per non-empty cell
+    """
+    lng = {"$arrayElemAt": ["$location.coordinates", 0]}
+    lat = {"$arrayElemAt": ["$location.coordinates", 1]}
+    return [
+        {"$match": bbox_filter(bbox)},
+        {"$group": {
+            "_id": {
+                "x": {"$floor": {"$divide": [lng, cell_degrees]}},
+                "y": {"$floor": {"$divide": [lat, cell_degrees]}}
+            },
+            "count": {"$sum": 1},
+            "lat": {"$avg": lat},
+            "lng": {"$avg": lng},
+            "id": {"$first": "$_id"}
+        }}
+    ]
+
+def marker_label(bathroom: Dict[str, Any]) -> str:
+    """Short label used for a map pin."""
+    return f"{bathroom.get('building', '')} - Floor {bathroom.get('floor', '')}"
+
+
+class SpatialIndex:
+    """Uniform lat/lng grid answering k-nearest and radius queries.
+
+    Candidates are gathered ring by ring around the query cell and ranked by
+    exact haversine distance. The search stops once no unvisited cell can hold
+    a closer point. A radius limits the search to the cells of its bounding
+    box, and when that box has more cells than the index has occupied ones,
+    the occupied cells are checked directly instead. Longitudes are not
+    wrapped at the antimeridian.
+
+    Args:
+        cell_degrees: Width and height of a grid cell in degrees
+    """
+
+    def __init__(self, cell_degrees: float = 0.01) -> None:
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Tuple[int, int], Dict[str, Tuple[float, float]]] = {}
+        self._points: Dict[str, Tuple[float, float]] = {}
+        # Bounding range of every cell ever filled, as (min_row, max_row, min_col, max_col)
+        self._extent: Optional[Tuple[int, int, int, int]] = None
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def upsert(self, item_id: str, lat: float, lng: float) -> None:
+        """Add a point or move an existing one.
+
+        Args:
+            item_id: Identifier of the point
+            lat: Latitude
+            lng: Longitude
+        """
+        self.remove(item_id)
+        self._points[item_id] = (lat, lng)
+        row, col = self._cell(lat, lng)
+        self._cells.setdefault((row, col), {})[item_id] = (lat, lng)
+        if self._extent is None:
+            self._extent = (row, row, col, col)
+        else:
+            min_row, max_row, min_col, max_col = self._extent
+            self._extent = (min(min_row, row), max(max_row, row), min(min_col, col), max(max_col, col))
+
+    def remove(self, item_id: str) -> None:
+        """Remove a point if it is indexed.
+
+        Args:
+            item_id: Identifier of the point
+        """
+        point = self._points.pop(item_id, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        members = self._cells.get(cell)
+        if members is not None:
+            members.pop(item_id, None)
+            if not members:
+                del self._cells[cell]
+
+    def _ring(self, center: Tuple[int, int], radius: int,
+              box: Tuple[int, int, int, int]) -> Iterable[Tuple[int, int]]:
+        """Yield the cells exactly `radius` steps away from center that lie inside box."""
+        row, col = center
+        min_row, max_row, min_col, max_col = box
+        if radius == 0:
+            if min_row <= row <= max_row and min_col <= col <= max_col:
+                yield center
+            return
+        first_col, last_col = max(col - radius, min_col), min(col + radius, max_col)
+        for edge_row in (row - radius, row + radius):
+            if min_row <= edge_row <= max_row:
+                for d_col in range(first_col, last_col + 1):
+                    yield edge_row, d_col
+        first_row, last_row = max(row - radius + 1, min_row), min(row + radius - 1, max_row)
+        for edge_col in (col - radius, col + radius):
+            if min_col <= edge_col <= max_col:
+                for d_row in range(first_row, last_row + 1):
+                    yield d_row, edge_col
+
+    def _ring_bound(self, lat: float, radius: int) -> float:
+        """Lower bound on the distance to any point beyond `radius` rings."""
+        degrees = radius * self.cell_degrees
+        max_lat = min(89.9, abs(lat) + degrees + self.cell_degrees)
+        return degrees * METERS_PER_DEGREE * math.cos(math.radians(max_lat))
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: Optional[int] = None,
+        max_distance: Optional[float] = None
+    ) -> List[Tuple[float, str]]:
+        """Find the points closest to a location.
+
+        Args:
+            lat: Query latitude
+            lng: Query longitude
+            k: Maximum number of points to return, or None for all
+            max_distance: Radius in meters, or None for no limit
+
+        Returns:
+            (distance in meters, item_id) pairs sorted by distance
+        """
+        if not self._points or k == 0:
+            return []
+        center = self._cell(lat, lng)
+        # The extent only grows, so after removals it may cover a few empty cells
+        min_row, max_row, min_col, max_col = self._extent
+        if max_distance is not None:
+            # Only cells inside the box around the radius can hold a match
+            d_lat = max_distance / METERS_PER_DEGREE
+            edge = abs(lat) + d_lat
+            if edge < 90:
+                d_lng = min(180.0, max_distance / (METERS_PER_DEGREE * math.cos(math.radians(edge))))
+            else:
+                d_lng = 180.0
+            min_row = max(min_row, math.floor((lat - d_lat) / self.cell_degrees))
+            max_row = min(max_row, math.floor((lat + d_lat) / self.cell_degrees))
+            if d_lng < 180:
+                min_col = max(min_col, math.floor((lng - d_lng) / self.cell_degrees))
+                max_col = min(max_col, math.floor((lng + d_lng) / self.cell_degrees))
+            if min_row > max_row or min_col > max_col:
+                return []
+
+        found: List[Tuple[float, str]] = []
+        area = (max_row - min_row + 1) * (max_col - min_col + 1)
+        if area > len(self._cells):
+            # Fewer occupied cells than cells in the box, so check each of them once.
+            # Near the poles the ring bound grows too slowly to stop a ring search early.
+            for (row, col), members in self._cells.items():
+                if min_row <= row <= max_row and min_col <= col <= max_col:
+                    for item_id, (p_lat, p_lng) in members.items():
+                        distance = haversine_m(lat, lng, p_lat, p_lng)
+                        if max_distance is None or distance <= max_distance:
+                            found.append((distance, item_id))
+            found.sort()
+            return found if k is None else found[:k]
+
+        max_radius = max(center[0] - min_row, max_row - center[0], center[1] - min_col, max_col - center[1], 0)
+        for radius in range(max_radius + 1):
+            for cell in self._ring(center, radius, (min_row, max_row, min_col, max_col)):
+                for item_id, (p_lat, p_lng) in self._cells.get(cell, {}).items():
+                    distance = haversine_m(lat, lng, p_lat, p_lng)
+                    if max_distance is None or distance <= max_distance:
+                        found.append((distance, item_id))
+            bound = self._ring_bound(lat, radius)
+            if max_distance is not None and bound > max_distance:
+                break
+            if k is not None and len(found) >= k:
+                found.sort()
+                if found[k - 1][0] <= bound:
+                    break
+        found.sort()
+        return found if k is None else found[:k]
+
+
+class BathroomLocator:
+    """Spatial index over the bathrooms collection, shared by one process.
+
+    The index is loaded lazily from MongoDB, kept in sync by the write routes
+    and reloaded after SPATIAL_INDEX_TTL seconds so that writes made by other
+    worker processes are picked up. Reloads build a new index without holding
+    the lock, so queries keep using the old one until it is swapped out.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._index: Optional[SpatialIndex] = None
+        self._loaded_at = 0.0
+        # Writes seen while a reload is running, replayed onto the new index before the swap
+        self._pending: Optional[List[Tuple[str, Optional[Tuple[float, float]]]]] = None
+
+    def _load(self) -> SpatialIndex:
+        """Build a fresh index from the bathrooms collection."""
+        index = SpatialIndex(self.app.config['SPATIAL_INDEX_CELL_DEGREES'])
+        for bathroom in get_db().bathrooms.find({}, {"location.coordinates": 1}):
+            coordinates = bathroom.get("location", {}).get("coordinates")
+            if coordinates and len(coordinates) == 2:
+                index.upsert(str(bathroom["_id"]), coordinates[1], coordinates[0])
+        return index
+
+    def _current(self) -> Optional[SpatialIndex]:
+        """Return the index if it is loaded and fresh. Caller holds the lock."""
+        expired = time.monotonic() - self._loaded_at > self.app.config['SPATIAL_INDEX_TTL']
+        return None if expired else self._index
+
+    def index(self) -> SpatialIndex:
+        """Return the current index, loading or refreshing it when stale.
+
+        Only one thread reloads at a time. While it does, other threads keep
+        querying the stale index, or wait for the first load if there is none.
+        """
+        with self._lock:
+            index = self._current()
+        if index is not None:
+            return index
+        with self._reload_lock:
+            with self._lock:
+                index = self._current()
+                if index is not None:
+                    return index
+                self._pending = []
+            try:
+                fresh = self._load()
+            except BaseException:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                for item_id, point in self._pending:
+                    if point is None:
+                        fresh.remove(item_id)
+                    else:
+                        fresh.upsert(item_id, *point)
+                self._pending = None
+                self._index = fresh
+                self._loaded_at = time.monotonic()
+            return fresh
+
+    def upsert(self, bathroom_id: Any, lat: float, lng: float) -> None:
+        """Record a created or moved bathroom."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((str(bathroom_id), (lat, lng)))
+            if self._index is not None:
+                self._index.upsert(str(bathroom_id), lat, lng)
+
+    def remove(self, bathroom_id: Any) -> None:
+        """Forget a deleted bathroom."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((str(bathroom_id), None))
+            if self._index is not None:
+                self._index.remove(str(bathroom_id))
+
+    def nearest(self, lat: float, lng: float, k: Optional[int] = None,
+                max_distance: Optional[float] = None) -> List[Tuple[float, str]]:
+        """Find the bathrooms closest to a location.
+
+        Args:
+            lat: Query latitude
+            lng: Query longitude
+            k: Maximum number of bathrooms to return
+            max_distance: Radius in meters
+
+        Returns:
+            (distance in meters, bathroom_id) pairs sorted by distance
+        """
+        index = self.index()
+        with self._lock:
+            return index.nearest(lat, lng, k, max_distance)
+
+    def reset(self) -> None:
+        """Drop the index so the next query reloads it."""
+        with self._lock:
+            self._index = None
+            self._loaded_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the size and age of the index."""
+        with self._lock:
+            return {
+                "loaded": self._index is not None,
+                "size": len(self._index) if self._index is not None else 0,
+                "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._index is not None else None,
+            }
+
+
+def get_locator(app: Optional[Flask] = None) -> BathroomLocator:
+    """Get the bathroom spatial index owned by the application.
+
+    Args:
+        app: The Flask application instance, defaults to the current app
+
+    Returns:
+        The application's BathroomLocator
+    """
+    app = app or current_app._get_current_object()
+    return app.extensions['spatial_index']
+
+def init_app(app: Flask) -> None:
+    """Attach a bathroom spatial index to the Flask application.
+
+    Args:
+        app: The Flask application instance
+    """
+    for key, value in SPATIAL_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    app.extensions['spatial_index'] = BathroomLocator(app)
@@ -0,0 +1,31 @@
+"""Streamed template rendering, so page headers reach the client before the whole body is built."""
+from typing import Any, Iterator
+from flask import Response, before_render_template, current_app, stream_with_context, template_rendered
+
+
+def stream_template(template_name: str, **context: Any) -> Response:
+    """Render a template as a streamed response.
+
+    Backports Flask 2.2's ``stream_template``: the render signals still fire,
+    with ``template_rendered`` sent once the last chunk has been generated,
+    and the request context stays available to the template throughout.
+    Load everything that can fail before calling this, since errors raised
+    mid-stream arrive after the 200 status has been sent.
+
+    Args:
+        template_name: Name of the template to render
+        **context: Variables for the template
+
+    Returns:
+        A streaming HTML response
+    """
+    app = current_app._get_current_object()
+    template = app.jinja_env.get_or_select_template(template_name)
+    app.update_template_context(context)
+
+    def generate() -> Iterator[str]:
+        before_render_template.send(app, template=template, context=context)
+        yield from template.generate(context)
+        template_rendered.send(app, template=template, context=context)
+
+    return Response(stream_with_context(generate()), mimetype="text/html")
@@ -19,6 +19,9 @@ os.environ["MONGO_DBNAME"] = "test_bathroom_map"
 # Now import app module
 import app as app_module
 from schemas import init_app
+from schemas.migrations import ensure_indexes
+import query_budget
+from query_budget import CountingDatabase, get_query_counter
 
 @pytest.fixture(scope="session")
 def app():
@@ -32,7 +35,10 @@ def app():
         "MONGO_URI": "mongodb://localhost:27017",
         "MONGO_DBNAME": "test_bathroom_map",
         "SERVER_NAME": "localhost.localdomain",  # Needed for url_for in tests
-        "WTF_CSRF_ENABLED": False  # Disable CSRF for testing
+        "WTF_CSRF_ENABLED": False,  # Disable CSRF for testing
+        "GEOCODER_MIN_DELAY_SECONDS": 0,  # Fake geocoders need no rate limit
+        "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",  # Cheap hashes keep auth tests fast
+        "JOBS_WORKERS": 0  # Tests run queued jobs explicitly with run_pending()
     })
     
     return flask_app
@@ -57,21 +63,12 @@ def setup_db(app, monkeypatch):
     def mock_get_db():
         return mock_db
     
-    # Patch the real get_db with our mock and skip real db initialization BEFORE any test runs
+    # Patch the real get_db with our mock BEFORE any test runs
     import schemas.database
     monkeypatch.setattr("schemas.database.get_db", mock_get_db)
-    monkeypatch.setattr("schemas.models.init_db", lambda app: None)
     
-    # Set up all required indexes in mock db
-    mock_db.users.create_index("email", unique=True)
-    
-    # Create indexes for test collections (mongomock doesn't fully support geospatial)
-    try:
-        mock_db.bathrooms.create_index("building")
-        mock_db.reviews.create_index("bathroom_id")
-        mock_db.reviews.create_index("user_id")
-    except Exception as e:
-        print(f"Warning: Could not create some indexes in test DB: {e}")
+    # Build the indexes declared by the migrations, so tests see the same unique constraints
+    ensure_indexes(mock_db, background=False)
     
     # Clear collections before each test
     for collection in mock_db.list_collection_names():
@@ -80,10 +77,35 @@ def setup_db(app, monkeypatch):
     # Make the mock_db accessible from app
     app.mock_db = mock_db
     
+    # Reset in-process caches that would otherwise outlive a single test
+    app.extensions['geocoder'].reset()
+    app.extensions['spatial_index'].reset()
+    app.extensions['response_cache'].reset()
+    app.extensions['password_hasher'].reset()
+    app.extensions['user_cache'].reset()
+    app.extensions['query_log'].reset()
+    app.extensions['metrics'].reset()
+    app.extensions['query_counter'].reset()
+    app.extensions['job_runner'].reset()
+    
     # Run test with app context
     with app.app_context():
         yield mock_db
 
+@pytest.fixture
+def assert_max_queries(app, setup_db):
+    """Context manager factory failing a block that issues more than n MongoDB commands.
+
+    mongomock emits no command events, so the app's database is wrapped to
+    report each collection call instead.
+    """
+    app.mock_db = CountingDatabase(setup_db, get_query_counter(app))
+    
+    def assert_max(limit):
+        return query_budget.assert_max_queries(limit, app=app)
+    
+    return assert_max
+
 @pytest.fixture
 def mock_user_id():
     """Generate a mock user ID."""
@@ -180,6 +202,12 @@ def login_user(client, mock_user, setup_db, app):
     # Return the wrapped client
     return AuthClient(client, access_token)
 
+@pytest.fixture
+def admin_user(login_user, app, monkeypatch):
+    """Log in the mock user with admin rights."""
+    monkeypatch.setitem(app.config, 'ADMIN_EMAILS', ["test@example.com"])
+    return login_user
+
 @pytest.fixture
 def db(setup_db):
     """Alias for setup_db to maintain backward compatibility with tests."""
@@ -0,0 +1,76 @@
+"""Tests for the per-bathroom rating aggregates."""
+import json
+from schemas.aggregates import best_for_key, rebuild_rating_stats
+
+
+def _post_review(login_user, bathroom_id, **overrides):
+    """Create a review through the API and return the response."""
+    review_data = {
+        "cleanliness": 4,
+        "privacy": 2,
+        "accessibility": 5,
+        "best_for": "Quick stop",
+        "comment": "Aggregate test"
+    }
+    review_data.update(overrides)
+    return login_user.post(
+        f"/api/bathrooms/{bathroom_id}/reviews",
+        data=json.dumps(review_data),
+        content_type="application/json"
+    )
+
+
+def test_best_for_key_normalization():
+    """Test that best_for labels become safe document keys."""
+    assert best_for_key("  Quick   Stop ") == "quick stop"
+    assert best_for_key("a.b") == "a_b"
+    assert best_for_key("$where") == "_where"
+    assert best_for_key("") is None
+    assert best_for_key(None) is None
+
+
+def test_create_review_updates_aggregates(db, mock_bathroom, login_user):
+    """Test that creating reviews increments the bathroom's counters."""
+    _post_review(login_user, mock_bathroom["_id"])
+    _post_review(login_user, mock_bathroom["_id"], cleanliness=2, best_for="quick stop")
+
+    stats = db.bathrooms.find_one({"_id": mock_bathroom["_id"]})["rating_stats"]
+    assert stats["review_count"] == 2
+    assert stats["sums"]["cleanliness"] == 6
+    assert stats["averages"]["cleanliness"] == 3.0
+    assert stats["averages"]["accessibility"] == 5.0
+    assert stats["best_for"] == {"quick stop": 2}
+
+
+def test_update_and_delete_review_adjust_aggregates(db, mock_bathroom, login_user):
+    """Test that editing and deleting a review keeps the counters consistent."""
+    response = _post_review(login_user, mock_bathroom["_id"])
+    review_id = response.json["review_id"]
+
+    login_user.put(
+        f"/api/reviews/{review_id}",
+        data=json.dumps({"cleanliness": 1, "best_for": "Emergency"}),
+        content_type="application/json"
+    )
+    stats = db.bathrooms.find_one({"_id": mock_bathroom["_id"]})["rating_stats"]
+    assert stats["review_count"] == 1
+    assert stats["averages"]["cleanliness"] == 1.0
+    assert stats["best_for"] == {"emergency": 1}
+
+    login_user.delete(f"/api/reviews/{review_id}")
+    stats = db.bathrooms.find_one({"_id": mock_bathroom["_id"]})["rating_stats"]
+    assert stats["review_count"] == 0
+    assert stats["averages"]["cleanliness"] is None
+    assert stats["best_for"] == {}
+
+
+def test_rebuild_rating_stats(db, mock_bathroom, mock_review):
+    """Test that a rebuild recomputes aggregates from existing reviews."""
+    rebuilt = rebuild_rating_stats(db)
+
+    assert rebuilt == 1
+    stats = db.bathrooms.find_one({"_id": mock_bathroom["_id"]})["rating_stats"]
+    assert stats["review_count"] == 1
+    assert stats["sums"] == {"cleanliness": 4, "privacy": 3, "accessibility": 4}
+    assert stats["averages"]["privacy"] == 3.0
+    assert stats["best_for"] == {"quick stop": 1}
@@ -261,4 +261,45 @@ def test_get_nearby_bathrooms(client, db, mock_bathroom):
     
     # In test mode, since geospatial queries may not work with mongomock, 
     # we expect to get all bathrooms back
-    assert len(bathrooms) > 0 
\ No newline at end of file
+    assert len(bathrooms) > 0 
+
+def test_get_bathrooms_cursor_pagination(client, db, mock_bathroom):
+    """Test walking the bathroom list with opaque cursors."""
+    # Given
+    db.bathrooms.insert_many([
+        {
+            "building": f"Cursor Building {i}",
+            "floor": 1,
+            "location": {"type": "Point", "coordinates": [0.0, 0.0]},
+            "is_accessible": True,
+            "gender": "all"
+        }
+        for i in range(4)
+    ])
+    
+    # When - Follow next_cursor until the end
+    seen = []
+    response = client.get("/api/bathrooms?cursor=&per_page=2&include_total=true")
+    assert response.json["total"] == 5
+    while True:
+        assert response.status_code == 200
+        seen.extend(b["building"] for b in json.loads(response.json["bathrooms"]))
+        next_cursor = response.json["next_cursor"]
+        if not next_cursor:
+            break
+        response = client.get(f"/api/bathrooms?cursor={next_cursor}&per_page=2")
+    
+    # Then
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+    assert "total" not in response.json
+
+
+def test_get_bathrooms_invalid_cursor(client, mock_bathroom):
+    """Test that a malformed cursor is rejected."""
+    # When
+    response = client.get("/api/bathrooms?cursor=not-a-cursor")
+    
+    # Then
+    assert response.status_code == 400
+    assert "error" in response.json
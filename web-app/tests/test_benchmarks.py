@@ -0,0 +1,73 @@
+"""Tests for the benchmark harness."""
+import mongomock
+import pytest
+from benchmarks import SCENARIO_NAMES, run_benchmarks
+from benchmarks.harness import check_nearby
+from response_cache import get_response_cache
+from spatial import get_locator
+from benchmarks.dataset import seed_dataset
+from schemas.migrations import missing_indexes
+
+
+def test_seed_dataset_targets_reviewed_bathrooms():
+    """Test that request targets are bathrooms that have reviews."""
+    db = mongomock.MongoClient()["bench_test"]
+
+    dataset = seed_dataset(db, 20)
+
+    assert db.bathrooms.count_documents({}) == 20
+    assert db.reviews.count_documents({}) == 20
+    assert dataset.bathroom_ids
+    for bathroom_id in dataset.bathroom_ids:
+        assert db.reviews.count_documents({"bathroom_id": bathroom_id}) > 0
+
+
+def test_reseeding_keeps_indexes():
+    """Test that every dataset size after the first still has the declared indexes."""
+    db = mongomock.MongoClient()["bench_test"]
+
+    seed_dataset(db, 10)
+    seed_dataset(db, 20)
+
+    assert missing_indexes(db) == {}
+
+
+def test_run_benchmarks_reports_every_scenario():
+    """Test that a small mongomock run reports throughput and percentiles for every scenario."""
+    report = run_benchmarks(
+        ["mongomock"], [5, 10], requests=3, warmup=1,
+        config={"PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000", "RESPONSE_CACHE_ENABLED": False}
+    )
+
+    assert [result["scenario"] for result in report["results"]] == SCENARIO_NAMES * 2
+    assert [result["size"] for result in report["results"]] == [5] * len(SCENARIO_NAMES) + [10] * len(SCENARIO_NAMES)
+    for result in report["results"]:
+        assert set(result["statuses"]) <= {"200", "201"}
+        assert result["throughput_rps"] > 0
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"] <= result["latency_ms"]["max"]
+
+
+def test_each_size_sees_its_own_data():
+    """Test that caches filled at one size are dropped before the next is timed."""
+    report = run_benchmarks(
+        ["mongomock"], [10, 300], ["get_nearby_bathrooms"], requests=2, warmup=1,
+        config={"PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000"}
+    )
+
+    assert [result["size"] for result in report["results"]] == [10, 300]
+
+
+def test_check_nearby_raises_when_nothing_is_found(app):
+    """Test that the nearby sanity check fails a run instead of timing empty results."""
+    db = mongomock.MongoClient()["bench_test"]
+    app.mock_db = db
+    dataset = seed_dataset(db, 10)
+    client = app.test_client()
+
+    with app.app_context():
+        assert check_nearby(client, dataset) > 0
+        db.bathrooms.delete_many({})
+        get_locator(app).reset()
+        get_response_cache(app).reset()
+        with pytest.raises(RuntimeError):
+            check_nearby(client, dataset)
@@ -0,0 +1,81 @@
+"""Tests for the one-time database bootstrap."""
+from datetime import datetime, timedelta
+import mongomock
+import bootstrap
+from bootstrap import BOOTSTRAP_COLLECTION, LOCK_ID, MARKER_ID, acquire_lock, bootstrap_on_startup, run_bootstrap
+from query_budget import CountingDatabase, get_query_counter
+from schemas.migrations import MIGRATIONS
+
+
+def _fresh_db():
+    return mongomock.MongoClient()["bootstrap_test"]
+
+
+def test_run_bootstrap_migrates_seeds_and_marks():
+    """Test that a bootstrap applies every migration, seeds once and records the marker."""
+    db = _fresh_db()
+
+    result = run_bootstrap(db)
+
+    assert result["status"] == "ran"
+    assert result["applied"] == [migration.version for migration in MIGRATIONS]
+    assert db.bathrooms.count_documents({}) == 10
+    marker = db[BOOTSTRAP_COLLECTION].find_one({"_id": MARKER_ID})
+    assert bootstrap.is_current(marker)
+    assert db[BOOTSTRAP_COLLECTION].find_one({"_id": LOCK_ID}) is None
+
+
+def test_marker_missing_an_older_migration_is_stale():
+    """Test that a migration with a lower version than the newest applied one is not treated as done."""
+    versions = [migration.version for migration in MIGRATIONS]
+
+    assert bootstrap.is_current({"migration_versions": versions, "seeded": True})
+    assert not bootstrap.is_current({"migration_versions": versions[:1] + versions[2:], "seeded": True})
+    assert not bootstrap.is_current({"migration_version": versions[-1], "seeded": True})
+
+
+def test_bootstrap_skips_while_another_process_holds_the_lock():
+    """Test that a held lock makes other processes start without doing the work."""
+    db = _fresh_db()
+    db[BOOTSTRAP_COLLECTION].insert_one(
+        {"_id": LOCK_ID, "owner": "other:1", "expires_at": datetime.utcnow() + timedelta(minutes=5)}
+    )
+
+    assert run_bootstrap(db)["status"] == "locked"
+    assert db.bathrooms.count_documents({}) == 0
+
+
+def test_expired_lock_is_taken_over():
+    """Test that a lock left by a crashed process does not block bootstrap forever."""
+    db = _fresh_db()
+    db[BOOTSTRAP_COLLECTION].insert_one(
+        {"_id": LOCK_ID, "owner": "crashed:1", "expires_at": datetime.utcnow() - timedelta(seconds=1)}
+    )
+
+    assert acquire_lock(db, 60)
+    assert db[BOOTSTRAP_COLLECTION].find_one({"_id": LOCK_ID})["owner"] != "crashed:1"
+
+
+def test_startup_with_current_marker_costs_one_query(app):
+    """Test that once bootstrapped, startup only reads the marker."""
+    app.mock_db[BOOTSTRAP_COLLECTION].insert_one(
+        {"_id": MARKER_ID, "migration_versions": [migration.version for migration in MIGRATIONS], "seeded": True}
+    )
+    counter = get_query_counter(app)
+    app.mock_db = CountingDatabase(app.mock_db, counter)
+
+    with counter.capture() as captured:
+        result = bootstrap_on_startup(app)
+
+    assert result == {"status": "current"}
+    assert captured == [{"command": "find", "collection": BOOTSTRAP_COLLECTION}]
+
+
+def test_startup_stats_are_reported(admin_user):
+    """Test that app construction time and the bootstrap outcome are in the admin stats."""
+    response = admin_user.get("/api/admin/stats")
+
+    startup = response.json["startup"]
+    assert startup["bootstrap"] == "disabled"
+    assert startup["create_app_ms"] > 0
+    assert "import_ms" in startup
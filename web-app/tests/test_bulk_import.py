@@ -0,0 +1,137 @@
+"""Tests for the streaming bathroom bulk import."""
+import json
+import mongomock
+from pymongo.errors import AutoReconnect
+from bulk_io import import_bathrooms, iter_ndjson_rows
+
+
+def _ndjson(rows):
+    return "\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows) + "\n"
+
+
+def test_ndjson_import_reports_bad_rows(login_user, setup_db):
+    """Test that valid rows are inserted and invalid ones are reported by line."""
+    # Given
+    body = _ndjson([
+        {"building": "Kimmel Center", "floor": 2, "latitude": 40.7294, "longitude": -73.9972, "is_accessible": True},
+        {"building": "Bobst Library", "floor": 1, "latitude": 40.7295},
+        "{not json",
+        {"building": "Silver Center", "floor": 1, "latitude": 40.7308, "longitude": -73.9954, "gender": "robot"},
+        {"building": "Tisch Hall", "floor": "3", "latitude": "40.7295", "longitude": "-73.9965"}
+    ])
+
+    # When
+    response = login_user.post("/api/bathrooms/bulk", data=body, content_type="application/x-ndjson")
+
+    # Then
+    assert response.status_code == 200
+    report = json.loads(response.data)
+    assert report["inserted"] == 2
+    assert report["failed"] == 3
+    assert [error["row"] for error in report["errors"]] == [2, 3, 4]
+    assert "longitude" in report["errors"][0]["error"]
+    tisch = setup_db.bathrooms.find_one({"building": "Tisch Hall"})
+    assert tisch["floor"] == 3
+    assert tisch["rating_stats"]["review_count"] == 0
+
+
+def test_csv_import(login_user, client, setup_db):
+    """Test that CSV uploads are keyed by their header and show up in nearby search."""
+    # Given
+    body = (
+        "building,floor,latitude,longitude,is_accessible,gender\n"
+        "Kimmel Center,2,40.7294,-73.9972,yes,all\n"
+        "Bobst Library,one,40.7295,-73.9975,no,all\n"
+    )
+
+    # When
+    response = login_user.post("/api/bathrooms/bulk", data=body, content_type="text/csv")
+
+    # Then
+    report = json.loads(response.data)
+    assert report["inserted"] == 1
+    assert report["errors"] == [{"row": 3, "error": report["errors"][0]["error"]}]
+    assert setup_db.bathrooms.find_one({"building": "Kimmel Center"})["is_accessible"] is True
+    nearby = json.loads(client.get("/api/bathrooms/nearby?lat=40.7294&lng=-73.9972&v=2").data)
+    assert [b["building"] for b in nearby["bathrooms"]] == ["Kimmel Center"]
+
+
+def test_import_invalidates_cached_listing(login_user, client, setup_db):
+    """Test that imported bathrooms are visible in a previously cached listing."""
+    assert json.loads(client.get("/api/bathrooms").data)["total"] == 0
+
+    body = _ndjson([{"building": "Kimmel Center", "floor": 2, "latitude": 40.7294, "longitude": -73.9972}])
+    login_user.post("/api/bathrooms/bulk", data=body, content_type="application/x-ndjson")
+
+    assert json.loads(client.get("/api/bathrooms").data)["total"] == 1
+
+
+def test_unsupported_upload_type(login_user):
+    """Test that uploads in other formats are rejected."""
+    response = login_user.post("/api/bathrooms/bulk", data="[]", content_type="application/json")
+
+    assert response.status_code == 415
+
+
+def test_bulk_import_requires_auth(client):
+    """Test that anonymous uploads are rejected."""
+    response = client.post("/api/bathrooms/bulk", data="", content_type="application/x-ndjson")
+
+    assert response.status_code == 401 or response.status_code == 302  # 302 if redirected to login
+
+
+def test_import_writes_in_batches(setup_db):
+    """Test that rows are inserted in batches of the configured size."""
+    # Given
+    calls = []
+    rows = [{"building": f"Hall {i}", "floor": 1, "latitude": 40.7, "longitude": -73.9} for i in range(5)]
+    lines = _ndjson(rows).splitlines(keepends=True)
+
+    # When
+    report = import_bathrooms(
+        setup_db.bathrooms, iter_ndjson_rows(lines), batch_size=2, on_inserted=lambda docs: calls.append(len(docs))
+    )
+
+    # Then
+    assert report["inserted"] == 5
+    assert calls == [2, 2, 1]
+    assert setup_db.bathrooms.count_documents({}) == 5
+
+
+def test_error_report_is_capped(setup_db):
+    """Test that only max_errors row errors are kept in the report."""
+    lines = ["{}\n"] * 5
+
+    report = import_bathrooms(setup_db.bathrooms, iter_ndjson_rows(lines), max_errors=2)
+
+    assert report["failed"] == 5
+    assert len(report["errors"]) == 2
+    assert report["errors_truncated"] is True
+
+
+def test_import_reports_progress_when_the_database_fails(app, login_user, setup_db, monkeypatch):
+    """Test that a connection error part way through returns the counts of committed batches."""
+    # Given - The second batch cannot reach the server
+    insert_many = mongomock.collection.Collection.insert_many
+    calls = []
+
+    def failing_insert_many(self, documents, *args, **kwargs):
+        calls.append(len(documents))
+        if len(calls) == 2:
+            raise AutoReconnect("connection lost")
+        return insert_many(self, documents, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "insert_many", failing_insert_many)
+    monkeypatch.setitem(app.config, 'BULK_IMPORT_BATCH_SIZE', 2)
+    rows = [{"building": f"Hall {i}", "floor": 1, "latitude": 40.7, "longitude": -73.9} for i in range(5)]
+
+    # When
+    response = login_user.post("/api/bathrooms/bulk", data=_ndjson(rows), content_type="application/x-ndjson")
+
+    # Then
+    assert response.status_code == 500
+    body = json.loads(response.data)
+    assert body["error"] == "connection lost"
+    assert body["inserted"] == 2
+    assert body["unconfirmed"] == 2
+    assert setup_db.bathrooms.count_documents({}) == 2
@@ -0,0 +1,117 @@
+"""Tests for the shared MongoDB connection pool."""
+import pytest
+from flask import Flask
+from schemas import init_app, get_pool
+from schemas.database import PoolStatsListener
+
+
+class FakeClient:
+    """Stand-in for MongoClient that records how it was built."""
+
+    instances = []
+
+    def __init__(self, uri, **options):
+        self.uri = uri
+        self.options = options
+        self.closed = False
+        FakeClient.instances.append(self)
+
+    def __getitem__(self, name):
+        return {"name": name}
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool_app():
+    """Create a bare app wired to a fake client factory."""
+    FakeClient.instances = []
+    pool_app = Flask("pool_test")
+    pool_app.config.update(
+        MONGO_URI="mongodb://example:27017",
+        MONGO_DBNAME="pool_test",
+        MONGO_MAX_POOL_SIZE=7,
+        MONGO_CLIENT_FACTORY=FakeClient
+    )
+    init_app(pool_app)
+    return pool_app
+
+
+def test_client_is_created_once(pool_app):
+    """Test that the pool hands out one lazily created client."""
+    pool = get_pool(pool_app)
+    assert FakeClient.instances == []
+
+    first = pool.client
+    second = pool.client
+
+    assert first is second
+    assert len(FakeClient.instances) == 1
+    assert first.uri == "mongodb://example:27017"
+    assert first.options["maxPoolSize"] == 7
+    assert first.options["connect"] is False
+
+
+def test_client_is_rebuilt_after_fork(pool_app):
+    """Test that a forked child builds its own client instead of reusing the parent's."""
+    pool = get_pool(pool_app)
+    parent_client = pool.client
+
+    pool.reset_after_fork()
+    child_client = pool.client
+
+    assert child_client is not parent_client
+    assert parent_client.closed is False
+
+
+def test_teardown_does_not_close_client(pool_app):
+    """Test that ending an app context returns the client to the pool."""
+    with pool_app.app_context():
+        from schemas import get_db
+        get_db()
+
+    client = get_pool(pool_app).client
+    assert len(FakeClient.instances) == 1
+    assert client.closed is False
+
+
+def test_pool_stats_counters():
+    """Test that pool events are reflected in the stats snapshot."""
+    listener = PoolStatsListener()
+    listener.connection_created(None)
+    listener.connection_created(None)
+    listener.connection_checked_out(None)
+    listener.connection_closed(None)
+
+    stats = listener.snapshot()
+    assert stats["connections_created"] == 2
+    assert stats["open_connections"] == 1
+    assert stats["checked_out"] == 1
+
+
+def test_fork_hook_resets_every_pool(pool_app, app):
+    """Test that the single module-level fork hook resets each application's pool."""
+    import schemas.database
+    pools = [get_pool(pool_app), get_pool(app)]
+    get_pool(pool_app).client
+
+    schemas.database._reset_pools_after_fork()
+
+    assert all(pool in schemas.database._POOLS for pool in pools)
+    assert get_pool(pool_app).stats()["connected"] is False
+
+
+def test_admin_stats_requires_admin(login_user):
+    """Test that ordinary users cannot read runtime internals."""
+    assert login_user.get("/api/admin/stats").status_code == 403
+    assert login_user.get("/api/admin/slow-queries").status_code == 403
+
+
+def test_admin_stats(admin_user):
+    """Test that pool statistics are exposed to admins."""
+    response = admin_user.get("/api/admin/stats")
+
+    assert response.status_code == 200
+    assert "mongo_pool" in response.json
+    assert "open_connections" in response.json["mongo_pool"]
@@ -0,0 +1,111 @@
+"""Tests for the streaming export endpoints."""
+import csv
+import io
+import json
+import logging
+import pytest
+from pymongo.errors import AutoReconnect
+from bulk_io import export_documents
+
+
+def test_export_bathrooms_ndjson(login_user, mock_bathroom):
+    """Test that bathrooms are exported one JSON object per line."""
+    response = login_user.get("/api/export/bathrooms")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.is_streamed
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 1
+    bathroom = json.loads(lines[0])
+    assert bathroom["_id"] == str(mock_bathroom["_id"])
+    assert bathroom["created_at"].endswith("Z")
+
+
+def test_export_reviews_csv(login_user, mock_review):
+    """Test that reviews are exported as CSV with flattened ratings."""
+    response = login_user.get("/api/export/reviews?format=csv")
+
+    assert response.status_code == 200
+    assert "reviews.csv" in response.headers["Content-Disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 1
+    assert rows[0]["_id"] == str(mock_review["_id"])
+    assert rows[0]["cleanliness"] == "4"
+    assert rows[0]["comment"] == "Test review comment"
+
+
+def test_exported_csv_can_be_imported(login_user, mock_bathroom, setup_db):
+    """Test that a bathroom CSV export round trips through the bulk import."""
+    exported = login_user.get("/api/export/bathrooms?format=csv").data
+    setup_db.bathrooms.delete_many({})
+
+    response = login_user.post("/api/bathrooms/bulk", data=exported, content_type="text/csv")
+
+    assert json.loads(response.data)["inserted"] == 1
+    assert setup_db.bathrooms.find_one()["building"] == mock_bathroom["building"]
+
+
+def test_empty_csv_export_has_header(login_user):
+    """Test that an empty CSV export still starts with its header."""
+    response = login_user.get("/api/export/bathrooms?format=csv")
+
+    assert response.get_data(as_text=True).startswith("_id,building,floor")
+
+
+def test_export_rejects_unknown_collections_and_formats(login_user):
+    """Test that only bathrooms and reviews can be exported as NDJSON or CSV."""
+    assert login_user.get("/api/export/users").status_code == 404
+    assert login_user.get("/api/export/bathrooms?format=xml").status_code == 400
+
+
+def test_export_streams_in_chunks(app, setup_db):
+    """Test that large exports are yielded in bounded chunks."""
+    setup_db.bathrooms.insert_many([{"building": f"Hall {i}", "floor": i} for i in range(50)])
+
+    with app.test_request_context():
+        chunks = list(export_documents(setup_db.bathrooms, {}, "ndjson", batch_size=10, chunk_bytes=256))
+
+    assert len(chunks) > 1
+    assert all(len(chunk) < 512 for chunk in chunks)
+    assert sum(chunk.count(b"\n") for chunk in chunks) == 50
+
+
+def test_export_error_mid_stream_is_raised(app, setup_db, caplog):
+    """Test that a database error after the first chunk aborts the stream instead of ending it quietly."""
+    setup_db.bathrooms.insert_many([{"building": f"Hall {i}", "floor": i} for i in range(5)])
+
+    class FailingCursor:
+        def __init__(self, cursor):
+            self.cursor = cursor
+
+        def sort(self, *args):
+            self.cursor = self.cursor.sort(*args)
+            return self
+
+        def batch_size(self, size):
+            return self
+
+        def __iter__(self):
+            for count, document in enumerate(self.cursor):
+                if count == 3:
+                    raise AutoReconnect("connection lost")
+                yield document
+
+        def close(self):
+            self.cursor.close()
+
+    class FailingCollection:
+        name = "bathrooms"
+
+        def find(self, query):
+            return FailingCursor(setup_db.bathrooms.find(query))
+
+    chunks = []
+    with app.test_request_context(), caplog.at_level(logging.ERROR):
+        with pytest.raises(AutoReconnect):
+            for chunk in export_documents(FailingCollection(), {}, "ndjson", chunk_bytes=1):
+                chunks.append(chunk)
+
+    assert len(chunks) == 3
+    assert "Export of bathrooms failed part way through" in caplog.text
@@ -0,0 +1,167 @@
+"""Tests for the cached address geocoder."""
+import json
+import threading
+import pytest
+from cache import MISSING, TTLCache
+from geocoding import GeocodeWorker, GeocoderBusy, GeocodingError, get_geocoder, normalize_address
+
+
+class FakeBackend:
+    """Geocoder backend that records the addresses it was asked for."""
+
+    def __init__(self, results=None, error=None):
+        self.results = results or {}
+        self.error = error
+        self.calls = []
+
+    def __call__(self, address):
+        self.calls.append(address)
+        if self.error:
+            raise self.error
+        return self.results.get(address)
+
+
+@pytest.fixture
+def backend(app, monkeypatch):
+    """Install a fake geocoder backend for the duration of a test."""
+    fake = FakeBackend({
+        "70 Washington Square S": {"lat": 40.7295, "long": -73.9975, "display_name": "Bobst Library"}
+    })
+    monkeypatch.setattr(get_geocoder(app), "_backend", fake)
+    return fake
+
+
+def _convert(client, address):
+    return client.post(
+        "/api/convert-address",
+        data=json.dumps({"address": address}),
+        content_type="application/json"
+    )
+
+
+def test_normalize_address():
+    """Test that spelling variants share a cache key."""
+    assert normalize_address("  70  Washington Square S ,New York. ") == "70 washington square s, new york"
+
+
+def test_ttl_cache_expiry_and_eviction():
+    """Test that entries expire and the least recently used entry is evicted."""
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, timer=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", None)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    now[0] = 11
+    assert cache.get("a") is MISSING
+    assert cache.stats()["evictions"] == 1
+
+
+def test_repeated_lookup_hits_memory_cache(client, backend):
+    """Test that a repeated address never reaches the backend."""
+    first = _convert(client, "70 Washington Square S")
+    second = _convert(client, "70 washington  square s")
+
+    assert first.status_code == 200
+    assert second.json == first.json
+    assert backend.calls == ["70 Washington Square S"]
+    assert get_geocoder().stats()["memory_hits"] == 1
+
+
+def test_persistent_cache_survives_memory_reset(client, db, backend):
+    """Test that the geocode_cache collection answers after the LRU is cleared."""
+    _convert(client, "70 Washington Square S")
+    get_geocoder().memory.clear()
+
+    response = _convert(client, "70 Washington Square S")
+
+    assert response.status_code == 200
+    assert len(backend.calls) == 1
+    assert db.geocode_cache.count_documents({}) == 1
+    assert get_geocoder().stats()["persistent_hits"] == 1
+
+
+def test_negative_results_are_cached(client, backend):
+    """Test that unknown addresses are cached as misses."""
+    assert _convert(client, "Nowhere").status_code == 404
+    assert _convert(client, "nowhere").status_code == 404
+    assert backend.calls == ["Nowhere"]
+
+
+def test_backend_errors_are_not_cached(client, app, monkeypatch):
+    """Test that upstream failures return 500 and are retried next time."""
+    fake = FakeBackend(error=GeocodingError("timed out"))
+    monkeypatch.setattr(get_geocoder(app), "_backend", fake)
+
+    assert _convert(client, "Somewhere").status_code == 500
+    assert _convert(client, "Somewhere").status_code == 500
+    assert len(fake.calls) == 2
+
+
+def test_worker_coalesces_identical_addresses(app):
+    """Test that duplicate in-flight addresses share one upstream call."""
+    release = threading.Event()
+    calls = []
+
+    def slow_backend(address):
+        calls.append(address)
+        release.wait(5)
+        return {"lat": 1.0, "long": 2.0, "display_name": address}
+
+    worker = GeocodeWorker(app, lambda: slow_backend, max_queue=10)
+    first, first_owner = worker.submit("kimmel", "Kimmel")
+    second, second_owner = worker.submit("kimmel", "kimmel")
+    release.set()
+
+    assert second is first
+    assert (first_owner, second_owner) == (True, False)
+    assert first.result(timeout=5)["lat"] == 1.0
+    assert calls == ["Kimmel"]
+    assert worker.stats()["coalesced"] == 1
+    worker.stop(timeout=5)
+
+
+def test_answer_is_cached_after_the_request_times_out(client, app, db, monkeypatch):
+    """Test that the worker caches a slow answer, so the retry needs no second upstream call."""
+    release = threading.Event()
+    calls = []
+
+    def slow_backend(address):
+        calls.append(address)
+        release.wait(5)
+        return {"lat": 1.0, "long": 2.0, "display_name": address}
+
+    geocoder = get_geocoder(app)
+    monkeypatch.setattr(geocoder, "_backend", slow_backend)
+    monkeypatch.setitem(app.config, "GEOCODER_TIMEOUT_SECONDS", 0.05)
+
+    assert _convert(client, "Kimmel").status_code == 504
+    release.set()
+    geocoder.worker.stop(timeout=5)
+
+    assert _convert(client, "Kimmel").status_code == 200
+    assert calls == ["Kimmel"]
+    assert db.geocode_cache.find_one({"_id": "kimmel"})["result"]["lat"] == 1.0
+
+
+def test_worker_rejects_when_queue_is_full(app):
+    """Test that a full queue raises GeocoderBusy instead of blocking."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking_backend(address):
+        started.set()
+        release.wait(5)
+
+    worker = GeocodeWorker(app, lambda: blocking_backend, max_queue=1)
+    worker.submit("a", "a")
+    started.wait(5)
+    worker.submit("b", "b")
+
+    with pytest.raises(GeocoderBusy):
+        worker.submit("c", "c")
+    release.set()
+    worker.stop(timeout=5)
@@ -0,0 +1,67 @@
+"""Tests for ETag and conditional GET handling."""
+import json
+
+
+def test_bathroom_revalidation(client, mock_bathroom, login_user):
+    """Test that an unchanged bathroom answers 304 and an updated one does not."""
+    # Given
+    url = f"/api/bathrooms/{mock_bathroom['_id']}"
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert first.headers.get("Last-Modified")
+    
+    # When - Revalidate without changes
+    cached = client.get(url, headers={"If-None-Match": etag})
+    
+    # Then
+    assert cached.status_code == 304
+    assert cached.data == b""
+    assert cached.headers["ETag"] == etag
+    
+    # When - Revalidate after an update
+    login_user.put(url, data=json.dumps({"floor": 5}), content_type="application/json")
+    changed = client.get(url, headers={"If-None-Match": etag})
+    
+    # Then
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_formats_have_distinct_etags(client, mock_bathroom):
+    """Test that the legacy and v2 representations are validated separately."""
+    url = f"/api/bathrooms/{mock_bathroom['_id']}"
+    legacy_etag = client.get(url).headers["ETag"]
+
+    response = client.get(f"{url}?v=2", headers={"If-None-Match": legacy_etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != legacy_etag
+
+
+def test_review_listing_revalidates_after_new_review(client, mock_bathroom, login_user):
+    """Test that writing a review changes the review listing's ETag."""
+    # Given
+    url = f"/api/bathrooms/{mock_bathroom['_id']}/reviews"
+    etag = client.get(url).headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    
+    # When
+    login_user.post(
+        url,
+        data=json.dumps({"cleanliness": 5, "privacy": 5, "accessibility": 5, "best_for": "Studying"}),
+        content_type="application/json"
+    )
+    response = client.get(url, headers={"If-None-Match": etag})
+    
+    # Then
+    assert response.status_code == 200
+    assert len(json.loads(response.json["reviews"])) == 1
+
+
+def test_review_revalidation(client, mock_review):
+    """Test conditional GET on a single review."""
+    url = f"/api/reviews/{mock_review['_id']}"
+    etag = client.get(url).headers["ETag"]
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": '"stale"'}).status_code == 200
@@ -0,0 +1,54 @@
+"""Tests for the user profile cache."""
+import json
+from bson import ObjectId
+
+
+def test_profile_is_cached_across_requests(login_user, app):
+    """Test that repeat requests for the current user skip the database."""
+    for _ in range(3):
+        response = login_user.get("/api/users/me?v=2")
+        assert response.status_code == 200
+
+    user = json.loads(response.data)["user"]
+    assert user["name"] == "Test User"
+    assert "password_hash" not in user
+    assert app.extensions['user_cache'].stats()["queries"] == 1
+
+
+def test_profile_update_invalidates_cache(login_user, setup_db):
+    """Test that a name change is visible immediately."""
+    login_user.get("/api/users/me")
+
+    response = login_user.put("/api/users/me?v=2", data=json.dumps({"name": "New Name"}),
+                              content_type="application/json")
+
+    assert response.status_code == 200
+    assert json.loads(response.data)["user"]["name"] == "New Name"
+    assert json.loads(login_user.get("/api/users/me?v=2").data)["user"]["name"] == "New Name"
+    assert setup_db.users.find_one({"email": "test@example.com"})["name"] == "New Name"
+
+
+def test_profile_update_requires_name(login_user):
+    """Test that an empty name is rejected."""
+    response = login_user.put("/api/users/me", data=json.dumps({"name": "  "}), content_type="application/json")
+
+    assert response.status_code == 400
+
+
+def test_get_many_batches_lookups(app, setup_db, mock_user):
+    """Test that several users are fetched with one query and unknown ids map to None."""
+    cache = app.extensions['user_cache']
+    other = {"_id": ObjectId(), "email": "other@example.com", "name": "Other", "password_hash": "x"}
+    setup_db.users.insert_one(other)
+    unknown = str(ObjectId())
+
+    with app.test_request_context():
+        profiles = cache.get_many([str(mock_user["_id"]), str(other["_id"]), unknown, "not-an-id"])
+        again = cache.get_many([str(mock_user["_id"]), unknown])
+
+    assert profiles[str(other["_id"])]["name"] == "Other"
+    assert "password_hash" not in profiles[str(other["_id"])]
+    assert profiles[unknown] is None
+    assert profiles["not-an-id"] is None
+    assert again[unknown] is None
+    assert cache.stats()["queries"] == 1
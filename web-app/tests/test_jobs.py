@@ -0,0 +1,179 @@
+"""Tests for the background job runner."""
+from datetime import datetime, timedelta
+import gc
+import time
+import weakref
+import pytest
+from pymongo.errors import AutoReconnect
+from jobs import FAILED, JOBS_COLLECTION, QUEUED, RUNNING, SUCCEEDED, JobRunner, UnknownJobType, get_job_runner
+
+
+def test_delete_bathroom_cascades_in_a_job(client, admin_user, db, mock_bathroom, mock_review):
+    """Test that deleting a bathroom returns before its reviews are removed by the queued job."""
+    response = admin_user.delete(f"/api/bathrooms/{mock_bathroom['_id']}")
+
+    assert response.status_code == 200
+    job_id = response.json["cascade_job_id"]
+    assert db.reviews.count_documents({"bathroom_id": str(mock_bathroom["_id"])}) == 1
+
+    assert get_job_runner().run_pending() == 1
+
+    assert db.reviews.count_documents({"bathroom_id": str(mock_bathroom["_id"])}) == 0
+    job = admin_user.get(f"/api/jobs/{job_id}?v=2").json["job"]
+    assert job["status"] == SUCCEEDED
+    assert job["result"] == {"deleted": 1}
+    assert job["attempts"] == 1
+
+
+def test_delete_bathroom_cascades_inline_when_enqueue_fails(client, admin_user, db, mock_bathroom, mock_review,
+                                                          monkeypatch):
+    """Test that a delete whose cascade cannot be queued still succeeds and removes the reviews."""
+    def unavailable(*args, **kwargs):
+        raise AutoReconnect("jobs collection unavailable")
+
+    monkeypatch.setattr(get_job_runner(), "enqueue", unavailable)
+
+    response = admin_user.delete(f"/api/bathrooms/{mock_bathroom['_id']}")
+
+    assert response.status_code == 200
+    assert response.json["cascade_job_id"] is None
+    assert db.bathrooms.count_documents({"_id": mock_bathroom["_id"]}) == 0
+    assert db.reviews.count_documents({"bathroom_id": str(mock_bathroom["_id"])}) == 0
+
+
+def test_runners_are_not_kept_alive_by_the_exit_hook(app):
+    """Test that a runner whose app is gone can be collected."""
+    runner = JobRunner(app)
+    ref = weakref.ref(runner)
+
+    del runner
+    gc.collect()
+
+    assert ref() is None
+
+
+def test_cascade_deletes_in_batches(app, db, mock_bathroom):
+    """Test that the cascade keeps going until every review is removed."""
+    bathroom_id = str(mock_bathroom["_id"])
+    db.reviews.insert_many([{"bathroom_id": bathroom_id, "cleanliness": 3} for _ in range(5)])
+    app.config['JOBS_CASCADE_BATCH_SIZE'] = 2
+    try:
+        get_job_runner().enqueue("cascade_delete_reviews", {"bathroom_id": bathroom_id})
+        get_job_runner().run_pending()
+    finally:
+        app.config['JOBS_CASCADE_BATCH_SIZE'] = 1000
+
+    assert db.reviews.count_documents({}) == 0
+    assert db[JOBS_COLLECTION].find_one()["result"] == {"deleted": 5}
+
+
+def test_failed_job_is_retried_with_backoff_then_marked_failed(app, db):
+    """Test that failures are rescheduled with growing delays until attempts run out."""
+    runner = get_job_runner()
+    calls = []
+
+    def flaky(db, payload, app):
+        calls.append(payload)
+        raise RuntimeError("boom")
+
+    runner.register("flaky", flaky)
+    try:
+        job_id = runner.enqueue("flaky", {"n": 1}, max_attempts=2)
+        assert runner.run_pending() == 1
+        job = runner.get(job_id)
+        assert job["status"] == QUEUED
+        assert job["error"] == "RuntimeError: boom"
+        assert job["run_after"] > datetime.utcnow()
+        # Not due yet, so nothing runs
+        assert runner.run_pending() == 0
+
+        db[JOBS_COLLECTION].update_one({"_id": job["_id"]}, {"$set": {"run_after": datetime.utcnow()}})
+        assert runner.run_pending() == 1
+    finally:
+        del runner.handlers["flaky"]
+
+    job = runner.get(job_id)
+    assert job["status"] == FAILED
+    assert job["attempts"] == 2
+    assert len(calls) == 2
+    assert runner.stats()["retried"] == 1
+    assert runner.stats()["failed"] == 1
+
+
+def test_job_with_expired_lease_is_claimed_again(app, db):
+    """Test that a job left running by a dead worker is picked up once its lease runs out."""
+    db[JOBS_COLLECTION].insert_one({
+        "type": "rebuild_ratings", "payload": {}, "status": RUNNING, "attempts": 1, "max_attempts": 5,
+        "run_after": datetime.utcnow() - timedelta(minutes=10), "owner": "dead:1",
+        "lease_expires_at": datetime.utcnow() - timedelta(seconds=1)
+    })
+
+    assert get_job_runner().run_pending() == 1
+
+    job = db[JOBS_COLLECTION].find_one()
+    assert job["status"] == SUCCEEDED
+    assert job["attempts"] == 2
+    assert "lease_expires_at" not in job
+
+
+def test_rebuild_job_refreshes_cached_bathrooms(client, db, mock_bathroom, mock_review):
+    """Test that rebuilt ratings reach clients holding cached responses or ETags."""
+    url = f"/api/bathrooms/{mock_bathroom['_id']}?v=2"
+    before = client.get(url)
+    db.bathrooms.update_one({"_id": mock_bathroom["_id"]}, {"$unset": {"rating_stats": ""}})
+
+    get_job_runner().enqueue("rebuild_ratings", {"bathroom_ids": [str(mock_bathroom["_id"])]})
+    get_job_runner().run_pending()
+
+    after = client.get(url, headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.json["bathroom"]["rating_stats"]["review_count"] == 1
+    assert db.bathrooms.find_one({"_id": mock_bathroom["_id"]})["version"] == mock_bathroom.get("version", 0) + 1
+
+
+def test_unknown_job_type_is_rejected(app):
+    """Test that only registered job types can be enqueued."""
+    with pytest.raises(UnknownJobType):
+        get_job_runner().enqueue("nope")
+
+
+def test_job_api(admin_user, db, mock_bathroom):
+    """Test starting a rebuild through the API and listing it."""
+    response = admin_user.post("/api/jobs", json={"type": "rebuild_ratings", "bathroom_ids": [str(mock_bathroom["_id"])]})
+    assert response.status_code == 202
+    job_id = response.json["job_id"]
+
+    assert admin_user.post("/api/jobs", json={"type": "cascade_delete_reviews"}).status_code == 400
+    assert admin_user.get("/api/jobs/not-an-id").status_code == 404
+
+    jobs = admin_user.get("/api/jobs?v=2&status=queued").json["jobs"]
+    assert [job["_id"] for job in jobs] == [job_id]
+    assert jobs[0]["payload"] == {"bathroom_ids": [str(mock_bathroom["_id"])]}
+    assert admin_user.get("/api/jobs?v=2&status=succeeded").json["jobs"] == []
+
+
+def test_job_api_requires_admin(client, login_user):
+    """Test that job status endpoints need an admin login."""
+    assert client.get("/api/jobs").status_code in (302, 401)
+    assert client.post("/api/jobs", json={"type": "migrate"}).status_code in (302, 401)
+    assert login_user.get("/api/jobs").status_code == 403
+    assert login_user.post("/api/jobs", json={"type": "rebuild_ratings"}).status_code == 403
+
+
+def test_workers_run_jobs_and_drain_on_shutdown(app, db, mock_bathroom, mock_review):
+    """Test that worker threads pick up an enqueued job and stop cleanly."""
+    runner = get_job_runner()
+    app.config['JOBS_WORKERS'] = 1
+    try:
+        with app.app_context():
+            runner.enqueue("cascade_delete_reviews", {"bathroom_id": str(mock_bathroom["_id"])})
+        assert runner.stats()["running"]
+        deadline = time.monotonic() + 5
+        while db[JOBS_COLLECTION].find_one({"status": SUCCEEDED}) is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        app.config['JOBS_WORKERS'] = 0
+        assert runner.shutdown(timeout=5)
+
+    assert db.reviews.count_documents({}) == 0
+    assert not runner.stats()["running"]
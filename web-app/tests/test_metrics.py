@@ -0,0 +1,133 @@
+"""Tests for request metrics and the Prometheus endpoint."""
+import threading
+from types import SimpleNamespace
+import bulk_io
+from metrics import Histogram, MetricsRegistry, get_metrics
+
+
+def _sample(text, line_start):
+    """Return the value of the first exposition line starting with line_start."""
+    for line in text.splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    """Test that quantiles are estimated from the bucket holding the rank."""
+    histogram = Histogram("latency", "Latency.", ("endpoint",), buckets=(0.1, 0.2, 0.4))
+    for value in (0.05, 0.15, 0.15, 0.3):
+        histogram.observe(("home",), value)
+
+    entry = histogram.collect()[("home",)]
+
+    assert entry[:4] == [1, 2, 1, 0]
+    assert entry[-1] == 4
+    assert abs(histogram.quantile(entry, 0.5) - 0.15) < 1e-9
+    assert histogram.quantile(entry, 1.0) == 0.4
+    assert histogram.quantile([0] * 6, 0.5) is None
+
+
+def test_values_from_finished_threads_are_kept():
+    """Test that per-thread shards are merged, including those of exited threads."""
+    registry = MetricsRegistry()
+    workers = [threading.Thread(target=registry.requests.inc, args=(("home", "GET", "200"),)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    registry.requests.inc(("home", "GET", "200"))
+
+    assert registry.requests.collect() == {("home", "GET", "200"): 5}
+    assert registry.requests.collect() == {("home", "GET", "200"): 5}
+
+
+def test_mongo_commands_are_counted_per_request(app):
+    """Test that command events are attributed to the request that issued them."""
+    registry = MetricsRegistry()
+    event = SimpleNamespace(command_name="find", duration_micros=2000)
+
+    with app.test_request_context("/api/bathrooms"):
+        app.preprocess_request()
+        registry.before_request()
+        registry.succeeded(event)
+        registry.succeeded(event)
+        registry.after_request(app.response_class("[]"))
+
+    assert registry.mongo_commands.collect() == {("get_bathrooms", "find"): 2}
+    round_trips = registry.mongo_round_trips.collect()[("get_bathrooms",)]
+    assert round_trips[2] == 1
+    assert abs(registry.mongo_seconds.collect()[("get_bathrooms",)] - 0.004) < 1e-9
+    assert registry.in_flight.collect() == {("get_bathrooms",): 0}
+
+
+def test_metrics_endpoint_reports_requests(client, mock_bathroom):
+    """Test that served requests show up in the Prometheus exposition."""
+    client.get("/api/bathrooms")
+    client.get("/api/bathrooms")
+    client.get("/api/missing")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    text = response.get_data(as_text=True)
+    assert "# TYPE bathroom_map_http_request_duration_seconds histogram" in text
+    assert _sample(text, 'bathroom_map_http_requests_total{endpoint="get_bathrooms",method="GET",status="200"}') == 2
+    assert _sample(text, 'bathroom_map_http_request_duration_seconds_count{endpoint="get_bathrooms"}') == 2
+    assert _sample(text, 'bathroom_map_http_request_duration_seconds_bucket{endpoint="get_bathrooms",le="+Inf"}') == 2
+    assert 'bathroom_map_http_request_duration_seconds_quantile{endpoint="get_bathrooms",quantile="0.99"}' in text
+    assert _sample(text, 'bathroom_map_http_response_bytes_total{endpoint="get_bathrooms"}') > 0
+    assert _sample(text, 'bathroom_map_http_requests_in_flight{endpoint="get_bathrooms"}') == 0
+
+
+def test_unhandled_errors_are_counted_as_500(app, client, monkeypatch):
+    """Test that a view raising still finishes its request in the metrics."""
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    monkeypatch.setitem(app.view_functions, "home", lambda: 1 / 0)
+    try:
+        assert client.get("/").status_code == 500
+    finally:
+        app.config['PROPAGATE_EXCEPTIONS'] = None
+
+    text = client.get("/metrics").get_data(as_text=True)
+
+    assert _sample(text, 'bathroom_map_http_requests_total{endpoint="home",method="GET",status="500"}') == 1
+    assert _sample(text, 'bathroom_map_http_requests_in_flight{endpoint="home"}') == 0
+
+
+def test_streamed_response_is_measured_until_closed(app, login_user, mock_bathroom, monkeypatch):
+    """Test that a streamed body's bytes and the MongoDB commands it issues count toward its request."""
+    # Given - Each exported document reports a command, as the cursor's getMore would
+    encode = bulk_io.iter_ndjson_lines
+
+    def encode_with_command(documents):
+        for line in encode(documents):
+            get_metrics(app).succeeded(SimpleNamespace(command_name="getMore", duration_micros=1000))
+            yield line
+
+    monkeypatch.setattr(bulk_io, "iter_ndjson_lines", encode_with_command)
+    endpoint = '{endpoint="export_collection"}'
+
+    # When
+    response = login_user.get("/api/export/bathrooms")
+    body = response.get_data()
+    assert get_metrics(app).in_flight.collect()[("export_collection",)] == 1
+    response.close()
+
+    # Then
+    text = login_user.get("/metrics").get_data(as_text=True)
+    assert _sample(text, 'bathroom_map_http_requests_total{endpoint="export_collection",method="GET",status="200"}') == 1
+    assert _sample(text, f"bathroom_map_http_requests_in_flight{endpoint}") == 0
+    assert _sample(text, f"bathroom_map_http_response_bytes_total{endpoint}") == len(body) > 0
+    assert _sample(text, 'bathroom_map_mongo_commands_total{endpoint="export_collection",command="getMore"}') == 1
+    assert _sample(text, 'bathroom_map_mongo_round_trips_per_request_bucket{endpoint="export_collection",le="1"}') == 1
+
+
+def test_template_render_time_is_recorded(client):
+    """Test that rendered templates are timed by name."""
+    client.get("/")
+
+    text = client.get("/metrics").get_data(as_text=True)
+
+    assert _sample(text, 'bathroom_map_template_render_seconds_count{template="index.html"}') == 1
@@ -0,0 +1,89 @@
+"""Tests for versioned index migrations."""
+import mongomock
+from click.testing import CliRunner
+from schemas import migrations
+from schemas.migrations import MIGRATIONS, declared_indexes, migrate, pending_migrations, status
+
+
+def _fresh_db():
+    return mongomock.MongoClient()["migrations_test"]
+
+
+def test_migrate_builds_declared_indexes():
+    """Test that a fresh database ends up with exactly the declared indexes."""
+    db = _fresh_db()
+
+    applied = migrate(db)
+
+    assert applied == [migration.version for migration in MIGRATIONS]
+    for collection, indexes in declared_indexes().items():
+        names = set(db[collection].index_information()) - {"_id_"}
+        assert names == set(indexes)
+    assert db.users.index_information()["email_1"]["unique"] is True
+
+
+def test_migrate_is_a_no_op_once_applied():
+    """Test that a second run applies nothing and keeps the records."""
+    db = _fresh_db()
+    migrate(db)
+
+    assert migrate(db) == []
+    assert pending_migrations(db) == []
+    assert all(entry["applied_at"] for entry in status(db))
+
+
+def test_migrate_picks_up_where_it_left_off():
+    """Test that only migrations newer than the recorded ones are applied."""
+    db = _fresh_db()
+    migrations.apply_migration(db, MIGRATIONS[0])
+
+    assert migrate(db) == [migration.version for migration in MIGRATIONS[1:]]
+    assert "bathroom_id_1" not in db.reviews.index_information()
+
+
+def test_hot_queries_have_indexes():
+    """Test that the filters used by the routes lead an index."""
+    spec = declared_indexes()
+    leading = {
+        collection: {next(iter(index.document["key"])) for index in indexes.values()}
+        for collection, indexes in spec.items()
+    }
+
+    assert {"bathroom_id", "user_id"} <= leading["reviews"]
+    assert {"location", "building"} <= leading["bathrooms"]
+    assert "email" in leading["users"]
+
+
+def test_cli_status(monkeypatch):
+    """Test that the CLI lists pending migrations."""
+    db = _fresh_db()
+    monkeypatch.setattr(migrations, "_connect", lambda uri, dbname: db)
+
+    result = CliRunner().invoke(migrations.cli, ["status"])
+
+    assert result.exit_code == 0
+    assert result.output.count("pending") == len(MIGRATIONS)
+    assert CliRunner().invoke(migrations.cli, ["migrate"]).exit_code == 0
+    assert "pending" not in CliRunner().invoke(migrations.cli, ["status"]).output
+
+
+def test_migrate_backfills_rating_stats():
+    """Test that bathrooms stored without aggregates get them from their existing reviews."""
+    db = _fresh_db()
+    for migration in MIGRATIONS[:3]:
+        migrations.apply_migration(db, migration)
+    legacy_id = db.bathrooms.insert_one({"building": "Old Hall", "floor": 1}).inserted_id
+    db.reviews.insert_many([
+        {"bathroom_id": str(legacy_id), "ratings": {"cleanliness": 4, "privacy": 2, "accessibility": 3}},
+        {"bathroom_id": str(legacy_id), "ratings": {"cleanliness": 2, "privacy": 4, "accessibility": 3}},
+    ])
+    current = {"review_count": 7, "sums": {}, "averages": {}, "best_for": {}}
+    current_id = db.bathrooms.insert_one({"building": "New Hall", "floor": 1, "rating_stats": current}).inserted_id
+
+    assert migrate(db) == [4]
+
+    stats = db.bathrooms.find_one({"_id": legacy_id})["rating_stats"]
+    assert stats["review_count"] == 2
+    assert stats["averages"]["cleanliness"] == 3
+    # Bathrooms that already had aggregates are left alone
+    assert db.bathrooms.find_one({"_id": current_id})["rating_stats"] == current
@@ -0,0 +1,70 @@
+"""Tests for the keyset pagination helpers."""
+import base64
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from pymongo import DESCENDING
+from pagination import InvalidCursor, cursor_page, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    """Test that cursors preserve BSON types."""
+    oid = ObjectId()
+    when = datetime(2025, 1, 1, 12, 0)
+
+    values = decode_cursor(encode_cursor([when, oid]), 2)
+
+    assert values[1] == oid
+    assert values[0].replace(tzinfo=None) == when
+
+
+def test_decode_cursor_rejects_garbage():
+    """Test that tampered cursors raise InvalidCursor."""
+    with pytest.raises(InvalidCursor):
+        decode_cursor("%%%", 1)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor([1, 2]), 1)
+
+
+@pytest.mark.parametrize("raw", [
+    b'[{"$oid": "zz"}]',
+    b'[{"$numberLong": "x"}]',
+    b'[{"$binary": 1}]',
+    b'[{"$regex": "a"}]',
+    b'[{"$gt": ""}]',
+    b'[[1, 2]]',
+])
+def test_decode_cursor_rejects_bad_values(raw):
+    """Test that invalid extended JSON and operator-like values are rejected."""
+    token = base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, 1)
+
+
+def test_list_with_tampered_cursor_is_a_400(client):
+    """Test that an unparseable ObjectId in a cursor is a client error."""
+    response = client.get("/api/bathrooms?cursor=W3siJG9pZCI6ICJ6eiJ9XQ")
+
+    assert response.status_code == 400
+
+
+def test_cursor_page_with_compound_sort(db):
+    """Test seeking on a sort key plus _id when the sort key has ties."""
+    base = datetime(2025, 1, 1)
+    db.reviews.insert_many([
+        {"bathroom_id": "b", "created_at": base + timedelta(minutes=i // 2), "n": i}
+        for i in range(5)
+    ])
+    sort = (("created_at", DESCENDING), ("_id", DESCENDING))
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = cursor_page(db.reviews, {"bathroom_id": "b"}, 2, cursor, sort)
+        seen.extend(doc["n"] for doc in page)
+        if cursor is None:
+            break
+
+    assert sorted(seen) == [0, 1, 2, 3, 4]
+    assert seen[0] == 4
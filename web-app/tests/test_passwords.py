@@ -0,0 +1,95 @@
+"""Tests for the pooled password hasher."""
+import json
+import threading
+import pytest
+from flask import Flask
+import passwords
+from passwords import PasswordHasher, PasswordHasherBusy, normalize_method
+
+
+def _hasher(**config):
+    app = Flask(__name__)
+    app.config.update(passwords.PASSWORD_DEFAULTS)
+    app.config.update(config)
+    return PasswordHasher(app)
+
+
+def test_hash_round_trip_uses_configured_method():
+    """Test that hashes use the configured cost and verify afterwards."""
+    hasher = _hasher(PASSWORD_HASH_METHOD="pbkdf2:sha256:1000")
+
+    password_hash = hasher.hash("secret")
+
+    assert password_hash.startswith("pbkdf2:sha256:1000$")
+    assert hasher.verify(password_hash, "secret")
+    assert not hasher.verify(password_hash, "wrong")
+    assert not hasher.needs_rehash(password_hash)
+    stats = hasher.stats()
+    assert stats["hashes"] == 1
+    assert stats["verifications"] == 2
+    assert stats["latency_ms"]["samples"] == 3
+    assert stats["pending"] == 0
+
+
+def test_needs_rehash_when_parameters_change():
+    """Test that older methods and salt lengths are flagged for rehashing."""
+    old_hash = _hasher(PASSWORD_HASH_METHOD="pbkdf2:sha256:1000").hash("secret")
+
+    assert _hasher(PASSWORD_HASH_METHOD="pbkdf2:sha256:2000").needs_rehash(old_hash)
+    assert _hasher(PASSWORD_HASH_METHOD="pbkdf2:sha256:1000", PASSWORD_SALT_LENGTH=24).needs_rehash(old_hash)
+    assert normalize_method("pbkdf2:sha256") == f"pbkdf2:sha256:{passwords.DEFAULT_PBKDF2_ITERATIONS}"
+
+
+def test_full_queue_is_rejected(monkeypatch):
+    """Test that work beyond the pool and queue size is refused."""
+    # Given - One worker, no queue, and a hash that blocks until released
+    release = threading.Event()
+    monkeypatch.setattr(passwords, "generate_password_hash", lambda *args: release.wait(5) and "hash")
+    hasher = _hasher(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_SIZE=0)
+    first = threading.Thread(target=hasher.hash, args=("one",))
+    first.start()
+    while hasher.stats()["pending"] == 0:
+        pass
+
+    # When / Then
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash("two")
+    release.set()
+    first.join()
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["pending"] == 0
+
+
+def test_login_rehashes_outdated_hash(client, mock_user, setup_db, app):
+    """Test that logging in upgrades a hash made with other parameters."""
+    # Given - The fixture user's hash uses werkzeug's default cost
+    old_hash = mock_user["password_hash"]
+
+    # When
+    response = client.post(
+        "/api/auth/login",
+        data=json.dumps({"email": "test@example.com", "password": "password"}),
+        content_type="application/json"
+    )
+
+    # Then
+    assert response.status_code == 200
+    new_hash = setup_db.users.find_one({"_id": mock_user["_id"]})["password_hash"]
+    assert new_hash != old_hash
+    assert new_hash.startswith(app.config['PASSWORD_HASH_METHOD'] + "$")
+    assert app.extensions['password_hasher'].stats()["rehashes"] == 1
+
+
+def test_login_answers_503_when_busy(client, mock_user, monkeypatch):
+    """Test that a saturated hashing pool surfaces as 503."""
+    def busy(*args):
+        raise PasswordHasherBusy("Password hashing queue is full")
+    monkeypatch.setattr(PasswordHasher, "verify", busy)
+
+    response = client.post(
+        "/api/auth/login",
+        data=json.dumps({"email": "test@example.com", "password": "password"}),
+        content_type="application/json"
+    )
+
+    assert response.status_code == 503
@@ -0,0 +1,107 @@
+"""Tests for per-request MongoDB command budgets."""
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+from query_budget import QueryBudgetExceeded, get_query_counter, repeated_commands
+
+REVIEW = {"cleanliness": 4, "privacy": 3, "accessibility": 5, "best_for": "pee", "comment": "Fine"}
+
+
+def test_command_events_are_counted(app):
+    """Test that command monitoring events are captured, minus driver housekeeping."""
+    counter = get_query_counter(app)
+
+    with counter.capture() as captured:
+        counter.started(SimpleNamespace(command_name="find", command={"find": "bathrooms", "filter": {}}))
+        counter.started(SimpleNamespace(command_name="endSessions", command={"endSessions": []}))
+
+    assert captured == [{"command": "find", "collection": "bathrooms"}]
+
+
+def test_repeated_commands_are_reported():
+    """Test that a command repeated on one collection is flagged with its count."""
+    commands = [{"command": "find", "collection": "users"}] * 3 + [{"command": "find", "collection": "reviews"}]
+
+    assert repeated_commands(commands, 3) == [{"command": "find", "collection": "users", "count": 3}]
+    assert repeated_commands(commands, 4) == []
+
+
+def test_assert_max_queries_fails_over_the_limit(client, mock_bathroom, assert_max_queries):
+    """Test that the context manager raises and names the commands issued."""
+    with pytest.raises(QueryBudgetExceeded, match="find bathrooms"):
+        with assert_max_queries(0):
+            client.get("/api/bathrooms")
+
+
+def test_read_routes_stay_within_budget(client, mock_bathroom, mock_review, assert_max_queries):
+    """Test the round trips made by the hot read routes."""
+    bathroom_id = str(mock_bathroom["_id"])
+
+    with assert_max_queries(2):
+        assert client.get("/api/bathrooms").status_code == 200
+    # Reviewer names cost one users query per page, not one per review
+    with assert_max_queries(4):
+        assert client.get(f"/api/bathrooms/{bathroom_id}/reviews").status_code == 200
+    with assert_max_queries(3):
+        assert client.get(f"/bathroom/{bathroom_id}").get_data()
+
+
+def test_reviewer_names_are_fetched_once_per_page(client, db, mock_bathroom, mock_review, assert_max_queries):
+    """Test that a page of reviews by many users resolves every name with one query."""
+    users = [{"_id": ObjectId(), "email": f"user{i}@example.com", "name": f"User {i}"} for i in range(5)]
+    db.users.insert_many(users)
+    db.reviews.insert_many([dict(mock_review, _id=ObjectId(), user_id=str(user["_id"])) for user in users])
+
+    with assert_max_queries(4) as captured:
+        response = client.get(f"/api/bathrooms/{mock_bathroom['_id']}/reviews?v=2")
+
+    assert {review["reviewer_name"] for review in response.json["reviews"]} >= {user["name"] for user in users}
+    assert repeated_commands(captured, 2) == []
+
+
+def test_create_review_stays_within_budget(login_user, mock_bathroom, assert_max_queries):
+    """Test the round trips made when a review is posted."""
+    with assert_max_queries(3) as captured:
+        response = login_user.post(f"/api/bathrooms/{mock_bathroom['_id']}/reviews", json=REVIEW)
+
+    assert response.status_code == 201
+    assert response.json["review"]
+    assert {"command": "find", "collection": "reviews"} not in captured
+    # The review exists before the bathroom's version, and so its ETag, changes
+    assert captured.index({"command": "insert", "collection": "reviews"}) < \
+        captured.index({"command": "findAndModify", "collection": "bathrooms"})
+
+
+def test_mutations_are_single_writes(login_user, mock_bathroom, mock_review, assert_max_queries):
+    """Test that each mutation is one write, plus the bathroom aggregate update for reviews."""
+    review_url = f"/api/reviews/{mock_review['_id']}"
+    bathroom_url = f"/api/bathrooms/{mock_bathroom['_id']}"
+
+    with assert_max_queries(1):
+        assert login_user.put(bathroom_url, json={"floor": 4}).status_code == 200
+    with assert_max_queries(3) as captured:
+        assert login_user.put(review_url, json={"cleanliness": 1}).status_code == 200
+    assert [entry["collection"] for entry in captured].count("reviews") == 1
+    with assert_max_queries(3) as captured:
+        assert login_user.delete(review_url).status_code == 200
+    assert [entry["collection"] for entry in captured].count("reviews") == 1
+    with assert_max_queries(2):
+        assert login_user.delete(bathroom_url).status_code == 200
+
+
+def test_requests_over_budget_are_logged(app, client, mock_bathroom, assert_max_queries, caplog):
+    """Test that production mode logs and records requests over their route's budget."""
+    app.config['QUERY_BUDGETS'] = dict(app.config['QUERY_BUDGETS'], get_bathrooms=1)
+    try:
+        with assert_max_queries(10):
+            client.get("/api/bathrooms")
+    finally:
+        del app.config['QUERY_BUDGETS']['get_bathrooms']
+
+    violations = get_query_counter(app).violations()
+    assert len(violations) == 1
+    assert violations[0]["endpoint"] == "get_bathrooms"
+    assert violations[0]["budget"] == 1
+    assert violations[0]["over_budget"] is True
+    assert "get_bathrooms issued 2 MongoDB commands" in caplog.text
+    assert get_query_counter(app).stats()["over_budget"] == 1
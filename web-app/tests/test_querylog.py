@@ -0,0 +1,113 @@
+"""Tests for the slow query log."""
+from types import SimpleNamespace
+from querylog import QueryLog, query_shape, summarize_plan
+
+COLLSCAN_EXPLAIN = {
+    "queryPlanner": {"winningPlan": {"stage": "LIMIT", "inputStage": {"stage": "COLLSCAN"}}},
+    "executionStats": {"nReturned": 2, "totalDocsExamined": 5000, "totalKeysExamined": 0},
+}
+
+
+class FakeClient:
+    """Client whose databases answer every command with a canned explain."""
+
+    def __init__(self, result):
+        self.result = result
+        self.commands = []
+
+    def __getitem__(self, name):
+        return SimpleNamespace(command=self._command)
+
+    def _command(self, command):
+        self.commands.append(command)
+        return self.result
+
+
+def _run_command(query_log, request_id, duration_ms, command):
+    name = next(iter(command))
+    query_log.started(SimpleNamespace(
+        command_name=name, request_id=request_id, connection_id=("db", 27017),
+        database_name="test_bathroom_map", command=dict(command, lsid={"id": 1}, **{"$db": "test_bathroom_map"})
+    ))
+    query_log.succeeded(SimpleNamespace(
+        command_name=name, request_id=request_id, connection_id=("db", 27017), duration_micros=duration_ms * 1000
+    ))
+
+
+def test_query_shape_masks_values():
+    """Test that literal values are hidden but structure and directions stay."""
+    shape = query_shape({"building": {"$regex": "kimmel", "$options": "i"}, "sort": {"_id": -1}})
+
+    assert shape == {"building": {"$regex": "?", "$options": "?"}, "sort": {"_id": -1}}
+
+
+def test_summarize_plan_flags_collection_scans():
+    """Test that scans and high examined ratios are called out."""
+    plan = summarize_plan(COLLSCAN_EXPLAIN, scan_ratio=100)
+
+    assert plan["stages"] == ["LIMIT", "COLLSCAN"]
+    assert plan["flags"] == ["COLLSCAN", "HIGH_EXAMINED_RATIO"]
+    assert plan["docs_examined"] == 5000
+
+
+def test_summarize_plan_finds_aggregate_cursor_stage():
+    """Test that plans nested under an aggregate's $cursor stage are found."""
+    explain = {"stages": [{"$cursor": {
+        "queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}},
+        "executionStats": {"nReturned": 10, "totalDocsExamined": 10},
+    }}]}
+
+    plan = summarize_plan(explain, scan_ratio=100)
+
+    assert plan["stages"] == ["FETCH", "IXSCAN"]
+    assert plan["flags"] == []
+
+
+def test_slow_commands_are_logged_and_explained(app):
+    """Test that only commands over the threshold are kept and explained without driver fields."""
+    # Given
+    client = FakeClient(COLLSCAN_EXPLAIN)
+    query_log = QueryLog(app, lambda: client)
+
+    # When
+    with app.test_request_context("/api/bathrooms"):
+        _run_command(query_log, 1, 5, {"find": "bathrooms", "filter": {"gender": "all"}})
+        _run_command(query_log, 2, 250, {"find": "bathrooms", "filter": {"building": {"$regex": "x"}}})
+    query_log.stop(timeout=5)
+
+    # Then
+    entries = query_log.entries()
+    assert len(entries) == 1
+    assert entries[0]["collection"] == "bathrooms"
+    assert entries[0]["shape"] == {"filter": {"building": {"$regex": "?"}}}
+    assert entries[0]["plan"]["flags"] == ["COLLSCAN", "HIGH_EXAMINED_RATIO"]
+    assert client.commands[0]["explain"] == {"find": "bathrooms", "filter": {"building": {"$regex": "x"}}}
+    routes = query_log.routes()
+    assert list(routes) == ["get_bathrooms"]
+    assert routes["get_bathrooms"]["commands"] == 2
+    assert routes["get_bathrooms"]["slow"] == 1
+
+
+def test_ring_buffer_is_bounded(app):
+    """Test that only the newest SLOW_QUERY_LOG_SIZE entries are kept."""
+    app.config['SLOW_QUERY_LOG_SIZE'] = 3
+    try:
+        query_log = QueryLog(app, lambda: FakeClient({}))
+    finally:
+        app.config['SLOW_QUERY_LOG_SIZE'] = 200
+
+    for request_id in range(5):
+        _run_command(query_log, request_id, 500, {"insert": "bathrooms", "documents": []})
+
+    assert len(query_log.entries()) == 3
+    assert query_log.stats()["slow"] == 5
+    assert query_log.stats()["explained"] == 0
+
+
+def test_slow_query_endpoint(admin_user):
+    """Test that the admin endpoint reports the threshold and the log."""
+    response = admin_user.get("/api/admin/slow-queries")
+
+    assert response.status_code == 200
+    assert response.json["threshold_ms"] == 100
+    assert response.json["slow_queries"] == []
@@ -0,0 +1,152 @@
+"""Tests for the write-invalidated response cache."""
+import json
+import time
+from bson import ObjectId
+from cache import MISSING, MemoryBackend, RedisBackend
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the redis-py calls the backend makes."""
+
+    def __init__(self):
+        self.values = {}
+        self.sets = {}
+
+    def get(self, key):
+        value = self.values.get(key)
+        if value is None or value[1] < time.monotonic():
+            return None
+        return value[0].encode("utf-8")
+
+    def setex(self, key, ttl, value):
+        self.values[key] = (value, time.monotonic() + ttl)
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member.encode("utf-8"))
+
+    def expire(self, key, ttl):
+        pass
+
+    def smembers(self, key):
+        return set(self.sets.get(key, ()))
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            removed += int(self.values.pop(key, None) is not None or self.sets.pop(key, None) is not None)
+        return removed
+
+
+def test_repeat_reads_are_served_from_cache(client, app, mock_bathroom, setup_db):
+    """Test that a second identical read does not see direct database changes."""
+    # Given
+    url = f"/api/bathrooms/{mock_bathroom['_id']}"
+    first = client.get(url)
+    setup_db.bathrooms.update_one({"_id": mock_bathroom["_id"]}, {"$set": {"floor": 9}})
+
+    # When
+    second = client.get(url)
+
+    # Then
+    assert second.data == first.data
+    assert second.headers["ETag"] == first.headers["ETag"]
+    stats = app.extensions['response_cache'].stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_query_argument_order_shares_an_entry(client, app, mock_bathroom):
+    """Test that the cache key ignores the order of query arguments."""
+    client.get("/api/bathrooms?gender=all&per_page=5")
+    client.get("/api/bathrooms?per_page=5&gender=all")
+    client.get("/api/bathrooms?per_page=5&gender=all&v=2")
+
+    stats = app.extensions['response_cache'].stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_bathroom_update_invalidates_detail_and_listing(client, login_user, mock_bathroom):
+    """Test that updating a bathroom drops its cached detail and the listings."""
+    # Given
+    url = f"/api/bathrooms/{mock_bathroom['_id']}"
+    client.get(f"{url}?v=2")
+    client.get("/api/bathrooms?v=2")
+
+    # When
+    login_user.put(url, data=json.dumps({"floor": 7}), content_type="application/json")
+
+    # Then
+    assert json.loads(client.get(f"{url}?v=2").data)["bathroom"]["floor"] == 7
+    assert json.loads(client.get("/api/bathrooms?v=2").data)["bathrooms"][0]["floor"] == 7
+
+
+def test_review_write_invalidates_reviews(client, login_user, mock_bathroom):
+    """Test that posting a review drops the bathroom's cached review list."""
+    # Given
+    url = f"/api/bathrooms/{mock_bathroom['_id']}/reviews"
+    assert json.loads(client.get(url).data)["total"] == 0
+
+    # When
+    review = {"cleanliness": 4, "privacy": 4, "accessibility": 4, "best_for": "Quick stop"}
+    login_user.post(url, data=json.dumps(review), content_type="application/json")
+
+    # Then
+    assert json.loads(client.get(url).data)["total"] == 1
+
+
+def test_cached_response_answers_revalidation(client, mock_bathroom):
+    """Test that a cache hit still answers If-None-Match with 304."""
+    url = f"/api/bathrooms/{mock_bathroom['_id']}"
+    etag = client.get(url).headers["ETag"]
+
+    response = client.get(url, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+
+def test_errors_are_not_cached(client, app):
+    """Test that only successful responses are stored."""
+    client.get(f"/api/bathrooms/{ObjectId()}")
+
+    assert app.extensions['response_cache'].stats()["size"] == 0
+
+
+def test_disabled_cache_is_bypassed(client, app, mock_bathroom, setup_db):
+    """Test that RESPONSE_CACHE_ENABLED=False reads through to the database."""
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+    try:
+        url = f"/api/bathrooms/{mock_bathroom['_id']}?v=2"
+        client.get(url)
+        setup_db.bathrooms.update_one({"_id": mock_bathroom["_id"]}, {"$set": {"floor": 9}})
+        assert json.loads(client.get(url).data)["bathroom"]["floor"] == 9
+    finally:
+        app.config['RESPONSE_CACHE_ENABLED'] = True
+
+
+def test_memory_backend_evicts_and_invalidates_by_tag():
+    """Test LRU eviction and tag invalidation in the in-process backend."""
+    backend = MemoryBackend(maxsize=2, ttl=60)
+    backend.set("a", 1, ["x"])
+    backend.set("b", 2, ["x", "y"])
+    backend.set("c", 3, ["y"])
+
+    assert backend.get("a") is MISSING
+    assert backend.invalidate_tags(["y"]) == 2
+    assert backend.get("b") is MISSING
+    stats = backend.stats()
+    assert stats["evictions"] == 1
+    assert stats["invalidations"] == 2
+
+
+def test_redis_backend_round_trip():
+    """Test that the shared backend stores bytes and invalidates by tag."""
+    backend = RedisBackend(FakeRedis(), ttl=60, prefix="test:")
+    entry = {"status": 200, "body": b"{}", "headers": [["Content-Type", "application/json"]]}
+    backend.set("key", entry, ["bathrooms"])
+
+    assert backend.get("key") == entry
+    assert backend.invalidate_tags(["bathrooms"]) == 1
+    assert backend.get("key") is MISSING
+    assert backend.stats()["hit_rate"] == 0.5
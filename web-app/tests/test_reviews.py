@@ -1,7 +1,9 @@
 """Tests for review-related routes and functionality."""
 import json
 import pytest
+from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo.errors import PyMongoError
 
 
 def test_get_reviews(client, mock_bathroom, mock_review):
@@ -92,7 +94,7 @@ def test_create_review(client, mock_bathroom, login_user):
     assert new_review[0]["best_for"] == "Emergency"
 
 
-def test_create_review_nonexistent_bathroom(client, login_user):
+def test_create_review_nonexistent_bathroom(client, login_user, db):
     """Test creating a review for a non-existent bathroom fails."""
     # Given
     review_data = {
@@ -113,6 +115,25 @@ def test_create_review_nonexistent_bathroom(client, login_user):
     # Then
     assert response.status_code == 404
     assert "error" in response.json
+    assert db.reviews.count_documents({}) == 0
+
+
+def test_create_review_is_removed_when_aggregates_fail(mock_bathroom, login_user, db, monkeypatch):
+    """Test that a review is not left behind when its bathroom's aggregates cannot be updated."""
+    # Given
+    def failing_record(db, review):
+        raise PyMongoError("write conflict")
+    monkeypatch.setattr("app.record_review_created", failing_record)
+    
+    # When
+    response = login_user.post(
+        f"/api/bathrooms/{mock_bathroom['_id']}/reviews",
+        json={"cleanliness": 5, "privacy": 4, "accessibility": 3, "best_for": "Emergency"}
+    )
+    
+    # Then
+    assert response.status_code == 500
+    assert db.reviews.count_documents({}) == 0
 
 
 def test_create_review_invalid_rating(client, mock_bathroom, login_user):
@@ -323,4 +344,104 @@ def test_delete_review_wrong_user(client, mock_review, login_user, setup_db):
     
     # Then
     assert response.status_code == 403
-    assert "error" in response.json 
\ No newline at end of file
+    assert "error" in response.json 
+
+def test_get_reviews_cursor_pagination(client, mock_bathroom, mock_review, setup_db):
+    """Test paging through reviews with a cursor."""
+    # Given - A second review for the same bathroom
+    second = dict(mock_review, _id=ObjectId(), comment="Second review")
+    setup_db.reviews.insert_one(second)
+    
+    # When
+    first_page = client.get(f"/api/bathrooms/{mock_bathroom['_id']}/reviews?cursor=&per_page=1")
+    next_cursor = first_page.json["next_cursor"]
+    second_page = client.get(f"/api/bathrooms/{mock_bathroom['_id']}/reviews?cursor={next_cursor}&per_page=1")
+    
+    # Then
+    assert json.loads(first_page.json["reviews"])[0]["comment"] == "Test review comment"
+    assert json.loads(second_page.json["reviews"])[0]["comment"] == "Second review"
+    assert second_page.json["next_cursor"] is None
+
+
+def _dated_reviews(setup_db, mock_review, count):
+    """Insert reviews numbered 0..count-1, each a minute newer than the last."""
+    start = datetime.utcnow() - timedelta(days=1)
+    setup_db.reviews.insert_many([
+        dict(mock_review, _id=ObjectId(), comment=f"Review {i}", created_at=start + timedelta(minutes=i))
+        for i in range(count)
+    ])
+
+def test_get_reviews_newest_first_cursor(client, mock_bathroom, mock_review, setup_db):
+    """Test that sort=newest pages through reviews from the most recent."""
+    # Given - mock_review is the newest
+    _dated_reviews(setup_db, mock_review, 3)
+    url = f"/api/bathrooms/{mock_bathroom['_id']}/reviews?v=2&sort=newest&per_page=2"
+    
+    # When
+    first_page = client.get(f"{url}&cursor=")
+    second_page = client.get(f"{url}&cursor={first_page.json['next_cursor']}")
+    
+    # Then
+    assert [review["comment"] for review in first_page.json["reviews"]] == ["Test review comment", "Review 2"]
+    assert [review["comment"] for review in second_page.json["reviews"]] == ["Review 1", "Review 0"]
+    assert second_page.json["next_cursor"] is None
+    assert client.get(f"/api/bathrooms/{mock_bathroom['_id']}/reviews?cursor=&sort=best").status_code == 400
+
+def test_bathroom_page_streams_first_page_of_reviews(app, client, mock_bathroom, mock_review, setup_db):
+    """Test that the page is streamed with only the newest reviews and a cursor for the rest."""
+    # Given
+    _dated_reviews(setup_db, mock_review, 3)
+    app.config['BATHROOM_PAGE_REVIEWS'] = 2
+    try:
+        # When
+        response = client.get(f"/bathroom/{mock_bathroom['_id']}")
+        streamed = response.is_streamed
+        body = response.get_data(as_text=True)
+    finally:
+        app.config['BATHROOM_PAGE_REVIEWS'] = 10
+    
+    # Then
+    assert response.status_code == 200
+    assert streamed
+    assert body.count('class="review"') == 2
+    assert body.index("Test review comment") < body.index("Review 2")
+    assert "Review 1" not in body
+    assert 'id="load-more"' in body
+
+def test_bathroom_page_without_reviews(client, mock_bathroom):
+    """Test that a bathroom with no reviews has no load more button."""
+    body = client.get(f"/bathroom/{mock_bathroom['_id']}").get_data(as_text=True)
+    
+    assert "No reviews yet" in body
+    assert 'id="load-more"' not in body
+
+def test_reviews_show_reviewer_names(client, mock_bathroom, mock_review, mock_user, setup_db):
+    """Test that review listings carry the reviewer's display name instead of only an id."""
+    # Given - a review by a user who has since been deleted
+    setup_db.reviews.insert_one(dict(mock_review, _id=ObjectId(), user_id=str(ObjectId())))
+    
+    # When
+    listing = client.get(f"/api/bathrooms/{mock_bathroom['_id']}/reviews?v=2&cursor=")
+    body = client.get(f"/bathroom/{mock_bathroom['_id']}").get_data(as_text=True)
+    
+    # Then
+    assert sorted(review["reviewer_name"] or "" for review in listing.json["reviews"]) == ["", "Test User"]
+    assert "email" not in listing.json["reviews"][0]
+    assert "Written by:</strong> Test User" in body
+    assert "Written by:</strong> Former user" in body
+
+def test_rename_refreshes_cached_review_listings(login_user, mock_bathroom, mock_review, mock_user):
+    """Test that a reviewer's new name replaces the old one in cached listings and their ETags."""
+    # Given - a cached listing the client holds an ETag for
+    url = f"/api/bathrooms/{mock_bathroom['_id']}/reviews?v=2"
+    first = login_user.get(url)
+    assert first.json["reviews"][0]["reviewer_name"] == "Test User"
+    
+    # When
+    assert login_user.put("/api/users/me", json={"name": "Renamed"}).status_code == 200
+    revalidated = login_user.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    
+    # Then
+    assert revalidated.status_code == 200
+    assert revalidated.json["reviews"][0]["reviewer_name"] == "Renamed"
+    assert revalidated.headers["ETag"] != first.headers["ETag"]
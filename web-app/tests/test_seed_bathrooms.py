@@ -0,0 +1,124 @@
+"""Tests for the NYU seed data and the synthetic data generator."""
+from collections import Counter
+from bson import ObjectId
+import mongomock
+import pytest
+from click.testing import CliRunner
+from werkzeug.security import check_password_hash
+import seed_bathrooms
+from schemas import rebuild_rating_stats
+from schemas.migrations import missing_indexes
+from seed_bathrooms import (
+    Campus, generate_bathrooms, generate_dataset, generate_reviews, generate_users, generated_ids,
+    seed_bathrooms as seed_nyu
+)
+
+
+def _fresh_db():
+    return mongomock.MongoClient()["seed_test"]
+
+
+def test_seed_bathrooms_skips_populated_database():
+    """Test that the NYU rows are only inserted into an empty collection."""
+    db = _fresh_db()
+
+    seed_nyu(db)
+    seed_nyu(db)
+
+    assert db.bathrooms.count_documents({}) == 10
+
+
+def test_generated_documents_are_deterministic():
+    """Test that equal seeds give equal ids and positions, and ids are predictable."""
+    first = list(generate_bathrooms(50, seed=7))
+    second = list(generate_bathrooms(50, seed=7))
+
+    assert [doc["_id"] for doc in first] == [doc["_id"] for doc in second]
+    assert [doc["location"] for doc in first] == [doc["location"] for doc in second]
+    assert [str(doc["_id"]) for doc in first] == generated_ids("bathrooms", 50, seed=7)
+    assert [doc["_id"] for doc in first] == sorted(doc["_id"] for doc in first)
+    assert first[0]["_id"] != next(generate_bathrooms(1, seed=8))["_id"]
+
+
+def test_generated_users_are_deterministic():
+    """Test that equal seeds give identical users, including a password hash werkzeug accepts."""
+    first = list(generate_users(3, seed=4))
+
+    assert first == list(generate_users(3, seed=4))
+    assert check_password_hash(first[0]["password_hash"], "password")
+    assert first[0]["password_hash"] != next(generate_users(1, seed=5))["password_hash"]
+
+
+def test_generated_reviews_point_at_generated_documents():
+    """Test that reviews derive their bathroom and user ids without being handed the id lists."""
+    reviews = list(generate_reviews(200, bathrooms=30, users=4, seed=2))
+
+    assert {review["bathroom_id"] for review in reviews} <= set(generated_ids("bathrooms", 30, seed=2))
+    assert {review["user_id"] for review in reviews} == set(generated_ids("users", 4, seed=2))
+    assert reviews == list(generate_reviews(200, bathrooms=30, users=4, seed=2))
+
+
+def test_bathrooms_cluster_around_campuses():
+    """Test that bathrooms land in buildings near the configured campus."""
+    campus = Campus("Test", 40.0, -74.0, 500)
+
+    bathrooms = list(generate_bathrooms(200, campuses=[campus], buildings_per_campus=5))
+
+    assert {doc["building"] for doc in bathrooms} <= {f"Test Hall {n}" for n in range(1, 6)}
+    for doc in bathrooms:
+        longitude, latitude = doc["location"]["coordinates"]
+        assert abs(latitude - 40.0) < 0.05 and abs(longitude + 74.0) < 0.05
+
+
+def test_generate_dataset_skews_reviews_and_builds_aggregates():
+    """Test the counts, the Zipf skew and that aggregates match a rebuild."""
+    db = _fresh_db()
+
+    result = generate_dataset(db, bathrooms=100, users=10, reviews=2000, seed=1, batch_size=300)
+
+    assert (result["bathrooms"], result["users"], result["reviews"]) == (100, 10, 2000)
+    counts = Counter(review["bathroom_id"] for review in db.reviews.find())
+    busiest = counts.most_common(1)[0]
+    assert busiest[1] > 2000 / 100 * 5
+    generated = {doc["_id"]: doc["rating_stats"] for doc in db.bathrooms.find()}
+    assert generated[ObjectId(busiest[0])]["review_count"] == busiest[1]
+    rebuild_rating_stats(db)
+    assert {doc["_id"]: doc["rating_stats"] for doc in db.bathrooms.find()} == generated
+    assert "location_2dsphere" in db.bathrooms.index_information()
+
+
+def test_generate_dataset_refuses_to_mix_with_existing_data():
+    """Test that existing data is kept unless drop is requested."""
+    db = _fresh_db()
+    seed_nyu(db)
+
+    with pytest.raises(ValueError):
+        generate_dataset(db, bathrooms=5, users=1, reviews=5)
+
+    generate_dataset(db, bathrooms=5, users=1, reviews=5, drop=True)
+    assert db.bathrooms.count_documents({}) == 5
+
+
+def test_regenerating_keeps_indexes():
+    """Test that dropping and regenerating rebuilds indexes whose migrations are already recorded."""
+    db = _fresh_db()
+    generate_dataset(db, bathrooms=5, users=2, reviews=5)
+    generate_dataset(db, bathrooms=5, users=2, reviews=5, seed=1, drop=True)
+
+    assert missing_indexes(db) == {}
+    assert db.users.index_information()["email_1"]["unique"]
+    assert "bathroom_id_1_created_at_-1__id_-1" in db.reviews.index_information()
+
+
+def test_cli_generate(monkeypatch):
+    """Test that the CLI generates a dataset around a custom campus."""
+    db = _fresh_db()
+    monkeypatch.setattr(seed_bathrooms, "_connect", lambda uri, dbname: db)
+
+    result = CliRunner().invoke(seed_bathrooms.cli, [
+        "generate", "--bathrooms", "30", "--users", "3", "--reviews", "60", "--campus", "Test:40.0:-74.0:300"
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert "Generated 30 bathrooms, 3 users and 60 reviews" in result.output
+    assert db.bathrooms.find_one()["building"].startswith("Test Hall")
@@ -0,0 +1,43 @@
+"""Tests for the versioned JSON response format."""
+import json
+from serialization import API_V2_MEDIA_TYPE
+
+
+def test_v2_query_flag_returns_native_documents(client, mock_bathroom):
+    """Test that ?v=2 embeds bathrooms as real JSON."""
+    # When
+    response = client.get("/api/bathrooms?v=2")
+    
+    # Then
+    assert response.status_code == 200
+    bathrooms = response.json["bathrooms"]
+    assert isinstance(bathrooms, list)
+    assert bathrooms[0]["_id"] == str(mock_bathroom["_id"])
+    assert bathrooms[0]["created_at"].endswith("Z")
+    assert "Accept" in response.headers["Vary"]
+
+
+def test_v2_accept_header_returns_native_documents(client, mock_review):
+    """Test that the v2 media type in Accept selects the native format."""
+    # When
+    response = client.get(
+        f"/api/reviews/{mock_review['_id']}",
+        headers={"Accept": API_V2_MEDIA_TYPE}
+    )
+    
+    # Then
+    assert response.status_code == 200
+    review = response.json["review"]
+    assert review["_id"] == str(mock_review["_id"])
+    assert review["ratings"]["cleanliness"] == 4
+
+
+def test_legacy_format_is_default(client, mock_bathroom):
+    """Test that clients without the flag still get an Extended JSON string."""
+    # When
+    response = client.get(f"/api/bathrooms/{mock_bathroom['_id']}", headers={"Accept": "*/*"})
+    
+    # Then
+    assert isinstance(response.json["bathroom"], str)
+    bathroom = json.loads(response.json["bathroom"])
+    assert bathroom["_id"] == {"$oid": str(mock_bathroom["_id"])}
@@ -0,0 +1,160 @@
+"""Tests for the in-process spatial index and the nearby endpoint."""
+import json
+import random
+import time
+from spatial import SpatialIndex, get_locator, haversine_m
+
+
+def test_haversine_distance():
+    """Test the distance between two known points."""
+    # One degree of latitude is roughly 111.2 km
+    assert abs(haversine_m(0.0, 0.0, 1.0, 0.0) - 111195) < 5
+
+
+def test_nearest_matches_brute_force():
+    """Test k-nearest and radius queries against an exhaustive scan."""
+    rng = random.Random(42)
+    index = SpatialIndex(cell_degrees=0.01)
+    points = {}
+    for i in range(300):
+        lat, lng = 40.7 + rng.uniform(-0.05, 0.05), -74.0 + rng.uniform(-0.05, 0.05)
+        points[str(i)] = (lat, lng)
+        index.upsert(str(i), lat, lng)
+
+    query = (40.71, -73.99)
+    expected = sorted((haversine_m(*query, *p), i) for i, p in points.items())
+
+    assert index.nearest(*query, k=10) == expected[:10]
+    assert index.nearest(*query, max_distance=800) == [e for e in expected if e[0] <= 800]
+
+
+def test_remove_and_move_points():
+    """Test that removed points disappear and moved points are re-bucketed."""
+    index = SpatialIndex()
+    index.upsert("a", 0.0, 0.0)
+    index.upsert("b", 1.0, 1.0)
+    index.upsert("a", 1.0, 1.001)
+    index.remove("b")
+
+    assert len(index) == 1
+    assert index.nearest(1.0, 1.0, k=5)[0][1] == "a"
+
+
+def test_get_nearby_bathrooms_ranked_by_distance(client, db, mock_bathroom):
+    """Test that nearby results are filtered by radius and sorted by distance."""
+    # Given
+    db.bathrooms.insert_many([
+        {"building": "Close", "floor": 1, "location": {"type": "Point", "coordinates": [0.001, 0.001]}},
+        {"building": "Outside radius", "floor": 1, "location": {"type": "Point", "coordinates": [0.02, 0.0]}}
+    ])
+    
+    # When
+    response = client.get("/api/bathrooms/nearby?lat=0.0009&lng=0.0009&max_distance=1000&v=2")
+    
+    # Then
+    assert response.status_code == 200
+    bathrooms = response.json["bathrooms"]
+    assert [b["building"] for b in bathrooms] == ["Close", "Test Building"]
+    assert bathrooms[0]["distance"] < bathrooms[1]["distance"]
+
+
+def test_created_bathroom_is_indexed(client, login_user, mock_bathroom):
+    """Test that bathrooms created through the API are found without a reload."""
+    # Given - Load the index before the write
+    client.get("/api/bathrooms/nearby?lat=0&lng=0")
+    login_user.post(
+        "/api/bathrooms",
+        data=json.dumps({"building": "Fresh", "floor": 1, "latitude": 10.0, "longitude": 10.0}),
+        content_type="application/json"
+    )
+    
+    # When
+    response = client.get("/api/bathrooms/nearby?lat=10.0&lng=10.0&v=2")
+    
+    # Then
+    assert [b["building"] for b in response.json["bathrooms"]] == ["Fresh"]
+
+
+def test_nearby_radius_is_capped(client, app, mock_bathroom):
+    """Test that a radius above NEARBY_MAX_DISTANCE or below one meter is rejected."""
+    limit = app.config['NEARBY_MAX_DISTANCE']
+
+    assert client.get(f"/api/bathrooms/nearby?lat=0&lng=0&max_distance={limit + 1}").status_code == 400
+    assert client.get("/api/bathrooms/nearby?lat=0&lng=0&max_distance=0").status_code == 400
+    assert client.get(f"/api/bathrooms/nearby?lat=0&lng=0&max_distance={limit}").status_code == 200
+
+
+def test_nearest_uses_extent_after_far_point_removed():
+    """Test that queries stay correct when the tracked extent is wider than the points."""
+    index = SpatialIndex()
+    index.upsert("near", 0.0, 0.0)
+    index.upsert("far", 50.0, 50.0)
+    index.remove("far")
+
+    assert index.nearest(0.0, 0.001, k=3) == [(haversine_m(0.0, 0.001, 0.0, 0.0), "near")]
+
+
+def test_reload_keeps_writes_made_while_loading(app, db, mock_bathroom):
+    """Test that a write during a reload reaches the index that replaces the old one."""
+    locator = get_locator(app)
+    load = locator._load
+
+    def load_with_concurrent_write():
+        fresh = load()
+        locator.upsert("written-during-load", 5.0, 5.0)
+        return fresh
+
+    locator._load = load_with_concurrent_write
+    try:
+        with app.app_context():
+            index = locator.index()
+    finally:
+        del locator._load
+
+    assert len(index) == 2
+    assert index.nearest(5.0, 5.0, k=1)[0][1] == "written-during-load"
+
+
+def test_nearest_near_the_poles_is_fast_and_exact():
+    """Test that radius queries at high latitudes only visit the cells around the radius."""
+    rng = random.Random(7)
+    index = SpatialIndex(cell_degrees=0.01)
+    points = {}
+    for i in range(10):
+        lat, lng = rng.uniform(-60.0, 85.0), rng.uniform(-170.0, 170.0)
+        points[str(i)] = (lat, lng)
+        index.upsert(str(i), lat, lng)
+    points["polar"] = (80.2, 10.0)
+    index.upsert("polar", 80.2, 10.0)
+
+    for query in [(80.0, 10.0), (85.0, -20.0), (89.9, 0.0), (40.7, -74.0)]:
+        started = time.perf_counter()
+        result = index.nearest(*query, k=10, max_distance=50000)
+        assert time.perf_counter() - started < 0.5
+        expected = sorted((haversine_m(*query, *p), i) for i, p in points.items())
+        assert result == [e for e in expected if e[0] <= 50000][:10]
+
+
+def test_dense_polar_index_matches_brute_force():
+    """Test the clipped ring search on an index dense enough to use it at high latitude."""
+    rng = random.Random(11)
+    index = SpatialIndex(cell_degrees=0.01)
+    points = {}
+    for i in range(3000):
+        lat, lng = 80.0 + rng.uniform(-0.1, 0.1), 10.0 + rng.uniform(-0.5, 0.5)
+        points[str(i)] = (lat, lng)
+        index.upsert(str(i), lat, lng)
+
+    query = (80.01, 10.05)
+    expected = sorted((haversine_m(*query, *p), i) for i, p in points.items())
+
+    assert index.nearest(*query, k=10, max_distance=3000) == [e for e in expected if e[0] <= 3000][:10]
+    assert index.nearest(*query, max_distance=1500) == [e for e in expected if e[0] <= 1500]
+
+
+def test_nearby_rejects_invalid_coordinates(client, mock_bathroom):
+    """Test that non-finite or out-of-range coordinates are a 400, not a server error."""
+    for query in ["lat=nan&lng=0", "lat=0&lng=inf", "lat=-inf&lng=0", "lat=91&lng=0", "lat=0&lng=181"]:
+        response = client.get(f"/api/bathrooms/nearby?{query}")
+        assert response.status_code == 400
+        assert response.json["error"] == "Invalid coordinate format"
@@ -0,0 +1,166 @@
+"""Tests for the viewport endpoint and its clustering helpers."""
+import math
+import os
+import pytest
+from pymongo import MongoClient
+import app as app_module
+import spatial
+from benchmarks.harness import mongod_available
+from spatial import bbox_filter, cluster_cell_degrees, parse_bbox
+
+
+def _as_coordinate_ranges(query):
+    """Rewrite the $geoWithin box polygons of a filter as coordinate ranges mongomock can evaluate."""
+    if isinstance(query, list):
+        return [_as_coordinate_ranges(clause) for clause in query]
+    if not isinstance(query, dict):
+        return query
+    location = query.get("location")
+    if not (isinstance(location, dict) and "$geoWithin" in location):
+        return {key: _as_coordinate_ranges(value) for key, value in query.items()}
+    ring = location["$geoWithin"]["$geometry"]["coordinates"][0]
+    lngs = [point[0] for point in ring]
+    lats = [point[1] for point in ring]
+    return {
+        "location.coordinates.0": {"$gte": min(lngs), "$lte": max(lngs)},
+        "location.coordinates.1": {"$gte": min(lats), "$lte": max(lats)},
+    }
+
+
+@pytest.fixture
+def geo_within_as_ranges(monkeypatch):
+    """Run the real bbox_filter, then swap its polygons for equivalent coordinate ranges."""
+    real = spatial.bbox_filter
+    rewritten = lambda bbox: _as_coordinate_ranges(real(bbox))
+    monkeypatch.setattr(app_module, "bbox_filter", rewritten)
+    monkeypatch.setattr(spatial, "bbox_filter", rewritten)
+
+
+@pytest.fixture
+def pins(db):
+    """Insert three bathrooms, two of which share a clustering cell."""
+    db.bathrooms.insert_many([
+        {"building": "Kimmel", "floor": 2, "location": {"type": "Point", "coordinates": [-73.9972, 40.7294]}},
+        {"building": "Bobst", "floor": 1, "location": {"type": "Point", "coordinates": [-73.9975, 40.7295]}},
+        {"building": "Palladium", "floor": 2, "location": {"type": "Point", "coordinates": [-73.90, 40.80]}}
+    ])
+
+
+def test_parse_bbox():
+    """Test that bounding boxes are parsed and validated."""
+    assert parse_bbox("-74,40,-73,41") == (-74.0, 40.0, -73.0, 41.0)
+    for bad in [None, "1,2,3", "a,b,c,d", "5,0,5,1", "0,1,1,0", "0,-91,1,0", "nan,0,1,1"]:
+        with pytest.raises(ValueError):
+            parse_bbox(bad)
+
+
+def test_parse_bbox_wraps_longitudes():
+    """Test that scrolled and antimeridian-crossing boxes are normalized."""
+    assert parse_bbox("170,0,-170,1") == (170.0, 0.0, -170.0, 1.0)
+    assert parse_bbox("170,0,190,1") == (170.0, 0.0, -170.0, 1.0)
+    assert parse_bbox("-200,0,200,1") == (-180.0, 0.0, 180.0, 1.0)
+
+
+def test_bbox_filter_splits_wide_boxes():
+    """Test that boxes wider than a hemisphere become two polygons."""
+    narrow = bbox_filter((-74, 40, -73, 41))
+    wide = bbox_filter((-180, -80, 180, 80))
+
+    assert narrow["location"]["$geoWithin"]["$geometry"]["type"] == "Polygon"
+    assert len(wide["$or"]) == 2
+
+
+def test_bbox_filter_splits_antimeridian_boxes():
+    """Test that a box crossing the antimeridian becomes one polygon on each side."""
+    crossing = bbox_filter((170, 0, -170, 1))
+
+    rings = [clause["location"]["$geoWithin"]["$geometry"]["coordinates"][0] for clause in crossing["$or"]]
+    assert [(ring[0][0], max(point[0] for point in ring)) for ring in rings] == [(170, 180.0), (-180.0, -170)]
+
+
+def _midpoint_latitude(lat, d_lng):
+    """Latitude a great-circle arc between two points on one parallel reaches halfway along."""
+    return math.degrees(math.atan(math.tan(math.radians(lat)) / math.cos(math.radians(d_lng) / 2)))
+
+
+@pytest.mark.parametrize("bbox", [(-170, -75, 170, 75), (-60, 0, 60, 60), (10, 45, 12, 46)])
+def test_bbox_filter_edges_follow_parallels(bbox):
+    """Test that no geodesic polygon edge strays from the viewport's top or bottom parallel."""
+    query = bbox_filter(bbox)
+    clauses = query.get("$or", [query])
+    for clause in clauses:
+        ring = clause["location"]["$geoWithin"]["$geometry"]["coordinates"][0]
+        for (lng1, lat1), (lng2, lat2) in zip(ring, ring[1:]):
+            if lat1 != lat2:
+                assert lng1 == lng2
+                continue
+            assert abs(_midpoint_latitude(lat1, lng2 - lng1) - lat1) < 0.001
+
+
+def test_wide_viewport_matches_planar_box_on_mongod():
+    """Test against a real server that pins just outside a wide box stay out and pins just inside stay in."""
+    uri = os.environ.get("MONGO_TEST_URI", "mongodb://localhost:27017")
+    if not mongod_available(uri, timeout_ms=300):
+        pytest.skip("needs a running mongod")
+    collection = MongoClient(uri).bathroom_map_geo_test.bathrooms
+    collection.drop()
+    collection.create_index([("location", "2dsphere")])
+    collection.insert_many([
+        {"name": name, "location": {"type": "Point", "coordinates": [0, lat]}}
+        for name, lat in [("inside top", 59.5), ("outside top", 60.5), ("inside bottom", 0.5), ("outside bottom", -0.5)]
+    ])
+    try:
+        found = {doc["name"] for doc in collection.find(bbox_filter((-60, 0, 60, 60)))}
+    finally:
+        collection.drop()
+
+    assert found == {"inside top", "inside bottom"}
+
+
+def test_viewport_finds_pins_across_the_antimeridian(client, db, geo_within_as_ranges):
+    """Test that a viewport over the date line returns pins on both sides and nothing outside."""
+    db.bathrooms.insert_many([
+        {"building": "Fiji", "floor": 1, "location": {"type": "Point", "coordinates": [178.4, -18.1]}},
+        {"building": "Samoa", "floor": 1, "location": {"type": "Point", "coordinates": [-171.8, -13.8]}},
+        {"building": "Sydney", "floor": 1, "location": {"type": "Point", "coordinates": [151.2, -33.9]}}
+    ])
+
+    response = client.get("/api/bathrooms/viewport?bbox=175,-20,-170,-10&zoom=17")
+
+    assert response.status_code == 200
+    labels = sorted(marker[3] for marker in response.json["markers"])
+    assert labels == ["Fiji - Floor 1", "Samoa - Floor 1"]
+
+
+def test_cluster_cell_degrees():
+    """Test that clustering cells shrink as the map zooms in."""
+    assert cluster_cell_degrees(0, 4) == 90.0
+    assert cluster_cell_degrees(10, 4) < cluster_cell_degrees(9, 4)
+
+
+def test_viewport_rejects_bad_parameters(client):
+    """Test that a missing bbox or invalid zoom is a 400."""
+    assert client.get("/api/bathrooms/viewport?zoom=10").status_code == 400
+    assert client.get("/api/bathrooms/viewport?bbox=-74,40,-73,41&zoom=99").status_code == 400
+
+
+def test_viewport_markers_at_high_zoom(client, pins, geo_within_as_ranges):
+    """Test that close-up viewports return minimal marker tuples."""
+    response = client.get("/api/bathrooms/viewport?bbox=-74,40,-73,41&zoom=17")
+
+    assert response.status_code == 200
+    assert response.json["mode"] == "markers"
+    labels = sorted(marker[3] for marker in response.json["markers"])
+    assert labels == ["Bobst - Floor 1", "Kimmel - Floor 2", "Palladium - Floor 2"]
+    narrow = client.get("/api/bathrooms/viewport?bbox=-74,40.7,-73.95,40.75&zoom=17")
+    assert sorted(marker[3] for marker in narrow.json["markers"]) == ["Bobst - Floor 1", "Kimmel - Floor 2"]
+
+
+def test_viewport_clusters_at_low_zoom(client, pins, geo_within_as_ranges):
+    """Test that zoomed-out viewports return counts per grid cell."""
+    response = client.get("/api/bathrooms/viewport?bbox=-74,40,-73,41&zoom=10")
+
+    assert response.status_code == 200
+    assert response.json["mode"] == "clusters"
+    counts = sorted(cluster["count"] for cluster in response.json["clusters"])
+    assert counts == [1, 2]